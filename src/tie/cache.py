@@ -0,0 +1,263 @@
+import collections
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from collections.abc import Callable, Hashable
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+# environment variable overriding the default on-disk cache location
+CACHE_DIRECTORY_ENVIRONMENT_VARIABLE = "TIE_CACHE_DIR"
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+# memoized file hashes keyed by (path, modification time, size)
+_file_hashes: dict[tuple[str, int, int], str] = {}
+
+
+def get_file_hash(filepath: str) -> str:
+    """Gets the SHA-256 hex digest of the contents of a file.
+
+    Hashes are memoized in process for as long as the file's modification time and
+    size are unchanged, so repeated calls on the same file are constant time.
+
+    Args:
+        filepath: Location of the file to hash.
+
+    Returns:
+        The hex digest of the file contents.
+    """
+    path = os.path.abspath(filepath)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+
+    return _file_hashes[key]
+
+
+def get_cache_directory(cache_dir: str | None = None) -> str:
+    """Gets the directory in which on-disk caches are stored.
+
+    Args:
+        cache_dir: Explicit cache directory.  If None, uses the directory named by
+            the TIE_CACHE_DIR environment variable, falling back to ~/.cache/tie.
+
+    Returns:
+        The cache directory.  The directory is not guaranteed to exist.
+    """
+    if cache_dir is not None:
+        return cache_dir
+
+    return os.environ.get(
+        CACHE_DIRECTORY_ENVIRONMENT_VARIABLE,
+        os.path.join(os.path.expanduser("~"), ".cache", "tie"),
+    )
+
+
+def save_array(filepath: str, array: np.ndarray):
+    """Atomically saves an array to a .npy file.
+
+    Args:
+        filepath: Location of the .npy file.
+        array: The array to save.
+
+    Mutates:
+        Writes array to filepath, replacing any existing file.
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(directory, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        temporary_filepath = f.name
+        try:
+            np.save(f, array, allow_pickle=False)
+        except BaseException:
+            os.remove(temporary_filepath)
+            raise
+    os.replace(temporary_filepath, filepath)
+
+
+def save_arrays(directory: str, arrays: dict[str, np.ndarray]):
+    """Atomically saves arrays to a new directory of .npy files.
+
+    Either all arrays are visible in directory, or none of them are.
+
+    Args:
+        directory: Location of the new directory.  If it already exists, it is left
+            unchanged.
+        arrays: Mapping of name to array, where each array is saved to name.npy.
+
+    Mutates:
+        Creates directory containing one .npy file per array.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+
+    temporary_directory = tempfile.mkdtemp(dir=parent)
+    try:
+        for name, array in arrays.items():
+            np.save(
+                os.path.join(temporary_directory, f"{name}.npy"),
+                array,
+                allow_pickle=False,
+            )
+    except BaseException:
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        raise
+
+    try:
+        os.rename(temporary_directory, directory)
+    except OSError:
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        # another process may have populated the cache first
+        if not os.path.isdir(directory):
+            raise
+
+
+def load_array(filepath: str) -> np.ndarray:
+    """Loads a .npy file saved by save_array or save_arrays as a read-only memory map.
+
+    Args:
+        filepath: Location of the .npy file.
+
+    Returns:
+        A read-only memory-mapped array.
+    """
+    return np.load(filepath, mmap_mode="r", allow_pickle=False)
+
+
+def get_size_bytes(value) -> int:
+    """Estimates the memory used by a cached value.
+
+    Args:
+        value: A numpy array, pandas object, object with an nbytes attribute, or
+            any other python object.
+
+    Returns:
+        The approximate number of bytes used by value.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class MemoryBoundedCache:
+    """An in-memory least recently used cache with a bound on its total size."""
+
+    # Abstraction function:
+    # 	AF(max_bytes, entries, sizes, total_bytes) = a cache mapping each key in
+    #       entries to entries[key], ordered from least to most recently used, that
+    #       holds at most max_bytes of values.
+    # Rep invariant:
+    # - max_bytes >= 0
+    # - entries.keys() == sizes.keys()
+    # - total_bytes == sum(sizes.values()) <= max_bytes
+    # Safety from rep exposure:
+    # - all fields are private
+    # - values are returned as stored, so callers must not mutate them
+
+    def __init__(self, max_bytes: int):
+        """Initializes an empty MemoryBoundedCache.
+
+        Args:
+            max_bytes: The maximum total size of the cached values.  Requires
+                max_bytes >= 0.
+        """
+        self._max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+
+        self._checkrep()
+
+    def _checkrep(self):
+        """Asserts the rep invariant."""
+        # - max_bytes >= 0
+        assert self._max_bytes >= 0
+        # - entries.keys() == sizes.keys()
+        assert len(self._entries) == len(self._sizes)
+        # - total_bytes == sum(sizes.values()) <= max_bytes
+        assert self._total_bytes <= self._max_bytes
+
+    def __len__(self) -> int:
+        """Gets the number of cached values."""
+        self._checkrep()
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Gets whether key has a cached value."""
+        self._checkrep()
+        return key in self._entries
+
+    def __getitem__(self, key: Hashable) -> Any:
+        """Gets the cached value of key and marks it as most recently used.
+
+        Raises:
+            KeyError: if key has no cached value.
+        """
+        self._entries.move_to_end(key)
+        self._checkrep()
+        return self._entries[key]
+
+    @property
+    def total_bytes(self) -> int:
+        """Gets the total size of the cached values."""
+        self._checkrep()
+        return self._total_bytes
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Gets the value of key, computing and caching it if it is not cached.
+
+        Least recently used values are evicted until the new value fits.  A value
+        larger than max_bytes is returned without being cached.
+
+        Args:
+            key: The key of the value.
+            compute: A function of no arguments computing the value of key.
+
+        Returns:
+            The cached or newly computed value of key.
+
+        Mutates:
+            The cache to mark key as most recently used, adding it if necessary.
+        """
+        if key in self._entries:
+            return self[key]
+
+        value = compute()
+        size = get_size_bytes(value)
+        if size <= self._max_bytes:
+            while self._total_bytes + size > self._max_bytes:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(evicted_key)
+
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._total_bytes += size
+
+        self._checkrep()
+        return value
+
+    def clear(self):
+        """Removes all cached values.
+
+        Mutates:
+            The cache to be empty.
+        """
+        self._entries.clear()
+        self._sizes.clear()
+        self._total_bytes = 0
+
+        self._checkrep()
@@ -9,7 +9,17 @@ from tie.matrix_builder import ReportTechniqueMatrixBuilder
 from tie.recommender import WalsRecommender
 
 
-def export_model(dataset_filepath: str, enterprise_attack_filepath: str, outfile: str):
+def export_model(
+    dataset_filepath: str,
+    enterprise_attack_filepath: str,
+    outfile: str,
+    seed: int | None = None,
+    use_cache: bool = False,
+    num_workers: int | None = None,
+    search_workers: int = 1,
+    warm_start_epochs: int | None = None,
+    regularization_path: bool = False,
+):
     """Trains the TechniqueInferenceEngine and exports the model.
 
     Trains the TechniqueInferenceEngine based on dataset and exports the model to
@@ -20,6 +30,24 @@ def export_model(dataset_filepath: str, enterprise_attack_filepath: str, outfile
         enterprise_attack_filepath: A JSON file containing an Enterprise ATT&CK STIX
             bundle.
         outfile: A .npz file in which to save the resulting embeddings.
+        seed: Seed for the train/test/validation split.  If None, the split is not
+            reproducible.
+        use_cache: Whether to load the parsed dataset and split from, and save them
+            to, the on-disk cache.
+        num_workers: Number of threads with which to train each model.  If None,
+            the cores are divided evenly among the search processes, so that
+            search_workers times num_workers does not exceed the number of cores.
+        search_workers: Number of processes across which to run the hyperparameter
+            search.
+        warm_start_epochs: If not None, each hyperparameter search trial after the
+            first continues from its neighbor's embeddings for this many epochs.
+        regularization_path: Whether to approximately score every regularization
+            coefficient from one fit per combination of the other hyperparameters,
+            rather than fitting each combination separately.  Every coefficient
+            shares the item embeddings of that one fit, so the scores may rank the
+            coefficients differently than separate fits would, especially for
+            coefficients far from the median.  Ignores search_workers and
+            warm_start_epochs.
 
     Mutates:
         Saves the results to an npz outfile with the following keys:
@@ -30,6 +58,12 @@ def export_model(dataset_filepath: str, enterprise_attack_filepath: str, outfile
             - report_ids: Length-m array of the m report ids
             - technique_ids: Length-n array of the n technique ids
     """
+    if regularization_path:
+        # the path search runs in this process only
+        search_workers = 1
+    if num_workers is None:
+        num_workers = max(1, (os.cpu_count() or 1) // search_workers)
+
     # could be added to arguments later
     validation_ratio = 0.1
     test_ratio = 0.2
@@ -38,12 +72,15 @@ def export_model(dataset_filepath: str, enterprise_attack_filepath: str, outfile
     data_builder = ReportTechniqueMatrixBuilder(
         combined_dataset_filepath=dataset_filepath,
         enterprise_attack_filepath=enterprise_attack_filepath,
+        use_cache=use_cache,
     )
     (
         training_data,
         test_data,
         validation_data,
-    ) = data_builder.build_train_test_validation(test_ratio, validation_ratio)
+    ) = data_builder.build_train_test_validation(
+        test_ratio, validation_ratio, seed=seed
+    )
     m, n = training_data.shape
 
     # most models performed better with embedding dimension 4
@@ -66,8 +103,21 @@ def export_model(dataset_filepath: str, enterprise_attack_filepath: str, outfile
         "c": [0.001, 0.005, 0.01, 0.05, 0.1, 0.3, 0.5, 0.7],
         "regularization_coefficient": [0.0, 0.0001, 0.001, 0.01],
     }
-
-    best_hyperparameters = tie.fit_with_validation(**hyperparameters)
+    # not a hyperparameter, so passed to every fit rather than searched over
+    fit_kwargs = {"num_workers": num_workers}
+
+    if regularization_path:
+        best_hyperparameters = tie.fit_with_regularization_path(
+            search_seed=seed, fit_kwargs=fit_kwargs, **hyperparameters
+        )
+    else:
+        best_hyperparameters = tie.fit_with_validation(
+            search_workers=search_workers,
+            search_seed=seed,
+            search_warm_start_epochs=warm_start_epochs,
+            fit_kwargs=fit_kwargs,
+            **hyperparameters,
+        )
     hyperparameters_array = np.array(
         [
             (
@@ -119,10 +169,65 @@ def main():
     parser.add_argument("-r", "--report-data", required=True)
     parser.add_argument("-a", "--attack-data", required=True)
     parser.add_argument("-o", "--outfile", required=True)
+    parser.add_argument("-s", "--seed", type=int, default=None)
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help=(
+            "number of threads with which to train each model (default: number of "
+            "cores divided by --search-workers)"
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--search-workers",
+        type=int,
+        default=1,
+        help=(
+            "number of processes across which to search hyperparameters, each "
+            "training with --workers threads (default: 1)"
+        ),
+    )
+    parser.add_argument(
+        "--warm-start-epochs",
+        type=int,
+        default=None,
+        help=(
+            "warm start each search trial from its neighbor in the grid and train it "
+            "for this many epochs (default: train every trial from scratch)"
+        ),
+    )
+    parser.add_argument(
+        "--regularization-path",
+        action="store_true",
+        help=(
+            "approximately score every regularization coefficient from one fit "
+            "per value of c, sharing that fit's technique embeddings, which may "
+            "select a different coefficient than the full grid (default: fit "
+            "every hyperparameter combination separately)"
+        ),
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="cache the parsed dataset and seeded split (see TIE_CACHE_DIR)",
+    )
 
     args = parser.parse_args()
 
-    export_model(args.report_data, args.attack_data, args.outfile)
+    export_model(
+        args.report_data,
+        args.attack_data,
+        args.outfile,
+        seed=args.seed,
+        use_cache=args.cache,
+        num_workers=args.workers,
+        search_workers=args.search_workers,
+        warm_start_epochs=args.warm_start_epochs,
+        regularization_path=args.regularization_path,
+    )
 
 
 if __name__ == "__main__":
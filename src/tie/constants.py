@@ -6,3 +6,18 @@ class PredictionMethod(Enum):
 
     DOT = "dot"
     COSINE = "cosine"
+
+
+class WalsSolver(Enum):
+    """A method for solving the least squares systems of a WALS factor update."""
+
+    EXACT = "exact"
+    CONJUGATE_GRADIENT = "conjugate_gradient"
+
+
+class Optimizer(Enum):
+    """A gradient descent optimizer."""
+
+    SGD = "sgd"
+    ADAM = "adam"
+    ADAGRAD = "adagrad"
@@ -1,22 +1,34 @@
 import copy
+from collections.abc import Callable, Hashable, Sequence
 
 import numpy as np
 import pandas as pd
 import tensorflow as tf
+from scipy import sparse
 
+from tie.cache import MemoryBoundedCache
 from tie.constants import PredictionMethod
 from tie.exceptions import TechniqueNotFoundException
 from tie.matrix import ReportTechniqueMatrix
-from tie.recommender import Recommender
+from tie.prediction_matrix import PredictionMatrix
+from tie.recommender import Recommender, WalsRecommender
+from tie.search import (
+    SuccessiveHalvingSearch,
+    get_parameter_grid,
+    grid_search,
+    regularization_path_search,
+    set_trial_seed,
+)
+from tie.session import ReportSession
 from tie.utils import (
+    EVALUATION_BLOCK_SIZE,
+    evaluate_top_k_in_blocks,
     get_mitre_technique_ids_to_names,
-    normalized_discounted_cumulative_gain,
-    precision_at_k,
-    recall_at_k,
+    get_top_k,
 )
 
-tf.config.run_functions_eagerly(True)
-assert tf.executing_eagerly()
+# default bound on the memory used by memoized predictions and metrics
+MEMOIZATION_SIZE_BYTES = 1 << 28
 
 
 class TechniqueInferenceEngine:
@@ -38,10 +50,15 @@ class TechniqueInferenceEngine:
     # - model is not None
     # - prediction_method is not None
     # - len(enterprise_attack_filepath) >= 0
+    # - evaluation_block_size > 0
+    # - fit_generation >= 0
+    # - every key of memo starts with fit_generation
+    # - technique_ids_to_indices maps training_data.technique_ids[i] to i for each i
     # Safety from rep exposure:
     # - all attributes are private
     # - training_data and test_data are immutable
     # - model is deep copied and never returned
+    # - technique_ids_to_indices is never returned
 
     def __init__(
         self,
@@ -51,6 +68,8 @@ class TechniqueInferenceEngine:
         model: Recommender,
         prediction_method: PredictionMethod,
         enterprise_attack_filepath: str,
+        evaluation_block_size: int = EVALUATION_BLOCK_SIZE,
+        memoization_size_bytes: int = MEMOIZATION_SIZE_BYTES,
     ):
         """Initializes a TechniqueInferenceEngine object.
 
@@ -61,6 +80,11 @@ class TechniqueInferenceEngine:
             prediction_method: the method to use for predictions.
             enterprise_attack_filepath: filepath for the MITRE enterprise ATT&CK json
                 information.
+            evaluation_block_size: the maximum number of reports whose predictions
+                are held in memory at a time during evaluation and validation.
+            memoization_size_bytes: the maximum memory used to memoize predictions
+                and metrics between fits.  Least recently used values are evicted
+                first.
         """
         self._enterprise_attack_filepath = enterprise_attack_filepath
 
@@ -69,6 +93,18 @@ class TechniqueInferenceEngine:
         self._test_data = test_data
         self._model = copy.deepcopy(model)
         self._prediction_method = prediction_method
+        self._evaluation_block_size = evaluation_block_size
+
+        # built once so each prediction for a new report looks up its techniques in
+        # constant time
+        self._technique_ids_to_indices = {
+            technique_id: i
+            for i, technique_id in enumerate(training_data.technique_ids)
+        }
+
+        # number of fits so far; memoized values are only valid for one generation
+        self._fit_generation = 0
+        self._memo = MemoryBoundedCache(memoization_size_bytes)
 
         self._checkrep()
 
@@ -86,6 +122,75 @@ class TechniqueInferenceEngine:
         assert self._prediction_method is not None
         # - len(enterprise_attack_filepath) >= 0
         assert len(self._enterprise_attack_filepath) >= 0
+        # - evaluation_block_size > 0
+        assert self._evaluation_block_size > 0
+        # - fit_generation >= 0
+        assert self._fit_generation >= 0
+        # - technique_ids_to_indices maps training_data.technique_ids[i] to i for
+        #   each i
+        assert len(self._technique_ids_to_indices) == self._training_data.n
+
+    def _memoize(self, key: Hashable, compute: Callable[[], object]) -> object:
+        """Gets a value memoized for the current fit generation.
+
+        Args:
+            key: identifies the value within the current fit generation.
+            compute: a function of no arguments computing the value.
+
+        Returns:
+            The memoized or newly computed value.  Requires callers not mutate it.
+
+        Mutates:
+            The memo to contain the value if it fits.
+        """
+        return self._memo.get((self._fit_generation, key), compute)
+
+    def _start_fit_generation(self):
+        """Invalidates memoized values after the model changes.
+
+        Mutates:
+            The engine to a new fit generation with nothing memoized.
+        """
+        # memoized values describe the previous model
+        self._fit_generation += 1
+        self._memo.clear()
+
+        self._checkrep()
+
+    def _get_prediction_matrix(self) -> PredictionMatrix:
+        """Gets the lazily evaluated predictions of the current model."""
+        return self._memoize(
+            "prediction_matrix",
+            lambda: self._model.predict_matrix(method=self._prediction_method),
+        )
+
+    def _evaluate_top_k(
+        self,
+        data: ReportTechniqueMatrix,
+        ks: tuple[int],
+        exclude_training: bool = False,
+    ) -> pd.DataFrame:
+        """Computes top k ranking metrics of the model on data.
+
+        Predictions are made evaluation_block_size reports at a time, so the full
+        prediction matrix is never materialized.
+
+        Args:
+            data: the held out data on which to compute the metrics.
+            ks: the values of k at which to compute the metrics.
+            exclude_training: whether to remove each report's training techniques
+                from its ranking.
+
+        Returns:
+            A dataframe indexed by k with one column per metric.
+        """
+        return evaluate_top_k_in_blocks(
+            self._get_prediction_matrix().rows,
+            data.to_scipy(),
+            ks=ks,
+            excluded=self._training_data.to_scipy() if exclude_training else None,
+            block_size=self._evaluation_block_size,
+        )
 
     def _add_technique_name_to_dataframe(self, data: pd.DataFrame):
         """Adds a technique name column to the dataframe.
@@ -99,8 +204,8 @@ class TechniqueInferenceEngine:
         all_mitre_technique_ids_to_names = get_mitre_technique_ids_to_names(
             self._enterprise_attack_filepath
         )
-        data.loc[:, "technique_name"] = data.apply(
-            lambda row: all_mitre_technique_ids_to_names.get(row.name), axis=1
+        data.loc[:, "technique_name"] = data.index.map(
+            all_mitre_technique_ids_to_names.get
         )
 
     def fit(self, **kwargs) -> float:
@@ -111,6 +216,9 @@ class TechniqueInferenceEngine:
         Returns:
             The MSE of the prediction matrix, as determined by the test set.
         """
+        # invalidate first, so a failed fit leaves nothing memoized
+        self._start_fit_generation()
+
         # train
         self._model.fit(self._training_data.to_sparse_tensor(), **kwargs)
 
@@ -121,70 +229,262 @@ class TechniqueInferenceEngine:
         self._checkrep()
         return mean_squared_error
 
-    def fit_with_validation(self, **kwargs) -> dict[str, float]:
+    def search(
+        self,
+        grid: dict[str, Sequence],
+        num_workers: int = 1,
+        seed: int | None = None,
+        warm_start: bool = False,
+        warm_start_epochs: int | None = None,
+        fit_kwargs: dict | None = None,
+    ) -> pd.DataFrame:
+        """Fits and scores the model for every combination of hyperparameters.
+
+        Each combination is fit on the training data and scored by recall@20 on the
+        validation data.  The engine's model is not changed.  See
+        tie.search.grid_search.
+
+        Args:
+            grid: mapping of hyperparameter to values over which to search.
+            num_workers: the number of processes in which to run trials.
+            seed: the seed of the trial seeds.  If None, it is drawn from the global
+                numpy random state.
+            warm_start: whether each trial continues from the embeddings of its
+                neighbor in serpentine grid order.
+            warm_start_epochs: if not None and warm_start, the epochs for which to
+                fit warm started trials.
+            fit_kwargs: arguments passed to the model's fit in every trial which are
+                not searched over, such as num_workers.
+
+        Returns:
+            A dataframe with one row per trial, with one column per hyperparameter
+            and columns seed, score, fit_seconds, and warm_started.
+        """
+        trials = grid_search(
+            self._model,
+            self._training_data,
+            self._validation_data,
+            grid,
+            prediction_method=self._prediction_method,
+            num_workers=num_workers,
+            seed=seed,
+            block_size=self._evaluation_block_size,
+            warm_start=warm_start,
+            warm_start_epochs=warm_start_epochs,
+            fit_kwargs=fit_kwargs,
+        )
+
+        self._checkrep()
+        return trials
+
+    def fit_with_validation(
+        self,
+        search_workers: int = 1,
+        search_seed: int | None = None,
+        search_warm_start_epochs: int | None = None,
+        fit_kwargs: dict | None = None,
+        **kwargs,
+    ) -> dict[str, float]:
         """Fits the model by validating hyperparameters on the cross validation data.
 
-        Selects the hyperparameters which maximize normalized discounted cumulative gain
-        (NDCG) on the validation data.
+        Selects the hyperparameters which maximize recall@20 on the validation data,
+        then refits the model with them and the seed of their trial, which
+        reproduces the model of that trial unless the search was warm started.
 
         Args:
+            search_workers: the number of processes in which to run trials.
+            search_seed: the seed of the trial seeds.  If None, it is drawn from the
+                global numpy random state.
+            search_warm_start_epochs: if not None, search with warm started trials
+                fit for this many epochs; see search.  The best hyperparameters are
+                still refit from newly initialized embeddings for their epochs.
+            fit_kwargs: arguments passed to the model's fit in every trial and in
+                the refit which are not searched over, such as num_workers.
             kwargs: mapping of hyperparameter to values over which to cross-validate.
 
         Returns:
             A mapping of each kwarg to the value from the best hyperparameter
             combination.
+
+        Mutates:
+            The global numpy and tensorflow random states.
         """
+        trials = self.search(
+            kwargs,
+            num_workers=search_workers,
+            seed=search_seed,
+            warm_start=search_warm_start_epochs is not None,
+            warm_start_epochs=search_warm_start_epochs,
+            fit_kwargs=fit_kwargs,
+        )
 
-        def parameter_cartesian_product(
-            variables_names: tuple[str],
-            values: tuple[tuple[float]],
-        ):
-            """Yield cartesian product of all variables.
-
-            Args:
-                variable_names: iterable of variables for which to generate
-                    combinations.
-                values: the values over which to generate combinations such that
-                    values[i] contains all values for variables[i].
-
-            Yields:
-                A dictionary mapping each variable to a value such that each dictionary
-                yielded is a unique combination of the cartesian product of values over
-                variables.
-            """
-            assert len(variables_names) == len(values)
-
-            # base case: No variables over which to make product
-
-            if len(variables_names) == 0:
-                yield {}
-            else:
-                for value in values[0]:
-                    for remaining_parameters in parameter_cartesian_product(
-                        variables_names[1:], values[1:]
-                    ):
-                        yield remaining_parameters | {variables_names[0]: value}
+        # the first trial wins ties
+        best_trial = trials["score"].idxmax()
+        best_hyperparameters = get_parameter_grid(kwargs)[best_trial]
 
-        best_hyperparameters = {}
-        best_score = -float("inf")
+        set_trial_seed(trials.loc[best_trial, "seed"])
+        self.fit(**(fit_kwargs or {}), **best_hyperparameters)
 
-        variable_names = tuple(kwargs.keys())
-        variable_values = tuple(kwargs.get(key) for key in variable_names)
+        return best_hyperparameters
+
+    def fit_with_successive_halving(
+        self,
+        max_epochs: int,
+        min_epochs: int = 1,
+        reduction_factor: int = 3,
+        search_seed: int | None = None,
+        fit_kwargs: dict | None = None,
+        **kwargs,
+    ) -> dict[str, float]:
+        """Fits the model by successive halving on the cross validation data.
+
+        Every hyperparameter combination is fit for min_epochs epochs, and only the
+        best 1/reduction_factor by recall@20 on the validation data continue
+        training, for reduction_factor times as many epochs, until the survivors
+        are fit for max_epochs.  The best final trial becomes the model, without
+        refitting.  See tie.search.SuccessiveHalvingSearch.
+
+        Args:
+            max_epochs: the number of epochs for which the final trials are fit.
+            min_epochs: the number of epochs for which every trial is first fit.
+            reduction_factor: the factor by which the number of trials shrinks, and
+                the number of epochs grows, at each rung.
+            search_seed: the seed of the trial seeds.  If None, it is drawn from the
+                global numpy random state.
+            fit_kwargs: arguments passed to the model's fit in every trial which are
+                not searched over, such as num_workers.
+            kwargs: mapping of hyperparameter, other than epochs, to values over
+                which to cross-validate.
+
+        Returns:
+            A mapping of each kwarg, and epochs, to the value from the best
+            hyperparameter combination.
+        """
+        search = SuccessiveHalvingSearch(
+            self._model,
+            self._training_data,
+            self._validation_data,
+            kwargs,
+            max_epochs=max_epochs,
+            min_epochs=min_epochs,
+            reduction_factor=reduction_factor,
+            prediction_method=self._prediction_method,
+            seed=search_seed,
+            block_size=self._evaluation_block_size,
+            fit_kwargs=fit_kwargs,
+        )
+        self._start_fit_generation()
+        search.run()
+
+        best_hyperparameters, self._model = search.get_best()
+
+        return best_hyperparameters
 
-        for hyperparameters in parameter_cartesian_product(
-            variable_names, variable_values
-        ):
-            self.fit(**hyperparameters)
-            score = recall_at_k(self.predict(), self._validation_data.to_pandas(), k=20)
+    def fit_with_regularization_path(
+        self,
+        search_seed: int | None = None,
+        fit_kwargs: dict | None = None,
+        **kwargs,
+    ) -> dict[str, float]:
+        """Fits the WALS model by validating a regularization path.
+
+        Each combination of the hyperparameters other than regularization_coefficient
+        is fit once for every coefficient, and the coefficients are scored by
+        recall@20 on the validation data; see tie.search.regularization_path_search.
+        The best hyperparameters are then refit exactly with the seed of their
+        path.
+
+        The scores are approximate: every coefficient on a path shares the item
+        factors of one fit at the median coefficient, and only the entity factors
+        are solved per coefficient.  They may therefore rank coefficients
+        differently than fit_with_validation, especially for grids spanning orders
+        of magnitude.
+
+        Args:
+            search_seed: the seed of the trial seeds.  If None, it is drawn from the
+                global numpy random state.
+            fit_kwargs: arguments passed to every path fit and to the refit which
+                are not searched over, such as num_workers.
+            kwargs: mapping of hyperparameter to values over which to cross-validate.
+                Requires regularization_coefficient in kwargs.
+
+        Returns:
+            A mapping of each kwarg to the value from the best hyperparameter
+            combination.
+
+        Mutates:
+            The global numpy and tensorflow random states.
+        """
+        assert isinstance(self._model, WalsRecommender)
+
+        trials = regularization_path_search(
+            self._model,
+            self._training_data,
+            self._validation_data,
+            kwargs,
+            prediction_method=self._prediction_method,
+            seed=search_seed,
+            block_size=self._evaluation_block_size,
+            fit_kwargs=fit_kwargs,
+        )
 
-            if score > best_score:
-                best_score = score
-                best_hyperparameters = hyperparameters
+        # the first trial wins ties
+        best_trial = trials["score"].idxmax()
+        best_hyperparameters = get_parameter_grid(kwargs)[best_trial]
 
-        self.fit(**best_hyperparameters)
+        set_trial_seed(trials.loc[best_trial, "seed"])
+        self.fit(**(fit_kwargs or {}), **best_hyperparameters)
 
         return best_hyperparameters
 
+    def evaluate(
+        self, ks: tuple[int] = (5, 10, 20), exclude_training: bool = False
+    ) -> pd.DataFrame:
+        """Computes top k ranking metrics of the model on the test set.
+
+        All metrics for all k are computed from a single partial sort of the
+        predictions, which are made evaluation_block_size reports at a time.  See
+        tie.utils.evaluate_top_k for the metric definitions.  Metrics are memoized
+        per k until the next fit, so only values of k not yet evaluated are
+        computed.
+
+        Args:
+            ks: the values of k at which to compute the metrics.  Requires
+                0 < k <= n for each k.
+            exclude_training: whether to remove each report's training techniques
+                from its ranking.
+
+        Returns:
+            A dataframe indexed by k with columns precision, recall, ndcg, hit_rate
+            and mrr.
+        """
+        ks = tuple(sorted(set(ks)))
+
+        def get_key(k: int) -> tuple:
+            return (self._fit_generation, ("metrics", k, exclude_training))
+
+        # read memoized metrics before memoizing new ones, which may evict them
+        metrics_by_k = {
+            k: self._memo[get_key(k)] for k in ks if get_key(k) in self._memo
+        }
+
+        missing_ks = tuple(k for k in ks if k not in metrics_by_k)
+        if len(missing_ks) > 0:
+            missing_metrics = self._evaluate_top_k(
+                self._test_data, ks=missing_ks, exclude_training=exclude_training
+            )
+            for k in missing_ks:
+                metrics_by_k[k] = self._memo.get(
+                    get_key(k), lambda k=k: missing_metrics.loc[k]
+                )
+
+        metrics = pd.DataFrame(
+            [metrics_by_k[k] for k in ks], index=pd.Index(ks, name="k")
+        )
+
+        self._checkrep()
+        return metrics
+
     def precision(self, k: int = 10) -> float:
         r"""Calculates the precision of the top k model predictions.
 
@@ -201,7 +501,7 @@ class TechniqueInferenceEngine:
         Returns:
             The computed precision for the top k model predictions.
         """
-        return precision_at_k(self.predict(), self._test_data.to_pandas(), k)
+        return self.evaluate(ks=(k,)).loc[k, "precision"]
 
     def recall(self, k: int = 10) -> float:
         r"""Calculates the recall of the top k model predictions.
@@ -220,7 +520,7 @@ class TechniqueInferenceEngine:
         Returns:
             The computed recall for the top k model predictions.
         """
-        return recall_at_k(self.predict(), self._test_data.to_pandas(), k)
+        return self.evaluate(ks=(k,)).loc[k, "recall"]
 
     def normalized_discounted_cumulative_gain(self, k: int = 10) -> float:
         r"""Computes the Normalized Discounted Cumulative Gain (NDCG) on the test set.
@@ -243,9 +543,7 @@ class TechniqueInferenceEngine:
         Returns:
             NDCG computed on the top k predictions.
         """
-        return normalized_discounted_cumulative_gain(
-            self.predict(), self._test_data.to_pandas(), k=k
-        )
+        return self.evaluate(ks=(k,)).loc[k, "ndcg"]
 
     def predict(self) -> pd.DataFrame:
         """Obtains model predictions.
@@ -255,17 +553,22 @@ class TechniqueInferenceEngine:
         technique a than technique b represents an inference that technique a is more
         likely in the report than technique b.
 
+        The dataframe is memoized until the next fit and returned without copying,
+        so it must be treated as read-only.
+
         Returns:
             A dataframe with the same shape, index, and columns as training_data and
             test_data containing the predictions values for each report and technique
-            combination.
+            combination.  Requires callers not mutate it.
         """
-        predictions = self._model.predict(method=self._prediction_method)
-
-        predictions_dataframe = pd.DataFrame(
-            predictions,
-            index=self._training_data.report_ids,
-            columns=self._training_data.technique_ids,
+        predictions_dataframe = self._memoize(
+            "predictions",
+            lambda: pd.DataFrame(
+                self._get_prediction_matrix().to_numpy(),
+                index=self._training_data.report_ids,
+                columns=self._training_data.technique_ids,
+                copy=False,
+            ),
         )
 
         self._checkrep()
@@ -290,12 +593,18 @@ class TechniqueInferenceEngine:
                 - technique_name: the technique name for the identifying technique in
                   the index
         """
+        # only the report's row of each matrix is computed
+        rows = np.array([self._get_report_index(report_id)])
+        predictions = self._get_prediction_matrix()
+
         report_data = pd.DataFrame(
             {
-                "predictions": self.predict().loc[report_id],
-                "training_data": self._training_data.to_pandas().loc[report_id],
-                "test_data": self._test_data.to_pandas().loc[report_id],
-            }
+                "predictions": predictions.rows(rows)[0],
+                "training_data": self._training_data.to_scipy()[rows].toarray()[0],
+                "test_data": self._test_data.to_scipy()[rows].toarray()[0],
+            },
+            index=self._training_data.technique_ids,
+            dtype=np.float64,
         )
 
         # add name for convenience
@@ -304,6 +613,44 @@ class TechniqueInferenceEngine:
         self._checkrep()
         return report_data
 
+    def _get_report_index(self, report_id: int) -> int:
+        """Gets the row index of a report.
+
+        Args:
+            report_id: identifier for the report.  Must be in the training_data.
+
+        Returns:
+            The row of report_id in the training, validation, and test data.
+        """
+        (rows,) = np.nonzero(self._training_data.report_ids == report_id)
+        assert len(rows) == 1
+        return int(rows[0])
+
+    def _get_technique_indices(self, techniques: frozenset[str]) -> list[int]:
+        """Gets the column index of each technique, in increasing order.
+
+        Args:
+            techniques: an iterable of MITRE technique identifiers.
+
+        Returns:
+            The sorted column indices of techniques in the training data.
+
+        Raises:
+            TechniqueNotFoundException: if the model was not trained on a technique.
+        """
+        technique_indices = set()
+        for technique in techniques:
+            if technique in self._technique_ids_to_indices:
+                technique_indices.add(self._technique_ids_to_indices[technique])
+            else:
+                raise TechniqueNotFoundException(
+                    f"Model has not been trained on {technique}."
+                )
+
+        technique_indices = list(technique_indices)
+        technique_indices.sort()
+        return technique_indices
+
     def predict_for_new_report(
         self, techniques: frozenset[str], **kwargs
     ) -> pd.DataFrame:
@@ -324,21 +671,7 @@ class TechniqueInferenceEngine:
         """
         # need to turn into the embeddings in the original matrix
         all_technique_ids = self._training_data.technique_ids
-        technique_ids_to_indices = {
-            all_technique_ids[i]: i for i in range(len(all_technique_ids))
-        }
-
-        technique_indices = set()
-        for technique in techniques:
-            if technique in technique_ids_to_indices:
-                technique_indices.add(technique_ids_to_indices[technique])
-            else:
-                raise TechniqueNotFoundException(
-                    f"Model has not been trained on {technique}."
-                )
-
-        technique_indices = list(technique_indices)
-        technique_indices.sort()
+        technique_indices = self._get_technique_indices(techniques)
         technique_indices_2d = np.expand_dims(np.array(technique_indices), axis=1)
 
         # 1 for each index
@@ -369,6 +702,189 @@ class TechniqueInferenceEngine:
         self._checkrep()
         return result_dataframe
 
+    def top_k(
+        self,
+        techniques: frozenset[str],
+        k: int = 10,
+        exclude_input: bool = True,
+        allowed_techniques: frozenset[str] | None = None,
+        denied_techniques: frozenset[str] | None = None,
+        **kwargs,
+    ) -> pd.DataFrame:
+        """Gets the top predicted techniques for a new, yet-unseen report.
+
+        Only the k best techniques are selected and sorted, so this is much cheaper
+        than sorting the result of predict_for_new_report.
+
+        Args:
+            techniques: an iterable of MITRE technique identifiers involved
+                in the new report.
+            k: the maximum number of techniques to get.  Requires k > 0.
+            exclude_input: whether to exclude techniques from the result.
+            allowed_techniques: if not None, only these techniques may be in the
+                result.
+            denied_techniques: if not None, these techniques are excluded from the
+                result.
+
+        Kwargs: Model specific args.
+
+        Returns:
+            A dataframe of at most k rows indexed by technique id, in descending order
+            of prediction, containing the following columns:
+                - predictions, the predicted value for that technique
+                - technique_name: the technique name for the identifying technique in
+                  the index
+
+        Raises:
+            TechniqueNotFoundException: if the model was not trained on a technique.
+        """
+        assert k > 0
+
+        all_technique_ids = self._training_data.technique_ids
+        technique_indices = self._get_technique_indices(techniques)
+
+        technique_tensor = tf.SparseTensor(
+            indices=np.array(technique_indices, dtype=np.int64).reshape(-1, 1),
+            values=np.ones((len(technique_indices),)),
+            dense_shape=(self._training_data.n,),
+        )
+        predictions = self._model.predict_new_entity(
+            technique_tensor, method=self._prediction_method, **kwargs
+        )
+
+        allowed = np.ones(len(all_technique_ids), dtype=np.bool_)
+        if exclude_input:
+            allowed[technique_indices] = False
+        if allowed_techniques is not None:
+            allowed &= np.isin(all_technique_ids, tuple(allowed_techniques))
+        if denied_techniques is not None:
+            allowed &= ~np.isin(all_technique_ids, tuple(denied_techniques))
+
+        k = min(k, int(allowed.sum()))
+        if k == 0:
+            top_indices = np.zeros((0,), dtype=np.int64)
+            top_predictions = np.zeros((0,))
+        else:
+            top_indices, top_predictions = get_top_k(
+                np.expand_dims(predictions, axis=0), k, allowed=allowed
+            )
+            top_indices = top_indices[0]
+            top_predictions = top_predictions[0]
+
+        result_dataframe = pd.DataFrame(
+            {"predictions": top_predictions},
+            index=all_technique_ids[top_indices],
+        )
+        self._add_technique_name_to_dataframe(result_dataframe)
+
+        self._checkrep()
+        return result_dataframe
+
+    def predict_for_new_reports(
+        self,
+        technique_sets: Sequence[frozenset[str]],
+        top_k: int = 10,
+        exclude_input: bool = True,
+        **kwargs,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Predicts the top techniques for a batch of new, yet-unseen reports.
+
+        All reports are folded into the model together, which for models supporting
+        batched fold-in is much faster than calling predict_for_new_report on each.
+
+        Args:
+            technique_sets: the MITRE technique identifiers involved in each of the b
+                new reports.  May be empty.
+            top_k: the number of techniques to predict for each report.  Requires
+                0 < top_k <= n.
+            exclude_input: whether to exclude each report's own techniques from its
+                result.  Excluded techniques only appear if fewer than top_k
+                techniques remain for a report.
+
+        Kwargs: Model specific args.
+
+        Returns:
+            A tuple (technique_ids, predictions) of bxtop_k arrays such that
+            technique_ids[i] are the top_k predicted techniques for report i in
+            descending order of predicted value, and predictions[i] are their
+            predicted values.
+
+        Raises:
+            TechniqueNotFoundException: if the model was not trained on a technique.
+        """
+        n = self._training_data.n
+        assert 0 < top_k <= n
+
+        rows = []
+        columns = []
+        for row, techniques in enumerate(technique_sets):
+            technique_indices = self._get_technique_indices(techniques)
+            rows.extend(row for _ in technique_indices)
+            columns.extend(technique_indices)
+
+        b = len(technique_sets)
+        if b == 0:
+            return (
+                np.empty((0, top_k), dtype=self._training_data.technique_ids.dtype),
+                np.zeros((0, top_k)),
+            )
+
+        reports_tensor = tf.SparseTensor(
+            indices=np.array((rows, columns), dtype=np.int64).T.reshape(-1, 2),
+            values=np.ones((len(rows),)),
+            dense_shape=(b, n),
+        )
+
+        predictions = self._model.predict_new_entities(
+            reports_tensor, method=self._prediction_method, **kwargs
+        )
+
+        excluded = None
+        if exclude_input:
+            excluded = sparse.csr_matrix(
+                (np.ones((len(rows),)), (rows, columns)), shape=(b, n)
+            )
+        top_indices, top_predictions = get_top_k(predictions, top_k, excluded=excluded)
+
+        self._checkrep()
+        return self._training_data.technique_ids[top_indices], top_predictions
+
+    def create_session(
+        self,
+        regularization_coefficient: float,
+        techniques: frozenset[str] = frozenset(),
+        c: float | None = None,
+    ) -> ReportSession:
+        """Creates an interactive session for building up a new report.
+
+        The session folds the report into the trained model incrementally as
+        techniques are added and removed.  Requires that the model is a
+        WalsRecommender.
+
+        Args:
+            regularization_coefficient: Coefficient on the embedding regularization
+                term.
+            techniques: The techniques initially in the report.
+            c: Weight for negative training examples, accepted for symmetry with
+                predict_for_new_report.  It does not change the WALS fold-in.
+
+        Returns:
+            A new session for the report.
+
+        Raises:
+            TechniqueNotFoundException: if the model was not trained on a technique.
+        """
+        assert isinstance(self._model, WalsRecommender)
+
+        self._checkrep()
+        return ReportSession(
+            V=self._model.V,
+            technique_ids=self._training_data.technique_ids,
+            regularization_coefficient=regularization_coefficient,
+            prediction_method=self._prediction_method,
+            techniques=techniques,
+        )
+
     def get_U(self) -> np.ndarray:
         """Get the item embeddings of the model."""
         return self._model.U
@@ -1,21 +1,51 @@
 import numpy as np
 import pandas as pd
 import tensorflow as tf
+from scipy import sparse
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    """Returns a read-only view of array."""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def _compact_values(values: np.ndarray) -> np.ndarray:
+    """Converts integer values to the smallest integer dtype that holds them."""
+    if np.issubdtype(values.dtype, np.integer) and len(values) > 0:
+        dtype = np.result_type(
+            np.min_scalar_type(values.min()), np.min_scalar_type(values.max())
+        )
+        return values.astype(dtype, copy=False)
+    return values
 
 
 class ReportTechniqueMatrix:
-    """An immutable report technique matrix."""
+    """An immutable report technique matrix.
+
+    The matrix is stored in compressed sparse row (CSR) format, so conversions to
+    scipy, numpy, and tensorflow representations never iterate over the entries in
+    Python.
+    """
 
     # Abstraction function:
-    # 	AF(indices, values, report_ids, technique_ids) = a sparse matrix A where
-    #       A_{ij} = values[k] where k is the index for (i, j) in indices, if present.
-    #       and A_{ij} corresponds to the report report_ids[i] and
-    #       technique technique_ids[j]
+    # 	AF(indptr, column_indices, values, report_ids, technique_ids) = a sparse
+    #       matrix A where A_{ij} = values[p] for the p with
+    #       indptr[i] <= p < indptr[i+1] and column_indices[p] == j, if present, and
+    #       0 otherwise.  A_{ij} corresponds to the report report_ids[i] and
+    #       technique technique_ids[j].
     # Rep invariant:
-    # - len(indices) > 0
-    # - len(values) == len(indices)
+    # - len(column_indices) > 0
+    # - len(values) == len(column_indices)
+    # - len(indptr) == len(report_ids) + 1
+    # - indptr[0] == 0 and indptr[-1] == len(column_indices)
+    # - indptr is nondecreasing
+    # - 0 <= column_indices[p] < len(technique_ids) for all p
+    # - column_indices is strictly increasing within each row
+    # - indptr and column_indices are int32
     # Safety from rep exposure:
-    # - all fields in rep are private and immutable
+    # - all fields in rep are private, read-only numpy arrays and never reassigned
 
     def __init__(
         self,
@@ -35,20 +65,115 @@ class ReportTechniqueMatrix:
             technique_ids: unique identifiers for techniques such that technique_ids[i]
                 is the unique identifier for column j of the sparse matrix.
         """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, 2)
+        values = np.asarray(values)
+        assert len(values) == len(indices)
+
+        rows = indices[:, 0]
+        columns = indices[:, 1]
 
-        self._indices = tuple(indices)
-        self._values = tuple(values)
-        self._report_ids = tuple(report_ids)
-        self._technique_ids = tuple(technique_ids)
+        # sort by row, then by column within each row
+        order = np.lexsort((columns, rows))
+
+        m = len(report_ids)
+        indptr = np.zeros(m + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=m), out=indptr[1:])
+
+        self._set_rep(
+            indptr=indptr,
+            column_indices=columns[order],
+            values=values[order],
+            report_ids=report_ids,
+            technique_ids=technique_ids,
+        )
+
+    @classmethod
+    def from_csr(
+        cls,
+        indptr: np.ndarray,
+        column_indices: np.ndarray,
+        values: np.ndarray,
+        report_ids: np.ndarray,
+        technique_ids: np.ndarray,
+    ):  # -> ReportTechniqueMatrix:
+        """Creates a ReportTechniqueMatrix directly from CSR arrays.
+
+        The arrays are used without copying where their dtypes already match the
+        internal representation.
+
+        Args:
+            indptr: length m+1 array such that the entries of row i are stored at
+                positions indptr[i]:indptr[i+1] of column_indices and values.
+            column_indices: column index of each entry, sorted within each row.
+            values: value of each entry.
+            report_ids: unique identifiers for the m reports.
+            technique_ids: unique identifiers for the n techniques.
+
+        Returns:
+            A new ReportTechniqueMatrix object.
+        """
+        matrix = cls.__new__(cls)
+        matrix._set_rep(
+            indptr=indptr,
+            column_indices=column_indices,
+            values=values,
+            report_ids=report_ids,
+            technique_ids=technique_ids,
+        )
+        return matrix
+
+    def _set_rep(
+        self,
+        indptr: np.ndarray,
+        column_indices: np.ndarray,
+        values: np.ndarray,
+        report_ids: np.ndarray,
+        technique_ids: np.ndarray,
+    ):
+        """Sets the rep from CSR arrays and checks the full rep invariant."""
+        # int32 indices must be able to address every entry
+        assert np.asarray(indptr)[-1] <= np.iinfo(np.int32).max
+
+        self._indptr = _read_only(np.asarray(indptr, dtype=np.int32))
+        self._column_indices = _read_only(np.asarray(column_indices, dtype=np.int32))
+        self._values = _read_only(_compact_values(np.asarray(values)))
+        self._report_ids = _read_only(np.asarray(report_ids))
+        self._technique_ids = _read_only(np.asarray(technique_ids))
+
+        # - indptr and column_indices are int32
+        assert self._indptr.dtype == self._column_indices.dtype == np.int32
+        # - len(indptr) == len(report_ids) + 1
+        assert self._indptr.shape == (len(self._report_ids) + 1,)
+        # - indptr is nondecreasing
+        row_lengths = np.diff(self._indptr)
+        assert (row_lengths >= 0).all()
+        # - 0 <= column_indices[p] < len(technique_ids) for all p
+        assert (self._column_indices >= 0).all()
+        assert (self._column_indices < len(self._technique_ids)).all()
+        # - column_indices is strictly increasing within each row
+        increasing = np.diff(self._column_indices) > 0
+        # positions where a new row starts need not be increasing
+        row_starts = self._indptr[1:-1]
+        row_starts = row_starts[(row_starts > 0) & (row_starts < self.nnz)]
+        increasing[row_starts - 1] = True
+        assert increasing.all()
 
         self._checkrep()
 
     def _checkrep(self):
-        """Asserts the rep invariant."""
-        # - len(indices) > 0
-        assert len(self._indices) > 0
-        # - len(values) == len(indices)
-        assert len(self._values) == len(self._indices)
+        """Asserts the rep invariant.
+
+        Only the constant time portions of the rep invariant are checked here.  The
+        full rep invariant is checked once on construction since the rep is
+        immutable.
+        """
+        # - len(column_indices) > 0
+        assert len(self._column_indices) > 0
+        # - len(values) == len(column_indices)
+        assert len(self._values) == len(self._column_indices)
+        # - indptr[0] == 0 and indptr[-1] == len(column_indices)
+        assert self._indptr[0] == 0
+        assert self._indptr[-1] == len(self._column_indices)
 
     @property
     def m(self):
@@ -62,45 +187,97 @@ class ReportTechniqueMatrix:
         self._checkrep()
         return len(self._technique_ids)
 
+    @property
+    def nnz(self) -> int:
+        """The number of nonempty entries of the matrix."""
+        self._checkrep()
+        return len(self._column_indices)
+
     @property
     def shape(self) -> tuple[int, int]:
         """Gets the shape of the matrix."""
         return (self.m, self.n)
 
     @property
-    def indices(self) -> tuple[tuple[int]]:
-        """Gets the nonempty indices of the matrix."""
-        # ok since immutable
+    def indptr(self) -> np.ndarray:
+        """Gets the length m+1 CSR row pointer array of the matrix."""
+        # ok since read-only
+        self._checkrep()
+        return self._indptr
+
+    @property
+    def column_indices(self) -> np.ndarray:
+        """Gets the CSR column index of each nonempty entry of the matrix."""
+        # ok since read-only
+        self._checkrep()
+        return self._column_indices
+
+    @property
+    def values(self) -> np.ndarray:
+        """Gets the value of each nonempty entry of the matrix, in CSR order."""
+        # ok since read-only
+        self._checkrep()
+        return self._values
+
+    @property
+    def row_indices(self) -> np.ndarray:
+        """Gets the row index of each nonempty entry of the matrix, in CSR order."""
         self._checkrep()
-        return self._indices
+        return np.repeat(np.arange(self.m, dtype=np.int32), np.diff(self._indptr))
 
     @property
-    def report_ids(self) -> tuple[int]:
+    def indices(self) -> np.ndarray:
+        """Gets the nonempty indices of the matrix as an nnz x 2 array of (row, col)."""
+        self._checkrep()
+        return np.column_stack((self.row_indices, self._column_indices)).astype(
+            np.int64
+        )
+
+    @property
+    def report_ids(self) -> np.ndarray:
         """Gets the report ids that make up the row index of the matrix."""
+        # ok since read-only
         self._checkrep()
         return self._report_ids
 
     @property
-    def technique_ids(self) -> tuple[str]:
+    def technique_ids(self) -> np.ndarray:
         """Gets the technique ids that make up the column index of the matrix."""
+        # ok since read-only
         self._checkrep()
         return self._technique_ids
 
+    def to_scipy(self) -> sparse.csr_matrix:
+        """Converts the matrix to a scipy CSR matrix sharing this matrix's arrays.
+
+        The returned matrix is backed by read-only arrays and must not be modified
+        in place.
+        """
+        self._checkrep()
+        return sparse.csr_matrix(
+            (self._values, self._column_indices, self._indptr),
+            shape=self.shape,
+            copy=False,
+        )
+
     def to_sparse_tensor(self) -> tf.SparseTensor:
-        """Converts the matrix to a sparse tensor."""
+        """Converts the matrix to a sparse tensor.
+
+        Entries are in row-major order, so the tensor does not need reordering.
+        """
+        values = self._values
+        if np.issubdtype(values.dtype, np.integer):
+            values = values.astype(np.int32)
+
         self._checkrep()
         return tf.SparseTensor(
-            indices=self._indices, values=self._values, dense_shape=(self.m, self.n)
+            indices=self.indices, values=values, dense_shape=(self.m, self.n)
         )
 
     def to_numpy(self) -> np.ndarray:
         """Converts the matrix to a numpy array of shape."""
         data = np.zeros(self.shape)
-
-        horizontal_indices = tuple(index[0] for index in self._indices)
-        vertical_indices = tuple(index[1] for index in self._indices)
-
-        data[horizontal_indices, vertical_indices] = self._values
+        data[self.row_indices, self._column_indices] = self._values
 
         self._checkrep()
         return data
@@ -114,34 +291,44 @@ class ReportTechniqueMatrix:
             columns=self._technique_ids,
         )
 
-    def mask(self, indices: frozenset[tuple[int]]):  # -> ReportTechniqueMatrix:
+    def mask(
+        self, indices: np.ndarray | frozenset[tuple[int]]
+    ):  # -> ReportTechniqueMatrix:
         """Generates a new ReportTechniqueMatrix object with a subset of the indices.
 
+        The new object shares the report and technique id arrays of this matrix.
+
         Args:
-            indices: indices to include in the new object.
+            indices: indices to include in the new object.  Either a boolean array
+                of length nnz such that indices[p] is True if the pth entry, in CSR
+                order, is included, or a set of (row, column) tuples.  Requires every
+                (row, column) tuple is a nonempty index of this matrix.
 
         Returns:
             A new ReportTechniqueMatrix object.
         """
-        new_indices = []
-        new_values = []
-
-        for i in range(len(self._indices)):
-            old_index = self._indices[i]
+        if isinstance(indices, np.ndarray) and indices.dtype == np.bool_:
+            assert indices.shape == (self.nnz,)
+            keep = indices
+        else:
+            requested = np.asarray(tuple(indices), dtype=np.int64).reshape(-1, 2)
+            requested_keys = requested[:, 0] * self.n + requested[:, 1]
+            keys = self.row_indices.astype(np.int64) * self.n + self._column_indices
 
-            if old_index in indices:
-                old_value = self._values[i]
-                new_indices.append(old_index)
-                new_values.append(old_value)
+            keep = np.isin(keys, requested_keys)
+            assert keep.sum() == len(indices)
 
-        assert len(new_indices) == len(indices)
-        assert len(new_values) == len(indices)
+        # number of kept entries before each row start
+        kept_before = np.zeros(self.nnz + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept_before[1:])
+        new_indptr = kept_before[self._indptr]
 
         self._checkrep()
 
-        return ReportTechniqueMatrix(
-            indices=new_indices,
-            values=new_values,
+        return ReportTechniqueMatrix.from_csr(
+            indptr=new_indptr,
+            column_indices=self._column_indices[keep],
+            values=self._values[keep],
             report_ids=self._report_ids,
             technique_ids=self._technique_ids,
         )
@@ -1,32 +1,77 @@
-import json
+import hashlib
 import math
-import random
-
+import os
+from array import array
+
+import numpy as np
+
+from tie.cache import (
+    get_cache_directory,
+    get_file_hash,
+    load_array,
+    save_array,
+    save_arrays,
+)
 from tie.matrix import ReportTechniqueMatrix
-from tie.utils import get_mitre_technique_ids_to_names
+from tie.report_reader import iter_report_techniques
+from tie.technique_index import get_technique_index
+
+# labels for the dataset to which each observation is assigned in a split
+_TRAIN = 0
+_TEST = 1
+_VALIDATION = 2
+
+# bumped whenever the cached matrix or split format changes
+_CACHE_FORMAT_VERSION = 1
+
+# arrays of a ReportTechniqueMatrix stored in the on-disk cache
+_CACHED_MATRIX_ARRAYS = ("indptr", "column_indices", "values", "technique_ids")
 
 
 class ReportTechniqueMatrixBuilder:
     """A builder for report technique matrices."""
 
     # Abstraction function:
-    # 	AF(combined_dataset_filepath, enterprise_attack_filepath) = a builder for
-    #       ReportTechniqueMatrix objects which adds m reports from the json object
-    #       located at combined_dataset_filepath, zero-indexing them according to their
-    #       location in the json, and n techniques according to the cardinality of the
-    #       set of all techniques from all bags of techniques in the json at
-    #       combined_dataset_filepath.  Techniques are indexed by MITRE ATT&CK id.
+    # 	AF(combined_dataset_filepath, enterprise_attack_filepath, use_cache,
+    #       cache_dir) = a builder for
+    #       ReportTechniqueMatrix objects which adds m reports from the json or json
+    #       lines dataset located at combined_dataset_filepath, zero-indexing them
+    #       according to their location in the dataset, and n techniques according to
+    #       the cardinality of the set of all valid techniques from all bags of
+    #       techniques in the dataset.  Techniques are indexed by MITRE ATT&CK id, in
+    #       sorted order.  If use_cache, built matrices and splits are stored in and
+    #       loaded from the on-disk cache cache_dir.
     # Rep invariant:
     #   - len(combined_dataset_filepath) >= 0
     #   - len(enterprise_attack_filepath) >= 0
     # Safety from rep exposure:
     #   - rep is private, and immutable and never reassigned
 
-    def __init__(self, combined_dataset_filepath: str, enterprise_attack_filepath: str):
-        """Initializes a ReportTechniqueMatrixBuilder object."""
+    def __init__(
+        self,
+        combined_dataset_filepath: str,
+        enterprise_attack_filepath: str,
+        use_cache: bool = False,
+        cache_dir: str | None = None,
+    ):
+        """Initializes a ReportTechniqueMatrixBuilder object.
+
+        Args:
+            combined_dataset_filepath: Location of the json or json lines combined
+                dataset.
+            enterprise_attack_filepath: Location of the Enterprise ATT&CK STIX
+                bundle.
+            use_cache: Whether to store built matrices and seeded splits in an
+                on-disk cache keyed by the contents of both files, and to load them
+                from the cache instead of rebuilding when available.
+            cache_dir: Directory of the on-disk cache.  See
+                tie.cache.get_cache_directory for the default.
+        """
 
         self._combined_datset_filepath = combined_dataset_filepath
         self._enterprise_attack_filepath = enterprise_attack_filepath
+        self._use_cache = use_cache
+        self._cache_dir = cache_dir
 
         self._checkrep()
 
@@ -37,98 +82,197 @@ class ReportTechniqueMatrixBuilder:
         #   - len(enterprise_attack_filepath) >= 0
         assert len(self._enterprise_attack_filepath) >= 0
 
-    def _get_report_techniques(self, filepath: str) -> tuple[frozenset[str]]:
-        """Gets a set of all MITRE technique ids present in each report.
+    def _get_matrix_cache_directory(self) -> str:
+        """Gets the cache directory for the matrix built from the current files."""
+        key = hashlib.sha256(
+            ":".join(
+                (
+                    str(_CACHE_FORMAT_VERSION),
+                    get_file_hash(self._combined_datset_filepath),
+                    get_file_hash(self._enterprise_attack_filepath),
+                )
+            ).encode()
+        ).hexdigest()
+
+        self._checkrep()
+        return os.path.join(get_cache_directory(self._cache_dir), f"matrix-{key}")
+
+    def _get_split_cache_filepath(
+        self, test_ratio: float, validation_ratio: float, seed: int
+    ) -> str:
+        """Gets the cache file for a seeded split of the current matrix."""
+        key = hashlib.sha256(
+            f"{test_ratio!r}:{validation_ratio!r}:{seed!r}".encode()
+        ).hexdigest()
 
-        Reports are in order of appearance in the json combined dataset located at
-        filepath.
+        self._checkrep()
+        return os.path.join(self._get_matrix_cache_directory(), f"split-{key}.npy")
 
-        All techniques are returned, regardless of whether they are valid
-        MITRE ATT&CK techniques.
+    def _parse(self) -> ReportTechniqueMatrix:
+        """Parses a ReportTechniqueMatrix from the dataset.
 
-        Args:
-            filepath: location of the json combined dataset.
+        The dataset is streamed into CSR arrays, so peak memory is proportional to
+        the size of the resulting matrix rather than the size of the dataset file.
 
         Returns:
-            An iterable of sets of techniques, where the ith set represents the set of
-            techniques in the ith report in the combined dataset.
+            A matrix of report data.
         """
-        with open(filepath) as f:
-            data = json.load(f)
+        # want matrix of reports on horizontal, techniques on vertical
+        all_mitre_technique_ids_to_names = get_technique_index(
+            self._enterprise_attack_filepath, self._cache_dir
+        ).get_technique_ids_to_names()
 
-        reports = data["reports"]
+        # techniques are provisionally indexed in order of first appearance
+        techniques_to_index = {}
 
-        report_techniques = []
+        # CSR arrays, built up one report at a time
+        indptr = array("i", (0,))
+        column_indices = array("i")
 
-        for report in reports:
-            techniques = report["mitre_techniques"]
-            report_techniques.append(frozenset(techniques.keys()))
+        # for each report, add the indices of its techniques
+        for report in iter_report_techniques(self._combined_datset_filepath):
+            for mitre_technique_id in report:
+                # some reports contain invalid techniques from ATT&CK v1
+                if mitre_technique_id in all_mitre_technique_ids_to_names:
+                    column_indices.append(
+                        techniques_to_index.setdefault(
+                            mitre_technique_id, len(techniques_to_index)
+                        )
+                    )
+            indptr.append(len(column_indices))
+
+        indptr = np.frombuffer(indptr, dtype=np.intc)
+        column_indices = np.frombuffer(column_indices, dtype=np.intc)
+
+        # reindex techniques in sorted order so the column index is deterministic
+        technique_ids = np.array(tuple(techniques_to_index), dtype=np.str_)
+        order = np.argsort(technique_ids)
+        new_column_index = np.empty_like(order)
+        new_column_index[order] = np.arange(len(order))
+
+        row_indices = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        column_indices = new_column_index[column_indices]
+        column_indices = column_indices[np.lexsort((column_indices, row_indices))]
+
+        data = ReportTechniqueMatrix.from_csr(
+            indptr=indptr,
+            column_indices=column_indices,
+            values=np.ones(len(column_indices), dtype=np.uint8),
+            report_ids=np.arange(len(indptr) - 1),
+            technique_ids=technique_ids[order],
+        )
 
         self._checkrep()
 
-        return tuple(report_techniques)
+        return data
 
     def build(self) -> ReportTechniqueMatrix:
         """Builds a ReportTechniqueMatrix from the dataset.
 
+        If caching is enabled, the matrix is memory mapped from the cache when
+        present, and otherwise is parsed and added to the cache.
+
         Returns:
             A matrix of report data.
         """
-        # want matrix of reports on horizontal, techniques on vertical
-        reports = self._get_report_techniques(self._combined_datset_filepath)
-        all_mitre_technique_ids_to_names = get_mitre_technique_ids_to_names(
-            self._enterprise_attack_filepath
-        )
+        if not self._use_cache:
+            return self._parse()
 
-        # get all techniques present in all reports
-        all_report_technique_ids = set()
-        for report in reports:
-            all_report_technique_ids.update(report)
-        # some reports contain invalid techniques from ATT&CK v1
-        technique_ids = tuple(
-            set(all_mitre_technique_ids_to_names.keys()).intersection(
-                all_report_technique_ids
+        directory = self._get_matrix_cache_directory()
+
+        if not os.path.isdir(directory):
+            data = self._parse()
+            save_arrays(
+                directory,
+                {name: getattr(data, name) for name in _CACHED_MATRIX_ARRAYS},
             )
+
+        arrays = {
+            name: load_array(os.path.join(directory, f"{name}.npy"))
+            for name in _CACHED_MATRIX_ARRAYS
+        }
+        data = ReportTechniqueMatrix.from_csr(
+            report_ids=np.arange(len(arrays["indptr"]) - 1), **arrays
         )
 
-        techniques_to_index = {technique_ids[i]: i for i in range(len(technique_ids))}
+        self._checkrep()
+
+        return data
 
-        indices = []
-        values = []
-        report_ids = tuple(range(len(reports)))
+    def _sample_split(
+        self,
+        data: ReportTechniqueMatrix,
+        test_ratio: float,
+        validation_ratio: float,
+        rng: np.random.Generator,
+    ) -> np.ndarray:
+        """Assigns each observation of data to the training, test, or validation set.
+
+        Strategy:
+        - sample one entry per nonempty row to make sure we have at least one
+          training item per row
+        - sample validation and then test entries uniformly without replacement
+          from the remaining entries
+        - training data = all entries - test entries - validation entries
 
-        # for each campaign, make a vector, filling in each present technique with a 1
-        for i in range(len(reports)):
-            report = reports[i]
+        Args:
+            data: The matrix to split.
+            test_ratio: The ratio of observations to assign to the test set.
+            validation_ratio: The ratio of observations to assign to the validation
+                set.
+            rng: The random number generator to use for sampling.
 
-            for mitre_technique_id in report:
-                if mitre_technique_id in techniques_to_index:
-                    # campaign id, technique id
-                    index = (i, techniques_to_index[mitre_technique_id])
-
-                    indices.append(index)
-                    values.append(1)
-
-        data = ReportTechniqueMatrix(
-            indices=indices,
-            values=values,
-            report_ids=report_ids,
-            technique_ids=technique_ids,
+        Returns:
+            A length data.nnz array such that the pth entry is _TRAIN, _TEST, or
+            _VALIDATION according to the set to which the pth entry of data, in CSR
+            order, is assigned.
+        """
+        num_observations = data.nnz
+        # make sure that we have enough observations
+        # to at least provide a single one per report
+        assert data.m <= num_observations * (1 - test_ratio - validation_ratio)
+        # use floor since we need to have at least one example in the training set for
+        # each report may mean slightly less (by 1) items in test or validation set
+        num_validation_samples = math.floor(validation_ratio * num_observations)
+        num_test_samples = math.floor(test_ratio * num_observations)
+
+        row_starts = data.indptr[:-1]
+        row_lengths = np.diff(data.indptr)
+        nonempty_rows = row_lengths > 0
+
+        # one guaranteed training entry per nonempty row
+        min_training_positions = row_starts[nonempty_rows] + rng.integers(
+            0, row_lengths[nonempty_rows]
         )
 
-        self._checkrep()
+        sampleable = np.ones(num_observations, dtype=np.bool_)
+        sampleable[min_training_positions] = False
 
-        return data
+        sampled_positions = rng.choice(
+            np.flatnonzero(sampleable),
+            size=num_validation_samples + num_test_samples,
+            replace=False,
+        )
+
+        split = np.full(num_observations, _TRAIN, dtype=np.int8)
+        split[sampled_positions[:num_validation_samples]] = _VALIDATION
+        split[sampled_positions[num_validation_samples:]] = _TEST
+
+        assert (split[min_training_positions] == _TRAIN).all()
+
+        self._checkrep()
+        return split
 
     def build_train_test_validation(
-        self, test_ratio: float, validation_ratio: float
+        self, test_ratio: float, validation_ratio: float, seed: int | None = None
     ) -> tuple[ReportTechniqueMatrix, ReportTechniqueMatrix, ReportTechniqueMatrix]:
         """Builds three matrices for each of the training, test, and validation data.
 
         The ReportTechniqueMatrices for each of the test and validation datasets contain
         test_ratio and validation_ratio proportion of the positive interactions from the
         dataset, respectively.  The training data contains the remainder of the
-        interactions.
+        interactions.  All three matrices share the row and column index arrays of
+        the full dataset.
 
         Ensures that each report has at least one technique example.
         To support this, requires the number of reports
@@ -142,6 +286,9 @@ class ReportTechniqueMatrixBuilder:
             validation_ratio: The ratio of positive interactions to include in the test
                 dataset compared to the total number of observed positive interactions.
                 Requires 0 <= test_ratio <= 1 and test_ratio + validation_ratio <= 1.
+            seed: Seed for the random number generator used to sample the split.  The
+                same seed on the same dataset always produces the same split.  If None,
+                the split is sampled with fresh entropy and is not cached.
 
         Returns:
             A tuple of the form training_data, test_data, validation_data containing
@@ -153,60 +300,24 @@ class ReportTechniqueMatrixBuilder:
 
         data = self.build()
 
-        num_observations = data.to_numpy().sum()
-        # make sure that we have enough observations
-        # to at least provide a single one per report
-        assert data.m <= num_observations * (1 - test_ratio - validation_ratio)
-        # use floor since we need to have at least one example in the training set for
-        # each report may mean slightly less (by 1) items in test or validation set
-        num_validation_samples = math.floor(validation_ratio * num_observations)
-        num_test_samples = math.floor(test_ratio * num_observations)
-
-        # Strategy:
-        # - sample one index per row to make sure we have at least one training item per
-        #   row
-        # - remove these from the indices available from which to sample the test and
-        #   validation data
-        # - sample test and validation data
-        # - training data = all indices - test indices - validation indices
-        # - make sure to sample at least one index per row by splitting indices by row
-        #   and sampling from each
-        indices_by_row = {index[0]: [] for index in data.indices}
-        for index in data.indices:
-            row, _ = index
-            indices_by_row[row].append(index)
-
-        min_training_indices = set()
-        for _, indices in indices_by_row.items():
-            minimum_sample_for_row = random.sample(indices, k=1)
-            assert len(minimum_sample_for_row) == 1
-            min_training_indices.add(minimum_sample_for_row[0])
-
-        remaining_indices_to_sample = frozenset(data.indices).difference(
-            min_training_indices
-        )
-
-        sampled_validation_indices = frozenset(
-            random.sample(sorted(remaining_indices_to_sample), k=num_validation_samples)
-        )
-        remaining_indices_to_sample = remaining_indices_to_sample.difference(
-            sampled_validation_indices
-        )
-
-        sampled_test_indices = frozenset(
-            random.sample(sorted(remaining_indices_to_sample), k=num_test_samples)
-        )
-
-        sampled_train_indices = frozenset(data.indices).difference(
-            sampled_validation_indices, sampled_test_indices
-        )
+        # an unseeded split is not reproducible, so it is never cached
+        split_filepath = None
+        if self._use_cache and seed is not None:
+            split_filepath = self._get_split_cache_filepath(
+                test_ratio, validation_ratio, seed
+            )
 
-        assert sampled_train_indices.isdisjoint(sampled_test_indices)
-        assert sampled_train_indices.isdisjoint(sampled_validation_indices)
-        assert sampled_test_indices.isdisjoint(sampled_validation_indices)
+        if split_filepath is not None and os.path.exists(split_filepath):
+            split = load_array(split_filepath)
+        else:
+            split = self._sample_split(
+                data, test_ratio, validation_ratio, rng=np.random.default_rng(seed)
+            )
+            if split_filepath is not None:
+                save_array(split_filepath, split)
 
-        training_data = data.mask(sampled_train_indices)
-        validation_data = data.mask(sampled_validation_indices)
-        test_data = data.mask(sampled_test_indices)
+        training_data = data.mask(split == _TRAIN)
+        validation_data = data.mask(split == _VALIDATION)
+        test_data = data.mask(split == _TEST)
 
         return (training_data, test_data, validation_data)
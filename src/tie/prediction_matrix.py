@@ -0,0 +1,259 @@
+from collections.abc import Iterator
+
+import numpy as np
+from scipy import sparse
+
+from tie.constants import PredictionMethod
+from tie.utils import EVALUATION_BLOCK_SIZE, get_top_k, scale_embeddings
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    """Returns a read-only copy of array."""
+    copy = np.array(array)
+    copy.flags.writeable = False
+    return copy
+
+
+class PredictionMatrix:
+    """An immutable, lazily evaluated mxn matrix of model predictions.
+
+    Entries are only computed when they are read, so reading a few rows or entries
+    costs time proportional to what is read rather than to mxn.
+    """
+
+    # Abstraction function:
+    # 	AF(m, U, V, vector) = the mxn matrix U V^T if vector is None, and otherwise
+    #       the mxn matrix whose every row is vector.
+    # Rep invariant:
+    # - m >= 0
+    # - exactly one of (U and V) and vector is None
+    # - if vector is None, U.shape == (m, k) and V.shape == (n, k) for some k
+    # - if vector is not None, vector.shape == (n,)
+    # Safety from rep exposure:
+    # - all fields are private and never reassigned
+    # - U, V, and vector are read-only copies
+    # - only newly computed arrays are returned
+
+    def __init__(
+        self,
+        m: int,
+        U: np.ndarray | None = None,
+        V: np.ndarray | None = None,
+        vector: np.ndarray | None = None,
+    ):
+        """Initializes a PredictionMatrix object.
+
+        Use from_factors or from_vector rather than calling this directly.
+
+        Args:
+            m: the number of rows.
+            U: mxk array of scaled entity embeddings, or None if vector is given.
+            V: nxk array of scaled item embeddings, or None if vector is given.
+            vector: length-n array repeated in every row, or None if U and V are
+                given.
+        """
+        self._m = m
+        self._U = None if U is None else _read_only(U)
+        self._V = None if V is None else _read_only(V)
+        self._vector = None if vector is None else _read_only(vector)
+
+        self._checkrep()
+
+    @classmethod
+    def from_factors(
+        cls,
+        U: np.ndarray,
+        V: np.ndarray,
+        method: PredictionMethod = PredictionMethod.DOT,
+    ):  # -> PredictionMatrix:
+        """Creates the prediction matrix UV^T according to the dot or cosine product.
+
+        Args:
+            U: mxk array of entity embeddings.
+            V: nxk array of item embeddings.
+            method: Matrix product method to use.
+
+        Returns:
+            A new PredictionMatrix object.
+        """
+        U_scaled, V_scaled = scale_embeddings(U, V, method)
+        return cls(m=U.shape[0], U=U_scaled, V=V_scaled)
+
+    @classmethod
+    def from_vector(cls, vector: np.ndarray, m: int):  # -> PredictionMatrix:
+        """Creates the prediction matrix whose every row is vector.
+
+        Args:
+            vector: length-n array of predictions shared by every entity.
+            m: the number of rows.
+
+        Returns:
+            A new PredictionMatrix object.
+        """
+        return cls(m=m, vector=vector)
+
+    def _checkrep(self):
+        """Asserts the rep invariant."""
+        # - m >= 0
+        assert self._m >= 0
+        # - exactly one of (U and V) and vector is None
+        assert (self._U is None) == (self._V is None)
+        assert (self._U is None) != (self._vector is None)
+        if self._vector is None:
+            # - if vector is None, U.shape == (m, k) and V.shape == (n, k) for some k
+            assert self._U.ndim == self._V.ndim == 2
+            assert self._U.shape[0] == self._m
+            assert self._U.shape[1] == self._V.shape[1]
+        else:
+            # - if vector is not None, vector.shape == (n,)
+            assert self._vector.ndim == 1
+
+    @property
+    def m(self) -> int:
+        """The number of rows of the matrix."""
+        self._checkrep()
+        return self._m
+
+    @property
+    def n(self) -> int:
+        """The number of columns of the matrix."""
+        self._checkrep()
+        if self._vector is None:
+            return self._V.shape[0]
+        return len(self._vector)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Gets the shape of the matrix."""
+        return (self.m, self.n)
+
+    @property
+    def nbytes(self) -> int:
+        """Gets the number of bytes used by the rep, which is far less than mxn."""
+        self._checkrep()
+        if self._vector is None:
+            return self._U.nbytes + self._V.nbytes
+        return self._vector.nbytes
+
+    def rows(self, rows: np.ndarray) -> np.ndarray:
+        """Computes a subset of the rows of the matrix.
+
+        Args:
+            rows: length-b array of row indices.
+
+        Returns:
+            A bxn array whose ith row is row rows[i] of the matrix.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+
+        self._checkrep()
+        if self._vector is None:
+            return self._U[rows] @ self._V.T
+        return np.repeat(np.expand_dims(self._vector, axis=0), len(rows), axis=0)
+
+    def gather(self, row_indices: np.ndarray, column_indices: np.ndarray) -> np.ndarray:
+        """Computes selected entries of the matrix.
+
+        Args:
+            row_indices: length-p array of the rows of the entries to compute.
+            column_indices: length-p array of the columns of the entries to compute.
+
+        Returns:
+            A length-p array whose ith entry is entry
+            (row_indices[i], column_indices[i]) of the matrix.
+        """
+        row_indices = np.asarray(row_indices, dtype=np.int64)
+        column_indices = np.asarray(column_indices, dtype=np.int64)
+        assert row_indices.shape == column_indices.shape
+
+        self._checkrep()
+        if self._vector is None:
+            return np.einsum(
+                "ij,ij->i",
+                self._U[row_indices],
+                self._V[column_indices],
+                optimize=False,
+            )
+        return self._vector[column_indices]
+
+    def iter_blocks(
+        self,
+        rows: np.ndarray | None = None,
+        block_size: int = EVALUATION_BLOCK_SIZE,
+    ) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """Computes rows of the matrix a block at a time.
+
+        Args:
+            rows: array of the row indices to compute, in order.  If None, all m
+                rows.
+            block_size: maximum number of rows per block.  Requires block_size > 0.
+
+        Yields:
+            A tuple (block_rows, block) for each block, where block_rows is an array
+            of at most block_size row indices and block is rows(block_rows).
+        """
+        assert block_size > 0
+        if rows is None:
+            rows = np.arange(self.m)
+
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start : start + block_size]
+            yield block_rows, self.rows(block_rows)
+
+    def top_k(
+        self,
+        k: int,
+        rows: np.ndarray | None = None,
+        excluded: sparse.spmatrix | None = None,
+        allowed: np.ndarray | None = None,
+        block_size: int = EVALUATION_BLOCK_SIZE,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Gets the k highest entries of rows of the matrix.
+
+        Rows are computed block_size at a time, so at most block_size rows of the
+        matrix are held in memory.
+
+        Args:
+            k: Number of entries to get per row.  Requires 0 < k <= n.
+            rows: Length-b array of the rows for which to get entries.  If None, all
+                m rows.
+            excluded: A bxn sparse matrix whose stored entries are never selected.
+            allowed: A length-n boolean array such that only columns j with
+                allowed[j] are selected.
+            block_size: maximum number of rows computed at a time.  Requires
+                block_size > 0.
+
+        Returns:
+            A tuple (indices, values) of bxk arrays as returned by
+            tie.utils.get_top_k for rows(rows).
+        """
+        assert 0 < k <= self.n
+        if rows is None:
+            rows = np.arange(self.m)
+        rows = np.asarray(rows, dtype=np.int64)
+        if excluded is not None:
+            assert excluded.shape == (len(rows), self.n)
+            excluded = sparse.csr_matrix(excluded)
+
+        indices = np.zeros((len(rows), k), dtype=np.int64)
+        values = np.zeros((len(rows), k))
+        start = 0
+        for block_rows, block in self.iter_blocks(rows, block_size=block_size):
+            end = start + len(block_rows)
+            indices[start:end], values[start:end] = get_top_k(
+                block,
+                k,
+                excluded=None if excluded is None else excluded[start:end],
+                allowed=allowed,
+            )
+            start = end
+
+        self._checkrep()
+        return indices, values
+
+    def to_numpy(self) -> np.ndarray:
+        """Materializes the full mxn matrix."""
+        self._checkrep()
+        if self._vector is None:
+            return self._U @ self._V.T
+        return np.repeat(np.expand_dims(self._vector, axis=0), self._m, axis=0)
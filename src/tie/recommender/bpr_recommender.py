@@ -1,14 +1,277 @@
 import math
+from collections.abc import Iterator
 
-import keras
 import numpy as np
 import tensorflow as tf
+from scipy import sparse
+from scipy.special import expit
+from sklearn.metrics import mean_squared_error
 
 from tie.constants import PredictionMethod
-from tie.utils import calculate_predicted_matrix
+from tie.prediction_matrix import PredictionMatrix
+from tie.utils import calculate_predicted_matrix, sparse_tensor_to_csr
 
 from .recommender import Recommender
 
+# scatter adds use a dense bincount once the batch has at least 1/this many rows
+# of the target, and np.add.at below that
+_DENSE_SCATTER_RATIO = 4
+
+
+def _scatter_add(target: np.ndarray, indices: np.ndarray, updates: np.ndarray):
+    """Adds each row of updates to the row of target at the matching index.
+
+    Rows of target that appear several times in indices receive the sum of their
+    updates, as with np.add.at.  For batches that are large relative to target, the
+    sums are instead computed by one np.bincount per column, which costs
+    O(len(target) + len(indices)) per column but avoids np.add.at's per-element
+    overhead.
+
+    Args:
+        target: pxk array to update.
+        indices: length-b array of rows of target.
+        updates: bxk array of the update to each row in indices.
+
+    Mutates:
+        target by adding the updates.
+    """
+    p, k = target.shape
+    if len(indices) * _DENSE_SCATTER_RATIO < p:
+        np.add.at(target, indices, updates)
+        return
+
+    for column in range(k):
+        target[:, column] += np.bincount(
+            indices, weights=updates[:, column], minlength=p
+        )
+
+
+def _bpr_step(
+    U: np.ndarray,
+    V: np.ndarray,
+    u: np.ndarray,
+    i: np.ndarray,
+    j: np.ndarray,
+    learning_rate: float,
+    regularization_coefficient: float,
+    update_items: bool = True,
+):
+    """Performs one stochastic gradient ascent step on a minibatch of BPR triples.
+
+    The gradients of all triples are computed from the embeddings before the step
+    and summed into the embeddings, so an embedding that appears in several triples
+    of the batch receives the sum of their updates.
+
+    Args:
+        U: Entity embeddings.
+        V: Item embeddings.
+        u: Length-b array of the entity of each triple.
+        i: Length-b array of an item observed for the entity of each triple.
+        j: Length-b array of an item not observed for the entity of each triple.
+        learning_rate: Learning rate of the step.
+        regularization_coefficient: Coefficient on the L2 regularization term.
+        update_items: Whether to update V as well as U.
+
+    Mutates:
+        U, and V if update_items, by the step.
+    """
+    U_u = U[u]
+    V_i = V[i]
+    V_j = V[j]
+
+    # theta = theta + alpha * (e^(-x) sigma(x) d/dtheta x + lambda theta)
+    x_uij = np.einsum("ij,ij->i", U_u, V_i - V_j)
+    # e^(-x) / (1 + e^(-x)), computed stably
+    sigmoid_derivative = expit(-x_uij)[:, np.newaxis]
+
+    _scatter_add(
+        U,
+        u,
+        learning_rate
+        * (sigmoid_derivative * (V_i - V_j) - regularization_coefficient * U_u),
+    )
+
+    if update_items:
+        # both item updates are accumulated in one scatter
+        _scatter_add(
+            V,
+            np.concatenate((i, j)),
+            learning_rate
+            * np.concatenate(
+                (
+                    sigmoid_derivative * U_u - regularization_coefficient * V_i,
+                    -sigmoid_derivative * U_u - regularization_coefficient * V_j,
+                )
+            ),
+        )
+
+
+class _TripleSampler:
+    """A sampler of BPR training triples (u, i, j) from a sparse matrix.
+
+    Triples are sampled uniformly from all triples in which item i is observed and
+    item j is not observed for entity u.  Memory is O(m + nnz) and each draw costs
+    O(1) expected time.
+    """
+
+    # Abstraction function:
+    #   AF(indptr, indices, keys, probability, alias, n) = a uniform sampler over
+    #       the triples (u, i, j) of the mxn matrix whose row u has observed columns
+    #       indices[indptr[u]:indptr[u+1]], where entity u is chosen with probability
+    #       proportional to |I_u| (n - |I_u|) by the alias table (probability, alias).
+    # Rep invariant:
+    #   - len(indptr) == len(probability) + 1 == len(alias) + 1
+    #   - keys == row * n + column of each observation, in increasing order
+    #   - 0 <= probability <= 1
+    # Safety from rep exposure:
+    #   - all fields are private and never returned
+
+    # number of triples drawn at a time when streaming batches
+    _BLOCK_SIZE = 1 << 14
+
+    def __init__(self, data: sparse.csr_matrix):
+        """Initializes a _TripleSampler object.
+
+        Args:
+            data: An mxn matrix of observations.  Requires that some entity has at
+                least one observed and one unobserved item.
+        """
+        data = data.tocsr(copy=True)
+        data.eliminate_zeros()
+        data.sum_duplicates()
+
+        m, n = data.shape
+        self._n = n
+        self._indptr = data.indptr.astype(np.int64)
+        self._indices = data.indices.astype(np.int64)
+
+        row_lengths = np.diff(self._indptr)
+        rows = np.repeat(np.arange(m, dtype=np.int64), row_lengths)
+        self._keys = rows * n + self._indices
+
+        # an entity is in |I_u| (n - |I_u|) triples
+        weights = (row_lengths * (n - row_lengths)).astype(np.float64)
+        assert weights.sum() > 0
+        self._probability, self._alias = self._build_alias_table(weights)
+
+        self._checkrep()
+
+    def _checkrep(self):
+        """Asserts the rep invariant."""
+        #   - len(indptr) == len(probability) + 1 == len(alias) + 1
+        assert len(self._indptr) == len(self._probability) + 1 == len(self._alias) + 1
+        #   - keys == row * n + column of each observation, in increasing order
+        assert len(self._keys) == len(self._indices)
+        #   - 0 <= probability <= 1
+        assert (self._probability >= 0).all()
+        assert (self._probability <= 1).all()
+
+    @staticmethod
+    def _build_alias_table(weights: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Builds a Vose alias table for the distribution proportional to weights.
+
+        Args:
+            weights: A length-m array of nonnegative weights with a positive sum.
+
+        Returns:
+            A tuple (probability, alias) such that drawing a uniform index u, then
+            keeping u with probability probability[u] and otherwise taking alias[u],
+            samples index v with probability proportional to weights[v].
+        """
+        m = len(weights)
+        scaled = weights * (m / weights.sum())
+        probability = np.ones(m)
+        alias = np.arange(m)
+
+        small = np.flatnonzero(scaled < 1).tolist()
+        large = np.flatnonzero(scaled >= 1).tolist()
+        scaled = scaled.tolist()
+
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+
+            probability[less] = scaled[less]
+            alias[less] = more
+
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # any remaining entries are 1 up to rounding error
+        return probability, alias
+
+    def sample(
+        self, num_samples: int, rng: np.random.Generator
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Samples triples.
+
+        Args:
+            num_samples: Number of triples to draw.  Requires num_samples >= 0.
+            rng: Source of randomness.
+
+        Returns:
+            A tuple (u, i, j) of length num_samples arrays where u are entity
+            indices, i are items observed for those entities, and j are items not
+            observed for those entities.
+        """
+        assert num_samples >= 0
+
+        # entity from the alias table
+        u = rng.integers(len(self._probability), size=num_samples)
+        u = np.where(rng.random(num_samples) < self._probability[u], u, self._alias[u])
+
+        # observed item uniformly from the entity's row
+        row_starts = self._indptr[u]
+        row_lengths = self._indptr[u + 1] - row_starts
+        offsets = (rng.random(num_samples) * row_lengths).astype(np.int64)
+        i = self._indices[row_starts + offsets]
+
+        # unobserved item by rejection, redrawing only the rejected samples
+        j = rng.integers(self._n, size=num_samples)
+        rejected = self._is_observed(u, j)
+        while rejected.any():
+            j[rejected] = rng.integers(self._n, size=rejected.sum())
+            rejected[rejected] = self._is_observed(u[rejected], j[rejected])
+
+        self._checkrep()
+        return u, i, j
+
+    def iter_batches(
+        self, num_samples: int, batch_size: int, rng: np.random.Generator
+    ) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Streams triples in batches.
+
+        Triples are drawn a block at a time, so memory does not grow with
+        num_samples.
+
+        Args:
+            num_samples: Total number of triples to draw.  Requires num_samples >= 0.
+            batch_size: Maximum number of triples per batch.  Requires
+                batch_size > 0.
+            rng: Source of randomness.
+
+        Yields:
+            Tuples (u, i, j) of arrays as returned by sample.
+        """
+        assert batch_size > 0
+
+        block_size = max(1, self._BLOCK_SIZE // batch_size) * batch_size
+        for block_start in range(0, num_samples, block_size):
+            u, i, j = self.sample(min(block_size, num_samples - block_start), rng)
+            for start in range(0, len(u), batch_size):
+                batch = slice(start, start + batch_size)
+                yield u[batch], i[batch], j[batch]
+
+    def _is_observed(self, u: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """Gets whether item j[p] is observed for entity u[p] for each p."""
+        keys = u * self._n + j
+        positions = np.searchsorted(self._keys, keys)
+        positions[positions == len(self._keys)] = 0
+        return self._keys[positions] == keys
+
 
 class BPRRecommender(Recommender):
     """A Bayesian Personalized Ranking recommender.
@@ -77,176 +340,58 @@ class BPRRecommender(Recommender):
     def V(self) -> np.ndarray:
         return np.copy(self._V)
 
-    def _sample_dataset(
-        self,
-        data: np.ndarray,
-        num_samples: int,
-    ) -> tuple[int, int, int]:
-        """Samples the dataset according to the bootstrapped sampling for BPR.
-
-        Sampling is performed uniformly over all triples of the form (u, i, j),
-        where u is a user, i is an item for which there is an observation for that user,
-        and j is an item for which there is no observation for that user.
-
-        Args:
-            data: An mxn matrix of observations.
-            num_samples: Number of samples to draw. Requires num_samples > 0.
-
-        Returns:
-            A tuple of the form (u, i, j) where u is an array of user indices,
-            i is an array of item indices with an observation for that user,
-            and j is an array of item indices with no observation for that user.
-        """
-        assert num_samples > 0
-
-        m, n = data.shape
-
-        sample_user_probability = self._calculate_sample_user_probability(data)
-
-        # repeat for each of n items
-        num_items_per_user = np.sum(data, axis=1).astype(float)
-        assert not np.any(np.isnan(num_items_per_user))
-        num_items_per_user[num_items_per_user == 0.0] = np.nan
-        assert num_items_per_user.shape == (m,)  # m users
-        sample_item_probability = np.nan_to_num(
-            data / np.expand_dims(num_items_per_user, axis=1)
-        )
-
-        joint_user_item_probability = (
-            np.expand_dims(sample_user_probability, axis=1) * sample_item_probability
-        )
-        assert joint_user_item_probability.shape == (m, n)
-
-        flattened_probability = joint_user_item_probability.flatten("C")
-        u_i = np.random.choice(
-            np.arange(m * n), size=(num_samples,), p=flattened_probability
-        )
-
-        all_u = u_i // n
-        all_i = u_i % n
-        assert (all_i < 611).all()
-
-        non_observations = 1 - data
-
-        unique_users, counts = np.unique(all_u, return_counts=True)
-        value_to_count = dict(zip(unique_users, counts))
-
-        u_to_j = {}
-
-        # for each u
-        for u, count in value_to_count.items():
-            # get
-            potential_j = non_observations[u, :]
-
-            all_j_for_user = np.random.choice(
-                n, size=count, replace=True, p=potential_j / np.sum(potential_j)
-            )
-
-            u_to_j[u] = all_j_for_user.tolist()
-
-        all_j = []
-
-        for u in all_u:
-            j = u_to_j[u].pop()
-            all_j.append(j)
-
-        assert len(all_u) == len(all_j) == len(all_i)
-
-        return all_u, all_i, all_j
-
-    def _calculate_sample_user_probability(self, data: np.ndarray) -> np.array:
-        """Gets the sample probability for each user.
-
-        Args:
-            data: An mxn matrix of observations.
-
-        Returns:
-            A length m array containing the probability of sampling each entity.
-        """
-        m, n = data.shape
-        data = np.nan_to_num(data)
-
-        observations_per_user = np.sum(data, axis=1)
-        assert observations_per_user.shape == (m,)
-
-        samples_per_user = observations_per_user * (n - observations_per_user)
-        sample_user_probability = samples_per_user / np.sum(samples_per_user)
-        assert sample_user_probability.shape == (m,)
-
-        return sample_user_probability
-
-    def _predict_for_single_entry(self, u, i) -> float:
-        """Predicts the value for a single user-item pair."""
-        return np.dot(self._U[u, :], self._V[i, :])
-
     def fit(
         self,
         data: tf.SparseTensor,
         learning_rate: float,
         epochs: int,
         regularization_coefficient: float,
+        batch_size: int = 1,
+        warm_start: bool = False,
     ):
         """Fits the model to data.
 
         Args:
             data: An mxn tensor of training data
-            learning_rate: Learning rate for each gradient step performed on a single
-                entity-item sample.
+            learning_rate: Learning rate for each gradient step performed on a
+                minibatch of entity-item samples.
             epochs: Number of training epochs, where each the model is trained on the
                 cardinality of the dataset in each epoch.
             regularization_coefficient: Coefficient on the L2 regularization term.
-            method: The prediction method to use.
+            batch_size: Number of (u, i, j) samples per gradient step.  Requires
+                batch_size > 0.
+            warm_start: Whether to continue training from the current embeddings
+                rather than from newly initialized ones.
 
         Mutates:
             The recommender to the new trained state.
         """
-        # start by resetting embeddings for proper fit
-        self._reset_embeddings()
-
-        data = tf.sparse.reorder(data)
-        data = tf.sparse.to_dense(data)
-        data = data.numpy()
-
-        num_iterations = epochs * data.shape[0] * data.shape[1]
-
-        all_u, all_i, all_j = self._sample_dataset(data, num_samples=num_iterations)
-
-        # initialize theta - done - init
-        # repeat
-        for iteration_count in range(num_iterations):
-            # draw u, i, j from D_s
-            u = all_u[iteration_count]
-            i = all_i[iteration_count]
-            j = all_j[iteration_count]
-
-            assert data[u, i] == 1
-            assert data[u, j] == 0
-
-            # theta = theta + alpha * (e^(-x) sigma(x) d/dtheta x + lambda theta)
-            x_ui = self._predict_for_single_entry(u, i)
-            x_uj = self._predict_for_single_entry(u, j)
-            x_uij = x_ui - x_uj
-
-            sigmoid_derivative = (math.e ** (-x_uij)) / (1 + math.e ** (-x_uij))
+        assert batch_size > 0
 
-            d_w = self._V[i, :] - self._V[j, :]
-            # derivative wrt h_i
-            d_hi = self._U[u, :]
-            # derivative wrt h_j
-            d_hj = -self._U[u, :]
-
-            self._U[u, :] += learning_rate * (
-                sigmoid_derivative * d_w - (regularization_coefficient * self._U[u, :])
-            )
-            self._V[i, :] += learning_rate * (
-                sigmoid_derivative * d_hi - (regularization_coefficient * self._V[i, :])
-            )
-            self._V[j, :] += learning_rate * (
-                sigmoid_derivative * d_hj - (regularization_coefficient * self._V[j, :])
+        # start by resetting embeddings for proper fit
+        if not warm_start:
+            self._reset_embeddings()
+
+        sampler = _TripleSampler(sparse_tensor_to_csr(data))
+        m, n = data.dense_shape.numpy()
+
+        num_iterations = epochs * m * n
+
+        # derived from the global seed so np.random.seed makes fits reproducible
+        rng = np.random.default_rng(np.random.randint(2**31))
+
+        for u, i, j in sampler.iter_batches(num_iterations, batch_size, rng):
+            _bpr_step(
+                self._U,
+                self._V,
+                u,
+                i,
+                j,
+                learning_rate,
+                regularization_coefficient,
             )
 
-        # return theta
-        # set in rep
+        self._checkrep()
 
     def evaluate(
         self,
@@ -267,15 +412,18 @@ class BPRRecommender(Recommender):
         Returns:
             The mean squared error of the test data.
         """
-        pred = self.predict(method)
-        predictions = tf.gather_nd(pred, test_data.indices)
-
-        loss = keras.losses.MeanSquaredError()
+        test_indices = test_data.indices.numpy()
+        prediction_values = self.predict_matrix(method).gather(
+            test_indices[:, 0], test_indices[:, 1]
+        )
 
-        return loss(test_data.values, predictions).numpy()
+        self._checkrep()
+        return mean_squared_error(test_data.values, prediction_values)
 
-    def predict(self, method: PredictionMethod = PredictionMethod.DOT) -> np.ndarray:
-        """Gets the model predictions.
+    def predict_matrix(
+        self, method: PredictionMethod = PredictionMethod.DOT
+    ) -> PredictionMatrix:
+        """Gets the model predictions as a lazily evaluated matrix.
 
         The predictions consist of the estimated matrix A_hat of the truth
         matrix A, of which the training data contains a sparse subset of the entries.
@@ -284,11 +432,11 @@ class BPRRecommender(Recommender):
             method: The prediction method to use.
 
         Returns:
-            An mxn array of values.
+            An mxn prediction matrix.
         """
         self._checkrep()
 
-        return calculate_predicted_matrix(self._U, self._V, method)
+        return PredictionMatrix.from_factors(self._U, self._V, method)
 
     def predict_new_entity(
         self,
@@ -297,6 +445,7 @@ class BPRRecommender(Recommender):
         epochs: int,
         regularization_coefficient: float,
         method: PredictionMethod = PredictionMethod.DOT,
+        batch_size: int = 1,
         **kwargs,
     ) -> np.array:
         """Recommends items to an unseen entity.
@@ -305,54 +454,43 @@ class BPRRecommender(Recommender):
             entity: A length-n sparse tensor of consisting of the new entity's
                 ratings for each item, indexed exactly as the items used to
                 train this model.
-            learning_rate: Learning rate for each gradient step performed on a single
-                entity-item sample.
+            learning_rate: Learning rate for each gradient step performed on a
+                minibatch of item samples.
             epochs: Number of training epochs, where each the model is trained on the
                 cardinality dataset in each epoch.
             regularization_coefficient: Coefficient on the L2 regularization term.
             method: The prediction method to use.
+            batch_size: Number of (i, j) samples per gradient step.  Requires
+                batch_size > 0.
 
         Returns:
             An array of predicted values for the new entity.
         """
-        new_entity = tf.sparse.reorder(entity)
-        new_entity = tf.sparse.to_dense(new_entity)
+        assert batch_size > 0
 
-        num_iterations = epochs * len(new_entity)
+        sampler = _TripleSampler(sparse_tensor_to_csr(entity))
+        n = self._V.shape[0]
+
+        num_iterations = epochs * n
 
         new_entity_embedding = np.random.normal(
             loc=0, scale=math.sqrt(1 / self._U.shape[1]), size=(1, self._U.shape[1])
         )
 
-        _, all_i, all_j = self._sample_dataset(
-            tf.expand_dims(new_entity, axis=0), num_samples=num_iterations
-        )
-
-        # initialize theta - done - init
-        # repeat
-        for iteration_count in range(num_iterations):
-            # draw u, i, j from D_s
-            # u isn't used since only predicting for new user
-            i = all_i[iteration_count]
-            j = all_j[iteration_count]
-
-            # theta = theta + alpha * (e^(-x) sigma(x) d/dtheta x + lambda theta)
-            x_ui = np.dot(new_entity_embedding, self._V[i, :])
-            x_uj = np.dot(new_entity_embedding, self._V[j, :])
-            x_uij = x_ui - x_uj
-
-            sigmoid_derivative = (math.e ** (-x_uij)) / (1 + math.e ** (-x_uij))
-
-            d_w = self._V[i, :] - self._V[j, :]
-
-            new_entity_embedding += learning_rate * (
-                sigmoid_derivative * d_w
-                - (regularization_coefficient * new_entity_embedding)
+        rng = np.random.default_rng(np.random.randint(2**31))
+        for u, i, j in sampler.iter_batches(num_iterations, batch_size, rng):
+            # u is always 0, the new entity
+            _bpr_step(
+                new_entity_embedding,
+                self._V,
+                u,
+                i,
+                j,
+                learning_rate,
+                regularization_coefficient,
+                update_items=False,
             )
 
-        # return theta
-        # set in rep
-
         return np.squeeze(
             calculate_predicted_matrix(new_entity_embedding, self._V, method)
         )
@@ -7,13 +7,74 @@ import numpy as np
 import tensorflow as tf
 from sklearn.metrics import mean_squared_error
 
-from tie.constants import PredictionMethod
+from tie.constants import Optimizer, PredictionMethod
+from tie.prediction_matrix import PredictionMatrix
 from tie.utils import calculate_predicted_matrix
 
 from .recommender import Recommender
 
-tf.config.run_functions_eagerly(True)
-tf.compat.v1.enable_eager_execution()
+
+def _predict_observed(U: tf.Tensor, V: tf.Tensor, indices: tf.Tensor) -> tf.Tensor:
+    """Predicts the entries of UV^T at indices without forming UV^T.
+
+    Args:
+        U: mxk tensor of entity embeddings.
+        V: nxk tensor of item embeddings.
+        indices: px2 tensor of (row, column) indices.
+
+    Returns:
+        A length-p tensor whose ith entry is the dot product of the embeddings of
+        row indices[i, 0] and column indices[i, 1].
+    """
+    return tf.reduce_sum(
+        tf.gather(U, indices[:, 0]) * tf.gather(V, indices[:, 1]), axis=1
+    )
+
+
+# maximum number of entries held in the minibatch shuffle buffer
+_SHUFFLE_BUFFER_SIZE = 1 << 20
+
+_OPTIMIZERS = {
+    Optimizer.SGD: keras.optimizers.SGD,
+    Optimizer.ADAM: keras.optimizers.Adam,
+    Optimizer.ADAGRAD: keras.optimizers.Adagrad,
+}
+
+
+def _sample_unobserved(
+    observed_keys: np.ndarray,
+    shape: tuple[int, int],
+    num_samples: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Samples entries of a matrix uniformly from its unobserved entries.
+
+    Args:
+        observed_keys: Sorted array of row * n + column of each observed entry.
+        shape: The shape (m, n) of the matrix.  Requires that some entry is
+            unobserved.
+        num_samples: Number of entries to sample.
+        rng: Source of randomness.
+
+    Returns:
+        A num_samples x 2 array of (row, column) indices of unobserved entries.
+    """
+    m, n = shape
+    assert len(observed_keys) < m * n
+
+    def is_observed(keys: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(observed_keys, keys)
+        positions[positions == len(observed_keys)] = 0
+        return observed_keys[positions] == keys
+
+    # rejection sampling, redrawing only the rejected samples
+    keys = rng.integers(m * n, size=num_samples)
+    rejected = is_observed(keys)
+    while rejected.any():
+        keys[rejected] = rng.integers(m * n, size=rejected.sum())
+        rejected[rejected] = is_observed(keys[rejected])
+
+    return np.column_stack((keys // n, keys % n))
 
 
 class FactorizationRecommender(Recommender):
@@ -100,11 +161,6 @@ class FactorizationRecommender(Recommender):
         self._checkrep()
         return copy.deepcopy(self._V.numpy())
 
-    def _get_estimated_matrix(self) -> tf.Tensor:
-        """Gets the estimated matrix UV^T."""
-        self._checkrep()
-        return tf.matmul(self._U, self._V, transpose_b=True)
-
     def _predict(self, data: tf.SparseTensor) -> tf.Tensor:
         """Predicts the results for data.
 
@@ -123,10 +179,9 @@ class FactorizationRecommender(Recommender):
         """
         # indices contains indices of non-null entries
         # of data
-        # gather_nd will get those entries in order and
-        # add to an array
+        # only those entries of UV^T are computed, in order
         self._checkrep()
-        return tf.gather_nd(self._get_estimated_matrix(), data.indices)
+        return _predict_observed(self._U, self._V, data.indices)
 
     def _calculate_regularized_loss(
         self,
@@ -134,6 +189,7 @@ class FactorizationRecommender(Recommender):
         predictions: tf.Tensor,
         regularization_coefficient: float,
         gravity_coefficient: float,
+        indices: tf.Tensor | None = None,
     ) -> float:
         r"""Gets the regularized loss function.
 
@@ -143,7 +199,18 @@ class FactorizationRecommender(Recommender):
             entity embedding, plus the average of the squared norm of each item
             embedding r = 1/m \sum_i ||U_i||^2 + 1/n \sum_j ||V_j||^2
         - A gravity term which is the average of the squares of all predictions.
-            g = 1/(MN) \sum_{ij} (UV^T)_{ij}^2
+            g = 1/(MN) \sum_{ij} (UV^T)_{ij}^2 = 1/(MN) tr((U^T U)(V^T V))
+
+        If indices is given, as for a minibatch, the regularization and gravity
+        terms are instead averaged over only the distinct rows R and columns C of
+        indices, r = 1/|R| \sum_{i in R} ||U_i||^2 + 1/|C| \sum_{j in C} ||V_j||^2
+        and g = 1/(|R||C|) tr((U_R^T U_R)(V_C^T V_C)).  Each term then estimates
+        its full value on the same scale whatever the batch size, and its gradient
+        is nonzero only on the embeddings in the minibatch.
+
+        The loss is computed in O((m + n)k^2), or O((|R| + |C|)k^2) given indices,
+        beyond the predictions, without forming UV^T, and may be called from a
+        compiled function.
 
         Args:
             data: the data on which to evaluate.  Predictions will be evaluated for
@@ -154,22 +221,32 @@ class FactorizationRecommender(Recommender):
                 of the loss function.
             gravity_coefficient: the coefficient for the gravity component of the loss
                 function.
+            indices: px2 tensor of the (row, column) indices of the minibatch, or
+                None to regularize every embedding.
 
         Returns:
             The regularized loss.
         """
+        if indices is None:
+            U, V = self._U, self._V
+        else:
+            U = tf.gather(self._U, tf.unique(indices[:, 0])[0])
+            V = tf.gather(self._V, tf.unique(indices[:, 1])[0])
+        num_rows = tf.cast(tf.shape(U)[0], U.dtype)
+        num_columns = tf.cast(tf.shape(V)[0], V.dtype)
+
         regularization_loss = regularization_coefficient * (
-            tf.reduce_sum(self._U * self._U) / self._U.shape[0]
-            + tf.reduce_sum(self._V * self._V) / self._V.shape[0]
+            tf.reduce_sum(U * U) / num_rows + tf.reduce_sum(V * V) / num_columns
         )
 
-        gravity = (1.0 / (self._U.shape[0] * self._V.shape[0])) * tf.reduce_sum(
-            tf.square(tf.matmul(self._U, self._V, transpose_b=True))
-        )
+        # sum_{ij} (UV^T)_{ij}^2 = tr(V U^T U V^T) = sum_{ab} (U^T U)_{ab} (V^T V)_{ab}
+        gravity = tf.reduce_sum(
+            tf.matmul(U, U, transpose_a=True) * tf.matmul(V, V, transpose_a=True)
+        ) / (num_rows * num_columns)
 
         gravity_loss = gravity_coefficient * gravity
 
-        self._checkrep()
+        # no checkrep since this runs inside the compiled training step
         return self._loss(data, predictions) + regularization_loss + gravity_loss
 
     def _calculate_mean_square_error(self, data: tf.SparseTensor) -> tf.Tensor:
@@ -198,40 +275,111 @@ class FactorizationRecommender(Recommender):
         epochs: int,
         regularization_coefficient: float = 0.1,
         gravity_coefficient: float = 0.0,
+        batch_size: int | None = None,
+        negative_ratio: float = 0.0,
+        optimizer: Optimizer = Optimizer.SGD,
+        warm_start: bool = False,
     ):
         """Fits the model to data.
 
+        By default, each epoch is a single gradient step on all observed entries.
+        If batch_size is given, each epoch instead streams the observed entries,
+        plus freshly sampled unobserved entries with value 0, in shuffled minibatches
+        through a tf.data pipeline, taking a gradient step on each minibatch.
+
         Args:
             data: an mxn tensor of training data.
-            epochs:
             learning_rate: the learning rate.
             epochs: Number of training epochs, where each the model is trained on the
                 cardinality dataset in each epoch.
             regularization_coefficient: coefficient on the embedding regularization
                 term.
             gravity_coefficient: coefficient on the prediction regularization term.
+            batch_size: Number of entries per minibatch, or None for full-batch
+                gradient descent.  Requires batch_size > 0.  Each minibatch step
+                only regularizes the embeddings of its rows and columns; see
+                _calculate_regularized_loss.
+            negative_ratio: Number of unobserved entries sampled per observed entry in
+                each minibatch epoch.  Requires negative_ratio >= 0.  Ignored for
+                full-batch gradient descent.
+            optimizer: The optimizer with which to take gradient steps.  Its state
+                is not kept between fits.
+            warm_start: Whether to continue training from the current embeddings
+                rather than from newly initialized ones.
 
         Mutates:
             The recommender to the new trained state.
         """
-        self._reset_embeddings()
+        assert batch_size is None or batch_size > 0
+        assert negative_ratio >= 0
 
-        # preliminaries
-        optimizer = keras.optimizers.SGD(learning_rate=learning_rate)
+        if not warm_start:
+            self._reset_embeddings()
 
-        for i in range(epochs + 1):
+        # preliminaries
+        keras_optimizer = _OPTIMIZERS[optimizer](learning_rate=learning_rate)
+        # optimizer variables must exist before the training step is compiled
+        keras_optimizer.build([self._U, self._V])
+
+        @tf.function(
+            input_signature=(
+                tf.TensorSpec(shape=(None, 2), dtype=tf.int64),
+                tf.TensorSpec(shape=(None,), dtype=tf.float32),
+            )
+        )
+        def train_step(indices: tf.Tensor, values: tf.Tensor):
+            """Takes one gradient step on the entries at indices."""
             with tf.GradientTape() as tape:
                 # need to predict here and not in loss so doesn't affect gradient
-                predictions = self._predict(data)
+                predictions = _predict_observed(self._U, self._V, indices)
 
                 loss = self._calculate_regularized_loss(
-                    data.values,
+                    values,
                     predictions,
                     regularization_coefficient,
                     gravity_coefficient,
+                    # minibatches only regularize their own embeddings
+                    indices=None if batch_size is None else indices,
                 )
             gradients = tape.gradient(loss, [self._U, self._V])
-            optimizer.apply_gradients(zip(gradients, [self._U, self._V]))
+            keras_optimizer.apply_gradients(zip(gradients, [self._U, self._V]))
+
+        indices = data.indices.numpy()
+        values = data.values.numpy().astype(np.float32)
+
+        if batch_size is None:
+            for i in range(epochs + 1):
+                train_step(indices, values)
+        else:
+            m, n = self._U.shape[0], self._V.shape[0]
+            observed_keys = np.sort(indices[:, 0] * n + indices[:, 1])
+            num_negatives = round(negative_ratio * len(values))
+
+            # derived from the global seed so np.random.seed makes fits reproducible
+            rng = np.random.default_rng(np.random.randint(2**31))
+
+            for i in range(epochs + 1):
+                epoch_indices = np.concatenate(
+                    (
+                        indices,
+                        _sample_unobserved(observed_keys, (m, n), num_negatives, rng),
+                    )
+                )
+                epoch_values = np.concatenate(
+                    (values, np.zeros(num_negatives, dtype=np.float32))
+                )
+
+                dataset = (
+                    tf.data.Dataset.from_tensor_slices((epoch_indices, epoch_values))
+                    .shuffle(
+                        min(len(epoch_values), _SHUFFLE_BUFFER_SIZE),
+                        seed=int(rng.integers(2**31)),
+                    )
+                    .batch(batch_size)
+                    .prefetch(tf.data.AUTOTUNE)
+                )
+                for batch_indices, batch_values in dataset:
+                    train_step(batch_indices, batch_values)
 
         self._checkrep()
 
@@ -254,17 +402,18 @@ class FactorizationRecommender(Recommender):
         Returns:
             The mean squared error of the test data.
         """
-        predictions_matrix = self.predict(method)
-
-        row_indices = tuple(index[0] for index in test_data.indices)
-        column_indices = tuple(index[1] for index in test_data.indices)
-        prediction_values = predictions_matrix[row_indices, column_indices]
+        test_indices = test_data.indices.numpy()
+        prediction_values = self.predict_matrix(method).gather(
+            test_indices[:, 0], test_indices[:, 1]
+        )
 
         self._checkrep()
         return mean_squared_error(test_data.values, prediction_values)
 
-    def predict(self, method: PredictionMethod = PredictionMethod.DOT) -> np.ndarray:
-        """Gets the model predictions.
+    def predict_matrix(
+        self, method: PredictionMethod = PredictionMethod.DOT
+    ) -> PredictionMatrix:
+        """Gets the model predictions as a lazily evaluated matrix.
 
         The predictions consist of the estimated matrix A_hat of the truth
         matrix A, of which the training data contains a sparse subset of the entries.
@@ -273,11 +422,11 @@ class FactorizationRecommender(Recommender):
             method: The prediction method to use.
 
         Returns:
-            An mxn array of values.
+            An mxn prediction matrix.
         """
         self._checkrep()
 
-        return calculate_predicted_matrix(
+        return PredictionMatrix.from_factors(
             np.nan_to_num(self._U.numpy()), np.nan_to_num(self._V.numpy()), method
         )
 
@@ -5,7 +5,7 @@ from scipy import sparse
 from sklearn.metrics import mean_squared_error
 
 from tie.constants import PredictionMethod
-from tie.utils import calculate_predicted_matrix
+from tie.prediction_matrix import PredictionMatrix
 
 
 class ImplicitBPRRecommender:
@@ -135,11 +135,10 @@ class ImplicitBPRRecommender:
         Returns:
             The mean squared error of the test data.
         """
-        predictions_matrix = self.predict(method)
-
-        row_indices = tuple(index[0] for index in test_data.indices)
-        column_indices = tuple(index[1] for index in test_data.indices)
-        prediction_values = predictions_matrix[row_indices, column_indices]
+        test_indices = test_data.indices.numpy()
+        prediction_values = self.predict_matrix(method).gather(
+            test_indices[:, 0], test_indices[:, 1]
+        )
 
         self._checkrep()
         return mean_squared_error(test_data.values, prediction_values)
@@ -156,9 +155,22 @@ class ImplicitBPRRecommender:
         Returns:
             An mxn array of values.
         """
+        return self.predict_matrix(method).to_numpy()
+
+    def predict_matrix(
+        self, method: PredictionMethod = PredictionMethod.DOT
+    ) -> PredictionMatrix:
+        """Gets the model predictions as a lazily evaluated matrix.
+
+        Args:
+            method: The prediction method to use.
+
+        Returns:
+            An mxn prediction matrix.
+        """
         self._checkrep()
 
-        return calculate_predicted_matrix(
+        return PredictionMatrix.from_factors(
             self._model.user_factors, self._model.item_factors, method
         )
 
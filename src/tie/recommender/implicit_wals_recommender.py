@@ -5,6 +5,7 @@ from scipy import sparse
 from sklearn.metrics import mean_squared_error
 
 from tie.constants import PredictionMethod
+from tie.prediction_matrix import PredictionMatrix
 from tie.utils import calculate_predicted_matrix
 
 from .recommender import Recommender
@@ -132,17 +133,18 @@ class ImplicitWalsRecommender(Recommender):
         Returns:
             The mean squared error of the test data.
         """
-        predictions_matrix = self.predict(method)
-
-        row_indices = tuple(index[0] for index in test_data.indices)
-        column_indices = tuple(index[1] for index in test_data.indices)
-        prediction_values = predictions_matrix[row_indices, column_indices]
+        test_indices = test_data.indices.numpy()
+        prediction_values = self.predict_matrix(method).gather(
+            test_indices[:, 0], test_indices[:, 1]
+        )
 
         self._checkrep()
         return mean_squared_error(test_data.values, prediction_values)
 
-    def predict(self, method: PredictionMethod = PredictionMethod.DOT) -> np.ndarray:
-        """Gets the model predictions.
+    def predict_matrix(
+        self, method: PredictionMethod = PredictionMethod.DOT
+    ) -> PredictionMatrix:
+        """Gets the model predictions as a lazily evaluated matrix.
 
         The predictions consist of the estimated matrix A_hat of the truth
         matrix A, of which the training data contains a sparse subset of the entries.
@@ -151,11 +153,11 @@ class ImplicitWalsRecommender(Recommender):
             method: The prediction method to use.
 
         Returns:
-            An mxn array of values.
+            An mxn prediction matrix.
         """
         self._checkrep()
 
-        return calculate_predicted_matrix(
+        return PredictionMatrix.from_factors(
             self._model.user_factors, self._model.item_factors, method
         )
 
@@ -2,6 +2,9 @@ from abc import ABC, abstractmethod
 
 import numpy as np
 import tensorflow as tf
+from scipy import sparse
+
+from tie.prediction_matrix import PredictionMatrix
 
 
 class Recommender(ABC):
@@ -49,15 +52,45 @@ class Recommender(ABC):
         """
 
     @abstractmethod
+    def predict_matrix(self, **kwargs) -> PredictionMatrix:
+        """Gets the model predictions as a lazily evaluated matrix.
+
+        The predictions consist of the estimated matrix A_hat of the truth
+        matrix A, of which the training data contains a sparse subset of the entries.
+        Entries are only computed when read from the returned matrix.
+
+        Returns:
+            An mxn prediction matrix.
+        """
+
     def predict(self, **kwargs) -> np.ndarray:
         """Gets the model predictions.
 
         The predictions consist of the estimated matrix A_hat of the truth
         matrix A, of which the training data contains a sparse subset of the entries.
 
+        Args:
+            kwargs: Arguments to predict_matrix.
+
         Returns:
             An mxn array of values.
         """
+        return self.predict_matrix(**kwargs).to_numpy()
+
+    def predict_rows(self, rows: np.ndarray, **kwargs) -> np.ndarray:
+        """Gets the model predictions for a subset of entities.
+
+        Only the requested rows of the prediction matrix are computed.
+
+        Args:
+            rows: Length-b array of entity indices.
+            kwargs: Arguments to predict_matrix.
+
+        Returns:
+            A bxn array whose ith row contains the predicted values for entity
+            rows[i].
+        """
+        return self.predict_matrix(**kwargs).rows(rows)
 
     @abstractmethod
     def predict_new_entity(
@@ -75,3 +108,65 @@ class Recommender(ABC):
         Returns:
             An array of predicted values for the new entity.
         """
+
+    def predict_new_entities(
+        self,
+        entities: tf.SparseTensor,
+        **kwargs,
+    ) -> np.ndarray:
+        """Recommends items to several unseen entities.
+
+        Recommenders which can fold in many entities at once override this to do so.
+        By default, each entity is predicted separately by predict_new_entity.
+
+        Args:
+            entities: A bxn sparse tensor consisting of each new entity's ratings for
+                each item, indexed exactly as the items used to train this model.
+            kwargs: Arguments to predict_new_entity.
+
+        Returns:
+            A bxn array whose ith row contains the predicted values for entity i.
+        """
+        entities = tf.sparse.reorder(entities)
+        b, n = entities.dense_shape.numpy()
+
+        predictions = np.zeros((b, n))
+        for i in range(b):
+            entity = tf.sparse.reshape(
+                tf.sparse.slice(entities, start=(i, 0), size=(1, n)), (n,)
+            )
+            predictions[i] = self.predict_new_entity(entity, **kwargs)
+
+        return predictions
+
+    def top_k(
+        self,
+        k: int,
+        rows: np.ndarray | None = None,
+        excluded: sparse.spmatrix | None = None,
+        allowed: np.ndarray | None = None,
+        **kwargs,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Gets the top k recommended items for entities.
+
+        Requires that the model has been trained.
+
+        Args:
+            k: Number of items to recommend per entity.  Requires 0 < k <= n.
+            rows: Length-b array of the entities for which to recommend.  If None,
+                recommends for all m entities.
+            excluded: A bxn sparse matrix whose stored entries are never
+                recommended, such as each entity's training items.
+            allowed: A length-n boolean array such that only items j with
+                allowed[j] are recommended.
+            kwargs: Arguments to predict_matrix.
+
+        Returns:
+            A tuple (indices, predictions) of bxk arrays such that indices[i] are the
+            top k items for entity rows[i] in descending order of predicted value
+            and predictions[i] are their predicted values.  Excluded and disallowed
+            items are predicted -inf, and only appear if fewer than k items remain.
+        """
+        return self.predict_matrix(**kwargs).top_k(
+            k, rows=rows, excluded=excluded, allowed=allowed
+        )
@@ -2,6 +2,8 @@ import numpy as np
 import tensorflow as tf
 from sklearn.metrics import mean_squared_error
 
+from tie.prediction_matrix import PredictionMatrix
+
 from .recommender import Recommender
 
 
@@ -95,23 +97,19 @@ class TopItemsRecommender(Recommender):
         self._checkrep()
 
     def evaluate(self, test_data: tf.SparseTensor, **kwargs) -> float:
-        predictions_matrix = self.predict()
-
-        row_indices = tuple(index[0] for index in test_data.indices)
-        column_indices = tuple(index[1] for index in test_data.indices)
-        prediction_values = predictions_matrix[row_indices, column_indices]
+        test_indices = test_data.indices.numpy()
+        prediction_values = self.predict_matrix().gather(
+            test_indices[:, 0], test_indices[:, 1]
+        )
 
         self._checkrep()
         return mean_squared_error(test_data.values, prediction_values)
 
-    def predict(self, **kwargs) -> np.ndarray:
+    def predict_matrix(self, **kwargs) -> PredictionMatrix:
         scaled_ranks = self._scale_item_frequency(self._item_frequencies)
-        matrix = np.repeat(np.expand_dims(scaled_ranks, axis=1), self._m, axis=1).T
-
-        assert matrix.shape == (self._m, self._n)
 
         self._checkrep()
-        return matrix
+        return PredictionMatrix.from_vector(scaled_ranks, self._m)
 
     def predict_new_entity(self, entity: tf.SparseTensor, **kwargs) -> np.array:
         self._checkrep()
@@ -1,25 +1,198 @@
+import copy
+import math
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import tensorflow as tf
+from scipy import linalg, sparse
 from sklearn.metrics import mean_squared_error
 
-from tie.constants import PredictionMethod
-from tie.utils import calculate_predicted_matrix
+from tie.constants import PredictionMethod, WalsSolver
+from tie.prediction_matrix import PredictionMatrix
+from tie.utils import (
+    calculate_predicted_matrix,
+    sparse_tensor_to_csr,
+)
 
 from .recommender import Recommender
 
+# bound on the memory used by the per-row Gram matrices of one solve chunk
+_CHUNK_SIZE_BYTES = 1 << 26
+
+
+def _chunk_rows(indptr: np.ndarray, max_chunk_size: int):
+    """Splits the rows of a CSR matrix into contiguous chunks of bounded size.
+
+    The size of a chunk is its number of rows plus its number of entries.
+
+    Args:
+        indptr: The CSR row pointer array of the matrix.
+        max_chunk_size: The maximum size of a chunk.  A single row larger than
+            this forms its own chunk.  Requires max_chunk_size > 0.
+
+    Yields:
+        Tuples (start, stop) such that rows start:stop form a chunk.
+    """
+    num_rows = len(indptr) - 1
+    cumulative_size = indptr + np.arange(num_rows + 1)
+
+    start = 0
+    while start < num_rows:
+        stop = (
+            np.searchsorted(
+                cumulative_size, cumulative_size[start] + max_chunk_size, side="right"
+            )
+            - 1
+        )
+        stop = min(max(stop, start + 1), num_rows)
+        yield start, stop
+        start = stop
+
+
+def _conjugate_gradient(
+    regularized_V_T_V: np.ndarray,
+    observed_V: np.ndarray,
+    entry_rows: np.ndarray,
+    indptr: np.ndarray,
+    b: np.ndarray,
+    x: np.ndarray,
+    steps: int,
+) -> np.ndarray:
+    """Approximately solves the WALS systems of several rows by conjugate gradient.
+
+    The system of row u is (V^T V + lambda I + sum_{j in u} v_j v_j^T) x_u = b_u.
+    Its matrix is never formed; products with it are computed from the shared
+    regularized Gram matrix and the opposing factors of the row's observations.
+
+    Args:
+        regularized_V_T_V: kxk matrix V^T V + lambda I shared by all rows.
+        observed_V: An array of the opposing factors v_j of the observed entries of
+            the rows, in CSR order.
+        entry_rows: The row of each observed entry, in CSR order.
+        indptr: The CSR row pointer array of the rows.
+        b: rxk array of the right hand side of each row's system.
+        x: rxk array of the initial solution of each row's system.
+        steps: Number of conjugate gradient steps.  Requires steps >= 0.
+
+    Returns:
+        An rxk array of the approximate solutions.
+    """
+
+    def multiply(y: np.ndarray) -> np.ndarray:
+        """Multiplies each row of y by the matrix of that row's system."""
+        observed_dots = np.einsum("ij,ij->i", observed_V, y[entry_rows])
+        correction = _segment_sum(observed_V * observed_dots[:, np.newaxis], indptr)
+        return y @ regularized_V_T_V + correction
+
+    x = np.array(x, dtype=np.float64)
+    residual = b - multiply(x)
+    direction = residual.copy()
+    residual_norm = np.einsum("ij,ij->i", residual, residual)
+
+    for _ in range(steps):
+        product = multiply(direction)
+        curvature = np.einsum("ij,ij->i", direction, product)
+        # rows which have already converged take no step
+        step_size = np.divide(
+            residual_norm,
+            curvature,
+            out=np.zeros_like(residual_norm),
+            where=curvature > 0,
+        )[:, np.newaxis]
+
+        x += step_size * direction
+        residual -= step_size * product
+
+        new_residual_norm = np.einsum("ij,ij->i", residual, residual)
+        direction_scale = np.divide(
+            new_residual_norm,
+            residual_norm,
+            out=np.zeros_like(residual_norm),
+            where=residual_norm > 0,
+        )[:, np.newaxis]
+        direction = residual + direction_scale * direction
+        residual_norm = new_residual_norm
+
+    return x
+
+
+def _segment_sum(values: np.ndarray, indptr: np.ndarray) -> np.ndarray:
+    """Sums values over the rows of a CSR matrix.
+
+    Args:
+        values: An array whose first axis holds the entries of the matrix in CSR
+            order.
+        indptr: The CSR row pointer array of the matrix.  Requires indptr[0] == 0.
+
+    Returns:
+        An array whose ith element along the first axis is the sum of the values of
+        the ith row, or zero if the row is empty.
+    """
+    num_rows = len(indptr) - 1
+    sums = np.zeros((num_rows,) + values.shape[1:], dtype=values.dtype)
+
+    nonempty_rows = np.diff(indptr) > 0
+    if nonempty_rows.any():
+        sums[nonempty_rows] = np.add.reduceat(
+            values, indptr[:-1][nonempty_rows], axis=0
+        )
+
+    return sums
+
+
+def _solve_in_chunks(
+    indptr: np.ndarray,
+    row_size: int,
+    num_workers: int,
+    solve_chunk: Callable[[int, int], None],
+):
+    """Solves the rows of a CSR matrix in chunks, concurrently if there are workers.
+
+    Args:
+        indptr: The CSR row pointer array of the matrix.
+        row_size: The number of float64 values held per row while solving, which
+            bounds the chunk size by _CHUNK_SIZE_BYTES.  Requires row_size > 0.
+        num_workers: Number of threads among which to split the rows.  Requires
+            num_workers > 0.
+        solve_chunk: A function solving rows start:stop, given start and stop.
+            Requires that chunks solved concurrently write disjoint outputs.
+    """
+    max_chunk_size = max(1, _CHUNK_SIZE_BYTES // (8 * row_size))
+    if num_workers > 1:
+        # balance the work, which is proportional to rows plus entries
+        max_chunk_size = min(
+            max_chunk_size, math.ceil((len(indptr) - 1 + indptr[-1]) / num_workers)
+        )
+    chunks = tuple(_chunk_rows(indptr, max_chunk_size))
+
+    if num_workers == 1 or len(chunks) == 1:
+        for start, stop in chunks:
+            solve_chunk(start, stop)
+    else:
+        # numpy releases the GIL in the batched solves, so threads run in parallel
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            # consume the results to propagate any exception
+            for _ in executor.map(lambda chunk: solve_chunk(*chunk), chunks):
+                pass
+
 
 class WalsRecommender(Recommender):
     """A WALS matrix factorization collaborative filtering recommender model."""
 
     # Abstraction function:
-    # AF(U, V) = a matrix factorization collaborative filtering recommendation model
-    #   with user embeddings U and item embeddings V
+    # AF(U, V, fold_in_operators) = a matrix factorization collaborative filtering
+    #   recommendation model with user embeddings U and item embeddings V, where
+    #   fold_in_operators caches, for each (c, regularization_coefficient) queried
+    #   since V last changed, the fold-in operator returned by
+    #   _get_fold_in_operator.
     # Rep invariant:
     #   - U is not None
     #   - V is not None
     # Safety from rep exposure:
     #   - k is private and immutable
     #   - model is never returned
+    #   - fold_in_operators is private and never returned
 
     def __init__(self, m: int, n: int, k: int = 10):
         """Initializes a new WALSRecommender object.
@@ -35,6 +208,7 @@ class WalsRecommender(Recommender):
 
         self._U = np.zeros((m, k))
         self._V = np.zeros((n, k))
+        self._fold_in_operators = {}
         self._reset_embeddings()
 
         self._checkrep()
@@ -49,6 +223,9 @@ class WalsRecommender(Recommender):
         self._U = new_U
         self._V = new_V
 
+        # cached operators are only valid for the V from which they were computed
+        self._fold_in_operators = {}
+
     def _checkrep(self):
         """Asserts the rep invariant."""
         #   - U is not None
@@ -89,9 +266,13 @@ class WalsRecommender(Recommender):
     def _update_factor(
         self,
         opposing_factors: np.ndarray,
-        data: np.ndarray,
+        data: sparse.csr_matrix,
         alpha: float,
         regularization_coefficient: float,
+        num_workers: int = 1,
+        solver: WalsSolver = WalsSolver.EXACT,
+        initial_factors: np.ndarray | None = None,
+        cg_steps: int = 3,
     ) -> np.ndarray:
         """Updates factors according to least squares on the opposing factors.
 
@@ -99,47 +280,53 @@ class WalsRecommender(Recommender):
         For example, if opposing_factors are the item factors, determines the entity
         factors which minimize loss on data.
 
+        Rows are solved in chunks.  For each chunk, the confidence correction to the
+        Gram matrix of each row is summed from the outer products of the opposing
+        factors of that row's observations only, and the k x k systems of all rows
+        in the chunk are solved in a single batched call.  With more than one worker,
+        the rows are split into chunks of roughly equal size, which are solved
+        concurrently by a pool of threads sharing the opposing factors and data.
+
+        The conjugate gradient solver instead takes a few conjugate gradient steps
+        from initial_factors on each row's system, without forming the per-row k x k
+        Gram matrices, costing O((rows + entries) k) per step rather than O(k^3) per
+        row.
+
         Args:
             opposing_factors: a pxk array of the fixed factors in the optimization step
                 (ie entity or item factors).  Requires p, k > 0.
-            predictions: A pxq array of the observed values for each of the
-                entities/items associated with the p opposing_factors and the q
-                items/entities associated with factors. Requires p, q > 0.
+            data: A qxp sparse matrix of the observed values for each of the q
+                items/entities associated with factors and the p entities/items
+                associated with the opposing_factors. Requires q > 0 and all stored
+                entries are positive observations.
             alpha: Weight for positive training examples such that each positive example
                 takes value alpha + 1.  Requires alpha > 0.
             regularization_coefficient: coefficient on the embedding regularization
                 term. Requires regularization_coefficient > 0.
+            num_workers: Number of threads among which to split the rows.  Requires
+                num_workers > 0.
+            solver: The method by which to solve each row's system.
+            initial_factors: A qxk array of the factors from which the conjugate
+                gradient solver starts, such as the factors of the previous epoch.
+                If None, starts from zero.  Ignored by the exact solver.
+            cg_steps: Number of conjugate gradient steps per update.  Requires
+                cg_steps > 0.
 
         Returns:
             A qxk array of recomputed factors which minimize error.
         """
         # assert preconditions
         p, k = opposing_factors.shape
-        q = data.shape[1]
+        q = data.shape[0]
         assert p > 0
         assert k == self.k
-        assert p == data.shape[0]
+        assert p == data.shape[1]
         assert q > 0
         assert alpha > 0
         assert regularization_coefficient >= 0
-
-        def V_T_C_I_V(V, c_array):
-            _, k = V.shape
-
-            c_minus_i = c_array - 1
-            nonzero_c = tuple(np.nonzero(c_minus_i)[0].tolist())
-
-            product = np.zeros((k, k))
-
-            for i in nonzero_c:
-                v_i = np.expand_dims(V[i, :], axis=1)
-
-                square_addition = v_i @ v_i.T
-                assert square_addition.shape == (k, k)
-
-                product += square_addition
-
-            return product
+        assert num_workers > 0
+        assert cg_steps > 0
+        assert initial_factors is None or initial_factors.shape == (q, k)
 
         # in line with the paper,
         # we will use variable names as if we are updating user factors based
@@ -148,40 +335,206 @@ class WalsRecommender(Recommender):
         # along with the paper easier.
         V = opposing_factors
 
+        # X = (V^T CV + \lambda I)^{-1} V^T CP
+        # where V^T C V = V^T V + V^T (C - I) V, and each observed entry j of the
+        # row contributes v_j v_j^T to V^T (C - I) V
+        regularized_V_T_V = V.T @ V + regularization_coefficient * np.identity(k)
+
+        # removed C_u here since unneccessary in binary case
+        # P_u is already binary
+        V_T_P = data @ V
+        assert V_T_P.shape == (q, k)
+
         new_U = np.ndarray((q, k))
-        # for each item embedding
 
+        def solve_chunk(start: int, stop: int):
+            """Solves the systems of rows start:stop into new_U[start:stop]."""
+            entries = slice(data.indptr[start], data.indptr[stop])
+            chunk_indptr = data.indptr[start : stop + 1] - data.indptr[start]
+
+            observed_V = V[data.indices[entries]]
+
+            if solver == WalsSolver.CONJUGATE_GRADIENT:
+                new_U[start:stop] = _conjugate_gradient(
+                    regularized_V_T_V,
+                    observed_V,
+                    np.repeat(np.arange(stop - start), np.diff(chunk_indptr)),
+                    chunk_indptr,
+                    V_T_P[start:stop],
+                    (
+                        np.zeros((stop - start, k))
+                        if initial_factors is None
+                        else initial_factors[start:stop]
+                    ),
+                    cg_steps,
+                )
+                return
+
+            outer_products = observed_V[:, :, np.newaxis] * observed_V[:, np.newaxis, :]
+            confidence_scaled_v_transpose_v = _segment_sum(outer_products, chunk_indptr)
+            assert confidence_scaled_v_transpose_v.shape == (stop - start, k, k)
+
+            new_U[start:stop] = np.linalg.solve(
+                regularized_V_T_V + confidence_scaled_v_transpose_v,
+                V_T_P[start:stop, :, np.newaxis],
+            )[:, :, 0]
+
+        # the exact solver holds a k x k matrix per row, conjugate gradient only
+        # length-k vectors per row and entry
+        row_size = k if solver == WalsSolver.CONJUGATE_GRADIENT else k * k
+        _solve_in_chunks(data.indptr, row_size, num_workers, solve_chunk)
+
+        return new_U
+
+    def _solve_regularization_path(
+        self,
+        opposing_factors: np.ndarray,
+        data: sparse.csr_matrix,
+        regularization_coefficients: Sequence[float],
+        num_workers: int = 1,
+    ) -> np.ndarray:
+        """Solves the least squares factors for many regularization coefficients.
+
+        For fixed opposing factors V, the system of row u for coefficient lambda is
+        (A_u + lambda I) x_u = V^T p_u, where A_u = V^T V + sum_{j in u} v_j v_j^T
+        does not depend on lambda.  Each A_u is eigendecomposed once as
+        Q_u diag(w_u) Q_u^T, after which the solution for every lambda is
+        Q_u diag(1 / (w_u + lambda)) Q_u^T V^T p_u, costing O(k^2) per row and lambda
+        rather than a new O(k^3) solve.  Each solution equals the exact solver's
+        _update_factor for that lambda.
+
+        Args:
+            opposing_factors: a pxk array of the fixed factors.  Requires p, k > 0.
+            data: A qxp sparse matrix of the observed values, as for _update_factor.
+            regularization_coefficients: Length-L sequence of coefficients on the
+                embedding regularization term.  Requires each coefficient >= 0, and
+                that A_u + lambda I is nonsingular.
+            num_workers: Number of threads among which to split the rows.  Requires
+                num_workers > 0.
+
+        Returns:
+            An Lxqxk array whose ith element is the factors for
+            regularization_coefficients[i].
+        """
+        p, k = opposing_factors.shape
+        q = data.shape[0]
+        assert p > 0
+        assert k == self.k
+        assert p == data.shape[1]
+        assert q > 0
+        assert num_workers > 0
+        coefficients = np.asarray(regularization_coefficients, dtype=np.float64)
+        assert (coefficients >= 0).all()
+
+        V = opposing_factors
         V_T_V = V.T @ V
-        # update each of the q user factors
-        for i in range(q):
-            P_u = data[:, i]
-            # C is c if unobserved, one otherwise
-            C_u = np.where(P_u > 0, alpha + 1, 1)
-            assert C_u.shape == (p,)
-
-            confidence_scaled_v_transpose_v = V_T_C_I_V(V, C_u)
-
-            # X = (V^T CV + \lambda I)^{-1} V^T CP
-            inv = np.linalg.inv(
-                V_T_V
-                + confidence_scaled_v_transpose_v
-                + regularization_coefficient * np.identity(k)
-            )
+        V_T_P = data @ V
+
+        new_U = np.ndarray((len(coefficients), q, k))
+
+        def solve_chunk(start: int, stop: int):
+            """Solves the systems of rows start:stop into new_U[:, start:stop]."""
+            entries = slice(data.indptr[start], data.indptr[stop])
+            chunk_indptr = data.indptr[start : stop + 1] - data.indptr[start]
+
+            observed_V = V[data.indices[entries]]
+            outer_products = observed_V[:, :, np.newaxis] * observed_V[:, np.newaxis, :]
+            V_T_C_V = V_T_V + _segment_sum(outer_products, chunk_indptr)
 
-            # removed C_u here since unneccessary in binary case
-            # P_u is already binary
-            U_i = inv @ V.T @ P_u
+            eigenvalues, eigenvectors = np.linalg.eigh(V_T_C_V)
+            # right hand sides in each row's eigenbasis, shared by every lambda
+            rotated_V_T_P = np.einsum("rji,rj->ri", eigenvectors, V_T_P[start:stop])
 
-            new_U[i, :] = U_i
+            for i, coefficient in enumerate(coefficients):
+                new_U[i, start:stop] = np.einsum(
+                    "rij,rj->ri",
+                    eigenvectors,
+                    rotated_V_T_P / (eigenvalues + coefficient),
+                )
+
+        # the eigendecomposition holds two k x k matrices per row
+        _solve_in_chunks(data.indptr, 2 * k * k, num_workers, solve_chunk)
 
         return new_U
 
+    def _get_fold_in_operator(
+        self, c: float, regularization_coefficient: float
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Gets the precomputed operator for folding a new entity into the model.
+
+        The operator is computed once per (c, regularization_coefficient) and cached
+        until V changes.
+
+        Args:
+            c: Weight for negative training examples in the loss function.
+            regularization_coefficient: Coefficient on the embedding regularization
+                term.
+
+        Returns:
+            A tuple (G, W) where G is the kxk matrix V^T V + lambda I and W is the
+            kxn matrix G^{-1} V^T, computed from the Cholesky factorization of G.
+        """
+        key = (c, regularization_coefficient)
+
+        if key not in self._fold_in_operators:
+            regularized_V_T_V = self._V.T @ self._V + (
+                regularization_coefficient * np.identity(self.k)
+            )
+            W = linalg.cho_solve(linalg.cho_factor(regularized_V_T_V), self._V.T)
+            self._fold_in_operators[key] = (regularized_V_T_V, W)
+
+        return self._fold_in_operators[key]
+
+    def _fold_in(
+        self,
+        item_indices: np.ndarray,
+        values: np.ndarray,
+        c: float,
+        regularization_coefficient: float,
+    ) -> np.ndarray:
+        """Computes the factor of a new entity with the given observations.
+
+        Solves (G + V_J^T V_J) x = V_J^T p_J, where G = V^T V + lambda I, J are the
+        observed items and p_J their values, using the cached operator for G.
+        When |J| < k the system is solved by the Woodbury identity
+            x = y - W_J (I + V_J W_J)^{-1} V_J y,  y = W_J p_J,
+        costing O(|J| k^2 + |J|^3); otherwise V_J^T V_J is added to G and the k x k
+        system is factored directly, costing O(|J| k^2 + k^3).
+
+        Args:
+            item_indices: Length-|J| array of the observed items.
+            values: Length-|J| array of the value of each observed item.
+            c: Weight for negative training examples in the loss function.
+            regularization_coefficient: Coefficient on the embedding regularization
+                term.
+
+        Returns:
+            The length-k factor of the new entity.
+        """
+        regularized_V_T_V, W = self._get_fold_in_operator(c, regularization_coefficient)
+
+        V_J = self._V[item_indices]
+        W_J = W[:, item_indices]
+        y = W_J @ values
+
+        if len(item_indices) < self.k:
+            capacitance = np.identity(len(item_indices)) + V_J @ W_J
+            return y - W_J @ np.linalg.solve(capacitance, V_J @ y)
+
+        return linalg.solve(
+            regularized_V_T_V + V_J.T @ V_J, V_J.T @ values, assume_a="pos"
+        )
+
     def fit(
         self,
         data: tf.SparseTensor,
         epochs: int,
         c: float = 0.024,
         regularization_coefficient: float = 0.01,
+        num_workers: int = 1,
+        solver: WalsSolver = WalsSolver.EXACT,
+        cg_steps: int = 3,
+        warm_start: bool = False,
     ):
         """Fits the model to data.
 
@@ -194,32 +547,146 @@ class WalsRecommender(Recommender):
                 discounted weight c.  Requires 0 < c < 1.
             regularization_coefficient: Coefficient on the embedding regularization
                 term.
+            num_workers: Number of threads among which to split the rows of each
+                factor update.  Requires num_workers > 0.
+            solver: The method by which to solve the least squares systems.  The
+                conjugate gradient solver is warm-started from the previous epoch's
+                factors and is faster for large embedding dimensions.
+            cg_steps: Number of conjugate gradient steps per factor update.  Requires
+                cg_steps > 0.
+            warm_start: Whether to continue training from the current embeddings
+                rather than from newly initialized ones.
 
         Mutates:
             The recommender to the new trained state.
         """
-        self._reset_embeddings()
+        if not warm_start:
+            self._reset_embeddings()
 
         # preconditions
         assert 0 < c < 1
+        assert num_workers > 0
 
-        P: np.ndarray = tf.sparse.to_dense(tf.sparse.reorder(data)).numpy()
+        # row (CSR) and column (CSC) views of the data, so the data is never
+        # densified and each row update only touches that row's observations
+        P_rows = sparse_tensor_to_csr(data)
+        P_rows.eliminate_zeros()
+        P_columns = P_rows.T.tocsr()
 
-        assert P.shape == (self.m, self.n)
+        assert P_rows.shape == (self.m, self.n)
 
         alpha = (1 / c) - 1
 
         for _ in range(epochs):
             # step 1: update U
             self._U = self._update_factor(
-                self._V, P.T, alpha, regularization_coefficient
+                self._V,
+                P_rows,
+                alpha,
+                regularization_coefficient,
+                num_workers,
+                solver=solver,
+                initial_factors=self._U,
+                cg_steps=cg_steps,
             )
 
             # step 2: update V
-            self._V = self._update_factor(self._U, P, alpha, regularization_coefficient)
+            self._V = self._update_factor(
+                self._U,
+                P_columns,
+                alpha,
+                regularization_coefficient,
+                num_workers,
+                solver=solver,
+                initial_factors=self._V,
+                cg_steps=cg_steps,
+            )
+
+        self._fold_in_operators = {}
 
         self._checkrep()
 
+    def fit_regularization_path(
+        self,
+        data: tf.SparseTensor,
+        epochs: int,
+        regularization_coefficients: Sequence[float],
+        c: float = 0.024,
+        anchor_regularization_coefficient: float | None = None,
+        num_workers: int = 1,
+        solver: WalsSolver = WalsSolver.EXACT,
+        cg_steps: int = 3,
+        warm_start: bool = False,
+    ):  # -> list[WalsRecommender]:
+        """Fits one model per regularization coefficient from a single fit.
+
+        This model is fit at the anchor coefficient.  Then, holding its item factors
+        V fixed, the entity factors are solved for every coefficient at once with
+        _solve_regularization_path, sharing one eigendecomposition per entity.  Each
+        returned model is therefore the exact least squares U for its coefficient
+        given the anchor's V, which approximates, but is not equal to, fitting with
+        that coefficient from scratch; the approximation is best for coefficients
+        near the anchor.
+
+        Args:
+            data: An mxn tensor of training data.
+            epochs: Number of training epochs of the anchor fit.
+            regularization_coefficients: the coefficients on the embedding
+                regularization term for which to get models.  Requires each
+                coefficient >= 0.
+            c: Weight for negative training examples in the loss function.
+                Requires 0 < c < 1.
+            anchor_regularization_coefficient: the coefficient at which this model
+                is fit.  If None, the median of regularization_coefficients.
+            num_workers: Number of threads among which to split the rows of each
+                factor update.
+            solver: The method by which to solve the anchor fit's systems.
+            cg_steps: Number of conjugate gradient steps per factor update.
+            warm_start: Whether to continue the anchor fit from the current
+                embeddings.
+
+        Returns:
+            A list of new models such that the ith has regularization coefficient
+            regularization_coefficients[i].
+
+        Mutates:
+            The recommender to be fit at the anchor coefficient.
+        """
+        assert len(regularization_coefficients) > 0
+        if anchor_regularization_coefficient is None:
+            anchor_regularization_coefficient = float(
+                np.median(regularization_coefficients)
+            )
+
+        self.fit(
+            data,
+            epochs=epochs,
+            c=c,
+            regularization_coefficient=anchor_regularization_coefficient,
+            num_workers=num_workers,
+            solver=solver,
+            cg_steps=cg_steps,
+            warm_start=warm_start,
+        )
+
+        P_rows = sparse_tensor_to_csr(data)
+        P_rows.eliminate_zeros()
+        path_U = self._solve_regularization_path(
+            self._V, P_rows, regularization_coefficients, num_workers
+        )
+
+        models = []
+        for U in path_U:
+            model = copy.copy(self)
+            model._U = U
+            model._V = np.copy(self._V)
+            model._fold_in_operators = {}
+            model._checkrep()
+            models.append(model)
+
+        self._checkrep()
+        return models
+
     def evaluate(
         self,
         test_data: tf.SparseTensor,
@@ -239,17 +706,18 @@ class WalsRecommender(Recommender):
         Returns:
             The mean squared error of the test data.
         """
-        predictions_matrix = self.predict(method)
-
-        row_indices = tuple(index[0] for index in test_data.indices)
-        column_indices = tuple(index[1] for index in test_data.indices)
-        prediction_values = predictions_matrix[row_indices, column_indices]
+        test_indices = test_data.indices.numpy()
+        prediction_values = self.predict_matrix(method).gather(
+            test_indices[:, 0], test_indices[:, 1]
+        )
 
         self._checkrep()
         return mean_squared_error(test_data.values, prediction_values)
 
-    def predict(self, method: PredictionMethod = PredictionMethod.DOT) -> np.ndarray:
-        """Gets the model predictions.
+    def predict_matrix(
+        self, method: PredictionMethod = PredictionMethod.DOT
+    ) -> PredictionMatrix:
+        """Gets the model predictions as a lazily evaluated matrix.
 
         The predictions consist of the estimated matrix A_hat of the truth
         matrix A, of which the training data contains a sparse subset of the entries.
@@ -258,11 +726,11 @@ class WalsRecommender(Recommender):
             method: The prediction method to use.
 
         Returns:
-            An mxn array of values.
+            An mxn prediction matrix.
         """
         self._checkrep()
 
-        return calculate_predicted_matrix(self._U, self._V, method)
+        return PredictionMatrix.from_factors(self._U, self._V, method)
 
     def predict_new_entity(
         self,
@@ -274,6 +742,11 @@ class WalsRecommender(Recommender):
     ) -> np.array:
         """Recommends items to an unseen entity.
 
+        The entity is folded in with the operator cached for (c,
+        regularization_coefficient), so after the first query with those
+        hyperparameters the cost depends on the number of rated items, not n, until
+        the final scoring.
+
         Args:
             entity: A length-n sparse tensor of consisting of the new entity's
                 ratings for each item, indexed exactly as the items used to
@@ -288,23 +761,70 @@ class WalsRecommender(Recommender):
         Returns:
             An array of predicted values for the new entity.
         """
-        entity = tf.sparse.to_dense(tf.sparse.reorder(entity)).numpy()
-        assert entity.shape == (self.n,)
+        entity = sparse_tensor_to_csr(entity)
+        entity.eliminate_zeros()
+        assert entity.shape == (1, self.n)
+        assert 0 < c < 1
+
+        new_entity_factor = self._fold_in(
+            entity.indices, entity.data, c, regularization_coefficient
+        )
+        assert new_entity_factor.shape == (self.k,)
+
+        self._checkrep()
+        if method == PredictionMethod.DOT:
+            return self._V @ new_entity_factor
+
+        return np.squeeze(
+            calculate_predicted_matrix(
+                np.expand_dims(new_entity_factor, axis=0), self._V, method
+            )
+        )
+
+    def predict_new_entities(
+        self,
+        entities: tf.SparseTensor,
+        c: float,
+        regularization_coefficient: float,
+        method: PredictionMethod = PredictionMethod.DOT,
+        **kwargs,
+    ) -> np.ndarray:
+        """Recommends items to several unseen entities.
+
+        All entities are folded in by one batched least squares solve sharing
+        V^T V + lambda I.
+
+        Args:
+            entities: A bxn sparse tensor consisting of each new entity's ratings for
+                each item, indexed exactly as the items used to train this model.
+            c: Weight for negative training examples in the loss function,
+                ie each positive example takes weight 1, while negative examples take
+                discounted weight c.  Requires 0 < c < 1.
+            regularization_coefficient: Coefficient on the embedding regularization
+                term.
+            method: The prediction method to use.
+
+        Returns:
+            A bxn array whose ith row contains the predicted values for entity i.
+        """
+        entities = sparse_tensor_to_csr(entities)
+        entities.eliminate_zeros()
+        assert entities.shape[1] == self.n
+
+        if entities.shape[0] == 0:
+            return np.zeros((0, self.n))
 
         alpha = (1 / c) - 1
 
-        new_entity_factor = self._update_factor(
+        new_entity_factors = self._update_factor(
             opposing_factors=self._V,
-            data=np.expand_dims(entity, axis=1),
+            data=entities,
             alpha=alpha,
             regularization_coefficient=regularization_coefficient,
         )
 
-        assert new_entity_factor.shape == (1, self._U.shape[1])
-
-        return np.squeeze(
-            calculate_predicted_matrix(new_entity_factor, self._V, method)
-        )
+        self._checkrep()
+        return calculate_predicted_matrix(new_entity_factors, self._V, method)
 
 
 Recommender.register(WalsRecommender)
@@ -0,0 +1,206 @@
+import json
+from collections.abc import Iterator
+from typing import TextIO
+
+# file extensions of the JSON Lines variant of the combined dataset
+JSON_LINES_EXTENSIONS = (".jsonl", ".ndjson")
+
+_READ_CHUNK_SIZE = 1 << 16
+
+# length of the longest JSON token, -Infinity, which may be cut off by the buffer
+_MAX_TOKEN_LENGTH = 9
+
+_WHITESPACE = " \t\n\r"
+
+
+class _JsonStream:
+    """An incremental reader of JSON tokens and values from a text file.
+
+    Only a window of the file is held in memory, so arbitrarily long top-level
+    arrays can be read one element at a time.
+    """
+
+    # Abstraction function:
+    #   AF(f, buffer, position) = a reader positioned at character position of
+    #       buffer, where buffer holds the characters of f that have been read but
+    #       not yet discarded.
+    # Rep invariant:
+    #   - 0 <= position <= len(buffer)
+    # Safety from rep exposure:
+    #   - all fields are private and f is never returned
+
+    def __init__(self, f: TextIO):
+        """Initializes a _JsonStream reading from f."""
+        self._f = f
+        self._buffer = ""
+        self._position = 0
+        self._decoder = json.JSONDecoder()
+
+        self._checkrep()
+
+    def _checkrep(self):
+        """Asserts the rep invariant."""
+        #   - 0 <= position <= len(buffer)
+        assert 0 <= self._position <= len(self._buffer)
+
+    def _fill(self, size: int | None = None) -> bool:
+        """Reads the next chunk of the file into the buffer.
+
+        Args:
+            size: the maximum number of characters to read.  If None, one chunk.
+
+        Returns:
+            False if the end of the file has been reached, True otherwise.
+        """
+        # discard consumed characters so the buffer stays a bounded window
+        self._buffer = self._buffer[self._position :]
+        self._position = 0
+
+        chunk = self._f.read(_READ_CHUNK_SIZE if size is None else size)
+        self._buffer += chunk
+
+        self._checkrep()
+        return len(chunk) > 0
+
+    def _is_truncated(self, error: json.JSONDecodeError) -> bool:
+        """Gets whether error may be caused by the end of the buffer.
+
+        A value cut off by the end of the buffer either fails within one token of
+        the end, or is an unterminated string.  Any other error is malformed JSON.
+        """
+        return error.pos > len(
+            self._buffer
+        ) - _MAX_TOKEN_LENGTH or error.msg.startswith("Unterminated string")
+
+    def peek(self) -> str:
+        """Gets the next non-whitespace character without consuming it.
+
+        Returns:
+            The next non-whitespace character, or the empty string at end of file.
+        """
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in _WHITESPACE
+            ):
+                self._position += 1
+
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+
+            if not self._fill():
+                return ""
+
+    def expect(self, character: str):
+        """Consumes the next non-whitespace character, which must be character.
+
+        Raises:
+            ValueError: if the next non-whitespace character is not character.
+        """
+        next_character = self.peek()
+        if next_character != character:
+            raise ValueError(f"Expected {character!r} but found {next_character!r}.")
+        self._position += 1
+
+    def decode(self):
+        """Decodes and consumes the next JSON value.
+
+        Each retry on a value that extends past the buffer reads twice as much of
+        the file as the last, so a value of S characters is decoded O(log S) times.
+
+        Returns:
+            The decoded value.
+
+        Raises:
+            json.JSONDecodeError: if the next value is not valid JSON.
+        """
+        self.peek()
+        read_size = _READ_CHUNK_SIZE
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError as error:
+                # only a value cut off by the end of the buffer is retried
+                if not self._is_truncated(error) or not self._fill(read_size):
+                    raise
+                read_size *= 2
+                continue
+
+            # a number may be cut off at the end of the buffer
+            if end == len(self._buffer) and self._fill(read_size):
+                read_size *= 2
+                continue
+
+            self._position = end
+            return value
+
+
+def _get_techniques(report: dict) -> frozenset[str]:
+    """Gets the MITRE technique ids of a report."""
+    # mitre_techniques maps technique id to count, but a plain list is also accepted
+    return frozenset(report["mitre_techniques"])
+
+
+def _iter_json_report_techniques(f: TextIO) -> Iterator[frozenset[str]]:
+    """Yields the techniques of each report in a combined dataset JSON file.
+
+    The reports array is decoded one report at a time.  Other top-level keys are
+    decoded and discarded.
+    """
+    stream = _JsonStream(f)
+    found_reports = False
+
+    stream.expect("{")
+    while stream.peek() != "}":
+        key = stream.decode()
+        stream.expect(":")
+
+        if key == "reports":
+            found_reports = True
+            stream.expect("[")
+            while stream.peek() != "]":
+                yield _get_techniques(stream.decode())
+                if stream.peek() == ",":
+                    stream.expect(",")
+            stream.expect("]")
+        else:
+            stream.decode()
+
+        if stream.peek() == ",":
+            stream.expect(",")
+    stream.expect("}")
+
+    if not found_reports:
+        raise ValueError("Combined dataset has no reports.")
+
+
+def _iter_json_lines_report_techniques(f: TextIO) -> Iterator[frozenset[str]]:
+    """Yields the techniques of each report in a JSON Lines combined dataset."""
+    for line in f:
+        if line.strip():
+            yield _get_techniques(json.loads(line))
+
+
+def iter_report_techniques(filepath: str) -> Iterator[frozenset[str]]:
+    """Yields the set of MITRE technique ids present in each report of a dataset.
+
+    Reports are yielded in order of appearance in the combined dataset, which is
+    read incrementally so that memory use does not grow with the size of the file.
+    The dataset is either a JSON object with a "reports" array, or, if filepath has
+    a JSON Lines extension, one report object per line.  Each report has a
+    "mitre_techniques" field mapping technique id to count.
+
+    All techniques are returned, regardless of whether they are valid
+    MITRE ATT&CK techniques.
+
+    Args:
+        filepath: location of the combined dataset.
+
+    Yields:
+        The set of techniques of each report.
+    """
+    with open(filepath) as f:
+        if filepath.endswith(JSON_LINES_EXTENSIONS):
+            yield from _iter_json_lines_report_techniques(f)
+        else:
+            yield from _iter_json_report_techniques(f)
@@ -0,0 +1,863 @@
+import copy
+import itertools
+import math
+import multiprocessing
+import time
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from tie.constants import PredictionMethod
+from tie.matrix import ReportTechniqueMatrix
+from tie.recommender import Recommender, WalsRecommender
+from tie.utils import EVALUATION_BLOCK_SIZE, evaluate_top_k_in_blocks
+
+# columns of the trial table after the hyperparameter columns
+TRIAL_COLUMNS = ("seed", "score", "fit_seconds")
+
+
+def get_parameter_grid(grid: dict[str, Sequence]) -> list[dict]:
+    """Gets the cartesian product of hyperparameter values.
+
+    Args:
+        grid: mapping of each hyperparameter to the values over which to search.
+
+    Returns:
+        A list with one mapping of each hyperparameter to a value for every unique
+        combination of values.  The last hyperparameter varies fastest.
+    """
+    names = tuple(grid.keys())
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[name] for name in names))
+    ]
+
+
+def get_serpentine_order(grid: dict[str, Sequence]) -> list[int]:
+    """Orders the combinations of hyperparameter values so neighbors are close.
+
+    Consecutive combinations differ in exactly one hyperparameter, which moves to an
+    adjacent value in its list, as in a reflected Gray code.  For example, the grid
+    {"a": [1, 2], "b": [3, 4, 5]} is ordered (1, 3), (1, 4), (1, 5), (2, 5), (2, 4),
+    (2, 3).
+
+    Args:
+        grid: mapping of each hyperparameter to the values over which to search.
+
+    Returns:
+        The indices into get_parameter_grid(grid) of every combination, in
+        serpentine order.
+    """
+    sizes = tuple(len(values) for values in grid.values())
+
+    def get_order(dimension: int) -> list[int]:
+        """Gets the serpentine order of the flat indices of the last dimensions."""
+        if dimension == len(sizes):
+            return [0]
+
+        suffix_order = get_order(dimension + 1)
+        stride = math.prod(sizes[dimension + 1 :])
+
+        order = []
+        for value in range(sizes[dimension]):
+            # reverse every other pass so each pass starts where the last ended
+            suffix = suffix_order if value % 2 == 0 else suffix_order[::-1]
+            order.extend(value * stride + index for index in suffix)
+        return order
+
+    return get_order(0)
+
+
+def set_trial_seed(seed: int):
+    """Seeds the global random state used by recommender initialization and fit.
+
+    Args:
+        seed: the seed of a trial.
+
+    Mutates:
+        The numpy and tensorflow global random states.
+    """
+    np.random.seed(seed)
+    tf.random.set_seed(seed)
+
+
+def _get_trial_seeds(num_trials: int, seed: int | None) -> list[int]:
+    """Gets an independent seed for each trial of a search.
+
+    Args:
+        num_trials: the number of trials.
+        seed: the seed of the trial seeds.  If None, it is drawn from the global
+            numpy random state.
+
+    Returns:
+        A length num_trials list of seeds.
+    """
+    if seed is None:
+        # derived from the global seed so np.random.seed makes searches reproducible
+        seed = np.random.randint(2**31)
+    return [
+        int(child.generate_state(1)[0])
+        for child in np.random.SeedSequence(seed).spawn(num_trials)
+    ]
+
+
+class _TrialContext:
+    """The fixed inputs shared by every trial of a search."""
+
+    # Abstraction function:
+    # 	AF(model, training_data, validation_data, prediction_method, metric, k,
+    #       block_size, fit_kwargs, shared_memory) = a search fitting copies of
+    #       model to training_data, with fit_kwargs in addition to each trial's
+    #       hyperparameters, and scoring them by metric at k on validation_data,
+    #       whose matrices may be backed by the blocks in shared_memory.
+    # Rep invariant:
+    # - training_data.shape == validation_data.shape
+    # - k > 0 and block_size > 0
+    # Safety from rep exposure:
+    # - model is only deep copied
+    # - fit_kwargs is a copy and never returned
+    # - training_data and validation_data are immutable
+
+    def __init__(
+        self,
+        model: Recommender,
+        training_data: ReportTechniqueMatrix,
+        validation_data: ReportTechniqueMatrix,
+        prediction_method: PredictionMethod,
+        metric: str,
+        k: int,
+        block_size: int,
+        fit_kwargs: dict | None = None,
+        shared_memory: tuple[SharedMemory] = (),
+    ):
+        """Initializes a _TrialContext object."""
+        self._model = model
+        self._training_data = training_data
+        self._validation_data = validation_data
+        self._prediction_method = prediction_method
+        self._metric = metric
+        self._k = k
+        self._block_size = block_size
+        self._fit_kwargs = dict(fit_kwargs or {})
+        # kept so the blocks backing the matrices stay open
+        self._shared_memory = shared_memory
+
+        self._checkrep()
+
+    def _checkrep(self):
+        """Asserts the rep invariant."""
+        # - training_data.shape == validation_data.shape
+        assert self._training_data.shape == self._validation_data.shape
+        # - k > 0 and block_size > 0
+        assert self._k > 0
+        assert self._block_size > 0
+
+    def new_model(self) -> Recommender:
+        """Gets a new, unfitted copy of the model."""
+        self._checkrep()
+        return copy.deepcopy(self._model)
+
+    def fit(
+        self,
+        model: Recommender,
+        hyperparameters: dict,
+        seed: int,
+        warm_start: bool = False,
+    ) -> float:
+        """Fits a model to the training data.
+
+        Args:
+            model: the model to fit.
+            hyperparameters: arguments to the model's fit, in addition to the
+                context's fit_kwargs.  Requires no key in common with fit_kwargs.
+            seed: seed of the global random state for the fit.
+            warm_start: whether to continue from the model's current state.
+
+        Returns:
+            The time taken to fit the model, in seconds.
+
+        Mutates:
+            model to the new trained state.
+        """
+        assert self._fit_kwargs.keys().isdisjoint(hyperparameters)
+
+        set_trial_seed(seed)
+        kwargs = self._fit_kwargs | hyperparameters
+        if warm_start:
+            kwargs["warm_start"] = True
+
+        start = time.perf_counter()
+        model.fit(self._training_data.to_sparse_tensor(), **kwargs)
+
+        self._checkrep()
+        return time.perf_counter() - start
+
+    def score(self, model: Recommender) -> float:
+        """Scores a fitted model by the validation metric."""
+        metrics = evaluate_top_k_in_blocks(
+            model.predict_matrix(method=self._prediction_method).rows,
+            self._validation_data.to_scipy(),
+            ks=(self._k,),
+            block_size=self._block_size,
+        )
+
+        self._checkrep()
+        return float(metrics.loc[self._k, self._metric])
+
+    def run_chain(
+        self,
+        trials: list[tuple[dict, int]],
+        warm_start_epochs: int | None = None,
+    ) -> list[tuple[float, float]]:
+        """Fits one copy of the model for each trial in turn, warm starting each fit.
+
+        The first trial is fit from newly initialized embeddings, and every later
+        trial continues from the embeddings of the trial before it.
+
+        Args:
+            trials: (hyperparameters, seed) of each trial, in order.
+            warm_start_epochs: if not None, the epochs for which to fit every trial
+                after the first, in place of its epochs hyperparameter.
+
+        Returns:
+            A tuple (score, fit_seconds) for each trial of the validation metric of
+            its fitted model and the time taken to fit it.
+        """
+        model = self.new_model()
+
+        results = []
+        for position, (hyperparameters, seed) in enumerate(trials):
+            warm_start = position > 0
+            if warm_start and warm_start_epochs is not None:
+                hyperparameters = hyperparameters | {"epochs": warm_start_epochs}
+
+            fit_seconds = self.fit(model, hyperparameters, seed, warm_start=warm_start)
+            results.append((self.score(model), fit_seconds))
+        return results
+
+
+def _share_array(array: np.ndarray) -> tuple[SharedMemory, tuple]:
+    """Copies an array into a new shared memory block.
+
+    Returns:
+        A tuple (shared_memory, spec) of the new block and the (name, shape, dtype)
+        with which _attach_array views it from another process.
+    """
+    shared_memory = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shared_memory.buf)[...] = array
+    return shared_memory, (shared_memory.name, array.shape, array.dtype.str)
+
+
+def _attach_array(spec: tuple) -> tuple[SharedMemory, np.ndarray]:
+    """Views an array shared by _share_array without copying it."""
+    name, shape, dtype = spec
+    shared_memory = SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shared_memory.buf)
+    return shared_memory, array
+
+
+# arrays of a ReportTechniqueMatrix passed to worker processes
+_MATRIX_ARRAYS = ("indptr", "column_indices", "values", "report_ids", "technique_ids")
+
+
+def _share_matrix(
+    matrix: ReportTechniqueMatrix,
+) -> tuple[list[SharedMemory], dict]:
+    """Copies the arrays of a matrix into shared memory.
+
+    The CSR arrays and the report and technique ids are shared, so a worker
+    receives O(1) data per matrix.  Ids of object dtype cannot be viewed in shared
+    memory and are pickled instead.
+
+    Returns:
+        A tuple (shared_memory, spec) of the new blocks and a picklable description
+        from which _attach_matrix rebuilds the matrix in another process.
+    """
+    blocks = []
+    spec = {}
+    for name in _MATRIX_ARRAYS:
+        array = getattr(matrix, name)
+        if array.dtype.hasobject:
+            spec[name] = array
+            continue
+
+        shared_memory, spec[name] = _share_array(array)
+        blocks.append(shared_memory)
+    return blocks, spec
+
+
+def _attach_matrix(spec: dict) -> tuple[list[SharedMemory], ReportTechniqueMatrix]:
+    """Rebuilds a matrix shared by _share_matrix on its shared memory."""
+    blocks = []
+    arrays = {}
+    for name in _MATRIX_ARRAYS:
+        # pickled arrays are used as is
+        if isinstance(spec[name], np.ndarray):
+            arrays[name] = spec[name]
+            continue
+
+        shared_memory, arrays[name] = _attach_array(spec[name])
+        blocks.append(shared_memory)
+
+    matrix = ReportTechniqueMatrix.from_csr(**arrays)
+    return blocks, matrix
+
+
+# context of the trials run by this worker process
+_worker_context: _TrialContext | None = None
+
+
+def _initialize_worker(
+    model: Recommender,
+    training_spec: dict,
+    validation_spec: dict,
+    prediction_method: PredictionMethod,
+    metric: str,
+    k: int,
+    block_size: int,
+    fit_kwargs: dict,
+):
+    """Attaches a worker process to the shared training and validation data."""
+    global _worker_context
+
+    training_blocks, training_data = _attach_matrix(training_spec)
+    validation_blocks, validation_data = _attach_matrix(validation_spec)
+    _worker_context = _TrialContext(
+        model=model,
+        training_data=training_data,
+        validation_data=validation_data,
+        prediction_method=prediction_method,
+        metric=metric,
+        k=k,
+        block_size=block_size,
+        fit_kwargs=fit_kwargs,
+        shared_memory=tuple(training_blocks + validation_blocks),
+    )
+
+
+def _run_worker_chain(
+    trials: list[tuple[dict, int]], warm_start_epochs: int | None
+) -> list[tuple[float, float]]:
+    """Runs a chain of trials in a worker process initialized by _initialize_worker.
+
+    A chain of one trial is fit from newly initialized embeddings.
+    """
+    return _worker_context.run_chain(trials, warm_start_epochs)
+
+
+def grid_search(
+    model: Recommender,
+    training_data: ReportTechniqueMatrix,
+    validation_data: ReportTechniqueMatrix,
+    grid: dict[str, Sequence],
+    prediction_method: PredictionMethod = PredictionMethod.DOT,
+    metric: str = "recall",
+    k: int = 20,
+    num_workers: int = 1,
+    seed: int | None = None,
+    block_size: int = EVALUATION_BLOCK_SIZE,
+    warm_start: bool = False,
+    warm_start_epochs: int | None = None,
+    fit_kwargs: dict | None = None,
+) -> pd.DataFrame:
+    """Fits and scores a copy of model for every combination of hyperparameters.
+
+    Each trial seeds the global random state from its own stream of a
+    np.random.SeedSequence, so the table does not depend on the order in which
+    trials finish.  With more than one worker, trials run in a pool of processes
+    which view the CSR arrays of the training and validation data in shared memory
+    rather than receiving copies.  Each process also runs any threads the model's
+    fit starts, so num_workers times the model's thread count should not exceed the
+    number of cores.
+
+    By default, every trial is fit from newly initialized embeddings, and the table
+    does not depend on num_workers.  With warm_start, the combinations are instead
+    visited in the order of get_serpentine_order, split into num_workers contiguous
+    chains, and each trial but the first of its chain continues from the
+    embeddings of the trial before it, which differs in one hyperparameter.  Since
+    a nearby solution converges in few epochs, warm_start_epochs may then be much
+    smaller than the epochs of the first trial.  Warm started scores depend on
+    num_workers, which determines the chains.
+
+    Args:
+        model: the recommender to fit.  Requires it to be picklable if
+            num_workers > 1.
+        training_data: the data on which to fit each trial.
+        validation_data: the data on which to score each trial.
+        grid: mapping of each hyperparameter of the model's fit to the values over
+            which to search.
+        prediction_method: the method to use for predictions.
+        metric: the column of tie.utils.TOP_K_METRICS by which to score trials.
+        k: the k at which to compute metric.  Requires 0 < k <= n.
+        num_workers: the number of processes in which to run trials.  Requires
+            num_workers > 0.
+        seed: the seed of the trial seeds.  If None, it is drawn from the global
+            numpy random state.
+        block_size: the maximum number of rows predicted at a time when scoring.
+        warm_start: whether each trial continues from the embeddings of its
+            neighbor.  Requires the model's fit to take a warm_start argument.
+        warm_start_epochs: if not None and warm_start, the epochs for which to fit
+            warm started trials.  Requires warm_start_epochs > 0.
+        fit_kwargs: arguments passed to the model's fit in every trial which are
+            not searched over, such as num_workers.  Requires no key in grid.
+
+    Returns:
+        A dataframe with one row per combination of hyperparameters, in the order of
+        get_parameter_grid, and with one column per hyperparameter followed by
+        seed, the seed of the trial's global random state, score, the validation
+        metric, fit_seconds, the time to fit the trial, and warm_started, whether
+        the trial continued from another trial's embeddings.
+    """
+    assert num_workers > 0
+    assert training_data.shape == validation_data.shape
+    assert warm_start_epochs is None or warm_start_epochs > 0
+
+    parameter_grid = get_parameter_grid(grid)
+    seeds = _get_trial_seeds(len(parameter_grid), seed)
+
+    if warm_start:
+        chains = [
+            chain.tolist()
+            for chain in np.array_split(get_serpentine_order(grid), num_workers)
+            if len(chain) > 0
+        ]
+    else:
+        chains = [[trial] for trial in range(len(parameter_grid))]
+        warm_start_epochs = None
+    chain_trials = [
+        [(parameter_grid[trial], seeds[trial]) for trial in chain] for chain in chains
+    ]
+
+    if num_workers == 1:
+        context = _TrialContext(
+            model=model,
+            training_data=training_data,
+            validation_data=validation_data,
+            prediction_method=prediction_method,
+            metric=metric,
+            k=k,
+            block_size=block_size,
+            fit_kwargs=fit_kwargs,
+        )
+        chain_results = [
+            context.run_chain(trials, warm_start_epochs) for trials in chain_trials
+        ]
+    else:
+        training_blocks, training_spec = _share_matrix(training_data)
+        validation_blocks, validation_spec = _share_matrix(validation_data)
+        try:
+            # spawn since tensorflow is not safe to use after fork
+            with ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialize_worker,
+                initargs=(
+                    model,
+                    training_spec,
+                    validation_spec,
+                    prediction_method,
+                    metric,
+                    k,
+                    block_size,
+                    dict(fit_kwargs or {}),
+                ),
+            ) as executor:
+                chain_results = list(
+                    executor.map(
+                        _run_worker_chain,
+                        chain_trials,
+                        [warm_start_epochs] * len(chain_trials),
+                    )
+                )
+        finally:
+            for shared_memory in training_blocks + validation_blocks:
+                shared_memory.close()
+                shared_memory.unlink()
+
+    results = [None] * len(parameter_grid)
+    warm_started = [False] * len(parameter_grid)
+    for chain, chain_result in zip(chains, chain_results):
+        for position, (trial, result) in enumerate(zip(chain, chain_result)):
+            results[trial] = result
+            warm_started[trial] = position > 0
+
+    trials = pd.DataFrame(
+        [
+            hyperparameters
+            | dict(zip(TRIAL_COLUMNS, (trial_seed, *result)))
+            | {"warm_started": trial_warm_started}
+            for hyperparameters, trial_seed, result, trial_warm_started in zip(
+                parameter_grid, seeds, results, warm_started
+            )
+        ],
+        columns=[*grid.keys(), *TRIAL_COLUMNS, "warm_started"],
+    )
+    trials.index.name = "trial"
+    return trials
+
+
+class SuccessiveHalvingSearch:
+    """A resumable successive halving search over a grid of hyperparameters.
+
+    Every combination of hyperparameters starts as a trial fit for min_epochs
+    epochs.  After each rung, only the best 1/reduction_factor of the trials, by the
+    validation metric, are promoted to the next rung, where they continue training
+    from their current embeddings for reduction_factor times as many total epochs,
+    up to max_epochs.  Each trial's model is kept between rungs, so a promoted trial
+    resumes rather than restarts, and the search may be advanced one rung at a time.
+    """
+
+    # Abstraction function:
+    # 	AF(context, parameter_grid, seeds, budgets, rung, models, epochs,
+    #       scores, rungs, fit_seconds, active) = a search that has completed rung
+    #       rungs of the epoch budgets, in which trial i has hyperparameters
+    #       parameter_grid[i] and seed seeds[i], has model models[i] fit for
+    #       epochs[i] epochs in fit_seconds[i] seconds, scoring scores[i] after rung
+    #       rungs[i], and is promoted to the next rung if i is in active.
+    # Rep invariant:
+    # - len(parameter_grid) == len(seeds) == len(models) == len(epochs)
+    #   == len(scores) == len(rungs) == len(fit_seconds) > 0
+    # - budgets is strictly increasing and budgets[0] > 0
+    # - 0 <= rung <= len(budgets)
+    # - active is a nonempty, sorted subset of trial indices
+    # - epochs[i] == budgets[rung - 1] for i in active if rung > 0
+    # Safety from rep exposure:
+    # - all fields are private
+    # - models are deep copied before being returned
+    # - the trial table is a new dataframe
+
+    def __init__(
+        self,
+        model: Recommender,
+        training_data: ReportTechniqueMatrix,
+        validation_data: ReportTechniqueMatrix,
+        grid: dict[str, Sequence],
+        max_epochs: int,
+        min_epochs: int = 1,
+        reduction_factor: int = 3,
+        prediction_method: PredictionMethod = PredictionMethod.DOT,
+        metric: str = "recall",
+        k: int = 20,
+        seed: int | None = None,
+        block_size: int = EVALUATION_BLOCK_SIZE,
+        fit_kwargs: dict | None = None,
+    ):
+        """Initializes a SuccessiveHalvingSearch with no rungs completed.
+
+        Args:
+            model: the recommender to fit.  Requires its fit to take epochs and
+                warm_start arguments.
+            training_data: the data on which to fit each trial.
+            validation_data: the data on which to score each trial.
+            grid: mapping of each hyperparameter of the model's fit, other than
+                epochs, to the values over which to search.
+            max_epochs: the number of epochs for which the final trials are fit.
+                Requires max_epochs >= min_epochs.
+            min_epochs: the number of epochs for which every trial is first fit.
+                Requires min_epochs > 0.
+            reduction_factor: the factor by which the number of trials shrinks, and
+                the number of epochs grows, at each rung.  Requires
+                reduction_factor > 1.
+            prediction_method: the method to use for predictions.
+            metric: the column of tie.utils.TOP_K_METRICS by which to score trials.
+            k: the k at which to compute metric.  Requires 0 < k <= n.
+            seed: the seed of the trial seeds.  If None, it is drawn from the global
+                numpy random state.
+            block_size: the maximum number of rows predicted at a time when scoring.
+            fit_kwargs: arguments passed to the model's fit in every trial which
+                are not searched over, such as num_workers.  Requires no key in grid
+                and epochs not in fit_kwargs.
+        """
+        assert "epochs" not in grid
+        assert 0 < min_epochs <= max_epochs
+        assert reduction_factor > 1
+
+        self._grid_names = tuple(grid.keys())
+        self._context = _TrialContext(
+            model=model,
+            training_data=training_data,
+            validation_data=validation_data,
+            prediction_method=prediction_method,
+            metric=metric,
+            k=k,
+            block_size=block_size,
+            fit_kwargs=fit_kwargs,
+        )
+        self._reduction_factor = reduction_factor
+
+        self._parameter_grid = get_parameter_grid(grid)
+        self._seeds = _get_trial_seeds(len(self._parameter_grid), seed)
+
+        self._budgets = []
+        budget = min_epochs
+        while budget < max_epochs:
+            self._budgets.append(budget)
+            budget *= reduction_factor
+        self._budgets.append(max_epochs)
+
+        num_trials = len(self._parameter_grid)
+        self._rung = 0
+        self._models = [None] * num_trials
+        self._epochs = [0] * num_trials
+        self._scores = [np.nan] * num_trials
+        self._rungs = [0] * num_trials
+        self._fit_seconds = [0.0] * num_trials
+        self._active = list(range(num_trials))
+
+        self._checkrep()
+
+    def _checkrep(self):
+        """Asserts the rep invariant."""
+        num_trials = len(self._parameter_grid)
+        # - len(parameter_grid) == len(seeds) == len(models) == len(epochs)
+        #   == len(scores) == len(rungs) == len(fit_seconds) > 0
+        assert num_trials > 0
+        assert (
+            len(self._seeds)
+            == len(self._models)
+            == len(self._epochs)
+            == len(self._scores)
+            == len(self._rungs)
+            == len(self._fit_seconds)
+            == num_trials
+        )
+        # - budgets is strictly increasing and budgets[0] > 0
+        assert self._budgets[0] > 0
+        assert all(a < b for a, b in zip(self._budgets, self._budgets[1:]))
+        # - 0 <= rung <= len(budgets)
+        assert 0 <= self._rung <= len(self._budgets)
+        # - active is a nonempty, sorted subset of trial indices
+        assert len(self._active) > 0
+        assert self._active == sorted(self._active)
+        assert 0 <= self._active[0] and self._active[-1] < num_trials
+        # - epochs[i] == budgets[rung - 1] for i in active if rung > 0
+        if self._rung > 0:
+            assert all(
+                self._epochs[i] == self._budgets[self._rung - 1] for i in self._active
+            )
+
+    def _get_rank_key(self, trial: int) -> tuple[float, int]:
+        """Gets a key ordering trials from best to worst score, then by index."""
+        score = self._scores[trial]
+        return (np.inf if np.isnan(score) else -score, trial)
+
+    @property
+    def done(self) -> bool:
+        """Whether every rung has been completed."""
+        self._checkrep()
+        return self._rung == len(self._budgets)
+
+    def step(self):
+        """Completes the next rung of the search.
+
+        Each promoted trial is fit up to the rung's epoch budget, continuing from
+        its current embeddings if it has any, and scored.  Unless this is the final
+        rung, only the best 1/reduction_factor of the trials are promoted, with ties
+        broken in favor of earlier trials.
+
+        Requires that the search is not done.
+
+        Mutates:
+            The search to complete the rung.
+        """
+        assert not self.done
+        budget = self._budgets[self._rung]
+
+        for i in self._active:
+            warm_start = self._models[i] is not None
+            if not warm_start:
+                self._models[i] = self._context.new_model()
+
+            # a distinct seed per rung, so resumed fits do not repeat random draws
+            rung_seed = np.random.SeedSequence((self._seeds[i], self._rung))
+            self._fit_seconds[i] += self._context.fit(
+                self._models[i],
+                self._parameter_grid[i] | {"epochs": budget - self._epochs[i]},
+                int(rung_seed.generate_state(1)[0]),
+                warm_start=warm_start,
+            )
+            self._epochs[i] = budget
+            self._scores[i] = self._context.score(self._models[i])
+            self._rungs[i] = self._rung
+
+        self._rung += 1
+        if not self.done:
+            num_promoted = max(1, math.ceil(len(self._active) / self._reduction_factor))
+            ranked = sorted(self._active, key=self._get_rank_key)
+            promoted = sorted(ranked[:num_promoted])
+
+            # demoted models are no longer needed
+            for i in set(self._active) - set(promoted):
+                self._models[i] = None
+            self._active = promoted
+
+        self._checkrep()
+
+    def run(self) -> pd.DataFrame:
+        """Completes every remaining rung of the search.
+
+        Returns:
+            The trial table of the completed search.
+
+        Mutates:
+            The search to be done.
+        """
+        while not self.done:
+            self.step()
+
+        return self.trials
+
+    @property
+    def trials(self) -> pd.DataFrame:
+        """Gets the table of trials so far.
+
+        Returns:
+            A dataframe with one row per combination of hyperparameters, in the order
+            of get_parameter_grid, and with one column per hyperparameter followed by
+            seed, score, the validation metric after the trial's latest rung,
+            fit_seconds, the total time spent fitting the trial, epochs, the number
+            of epochs for which the trial has been fit, and rung, the index of the
+            trial's latest rung.
+        """
+        trials = pd.DataFrame(
+            [
+                hyperparameters
+                | {
+                    "seed": self._seeds[i],
+                    "score": self._scores[i],
+                    "fit_seconds": self._fit_seconds[i],
+                    "epochs": self._epochs[i],
+                    "rung": self._rungs[i],
+                }
+                for i, hyperparameters in enumerate(self._parameter_grid)
+            ],
+            columns=[*self._grid_names, *TRIAL_COLUMNS, "epochs", "rung"],
+        )
+        trials.index.name = "trial"
+
+        self._checkrep()
+        return trials
+
+    def get_best(self) -> tuple[dict, Recommender]:
+        """Gets the best trial of the completed search.
+
+        Requires that the search is done.
+
+        Returns:
+            A tuple (hyperparameters, model) of the fit arguments, including epochs,
+            and a copy of the fitted model of the best trial of the final rung.
+        """
+        assert self.done
+
+        best = min(self._active, key=self._get_rank_key)
+        hyperparameters = self._parameter_grid[best] | {"epochs": self._epochs[best]}
+
+        self._checkrep()
+        return hyperparameters, copy.deepcopy(self._models[best])
+
+
+def regularization_path_search(
+    model: WalsRecommender,
+    training_data: ReportTechniqueMatrix,
+    validation_data: ReportTechniqueMatrix,
+    grid: dict[str, Sequence],
+    prediction_method: PredictionMethod = PredictionMethod.DOT,
+    metric: str = "recall",
+    k: int = 20,
+    seed: int | None = None,
+    block_size: int = EVALUATION_BLOCK_SIZE,
+    fit_kwargs: dict | None = None,
+) -> pd.DataFrame:
+    """Scores every combination of hyperparameters, fitting one WALS path per lambda.
+
+    For each combination of the hyperparameters other than
+    regularization_coefficient, a single WalsRecommender.fit_regularization_path
+    produces a model for every regularization coefficient in the grid, so the
+    coefficients cost little more than one fit.  Each model shares the item factors
+    of the path's anchor fit, so its score approximates that of a full fit with its
+    coefficient.
+
+    Args:
+        model: the recommender to fit.
+        training_data: the data on which to fit each path.
+        validation_data: the data on which to score each trial.
+        grid: mapping of each hyperparameter of fit_regularization_path, and
+            regularization_coefficient, to the values over which to search.
+            Requires regularization_coefficient in grid.
+        prediction_method: the method to use for predictions.
+        metric: the column of tie.utils.TOP_K_METRICS by which to score trials.
+        k: the k at which to compute metric.  Requires 0 < k <= n.
+        seed: the seed of the trial seeds.  If None, it is drawn from the global
+            numpy random state.
+        block_size: the maximum number of rows predicted at a time when scoring.
+        fit_kwargs: arguments passed to every fit_regularization_path which are not
+            searched over, such as num_workers.  Requires no key in grid.
+
+    Returns:
+        A dataframe with one row per combination of hyperparameters, in the order of
+        get_parameter_grid, and with one column per hyperparameter followed by
+        seed, the seed of the global random state of the trial's path, score, the
+        validation metric, and fit_seconds, the time to fit the trial's path divided
+        among its coefficients.
+    """
+    assert "regularization_coefficient" in grid
+    assert training_data.shape == validation_data.shape
+    fit_kwargs = dict(fit_kwargs or {})
+    assert fit_kwargs.keys().isdisjoint(grid)
+
+    context = _TrialContext(
+        model=model,
+        training_data=training_data,
+        validation_data=validation_data,
+        prediction_method=prediction_method,
+        metric=metric,
+        k=k,
+        block_size=block_size,
+    )
+
+    parameter_grid = get_parameter_grid(grid)
+    seeds = _get_trial_seeds(len(parameter_grid), seed)
+    coefficients = list(grid["regularization_coefficient"])
+
+    # trials sharing every hyperparameter but the coefficient form one path
+    paths = {}
+    for trial, hyperparameters in enumerate(parameter_grid):
+        path_hyperparameters = tuple(
+            (name, value)
+            for name, value in hyperparameters.items()
+            if name != "regularization_coefficient"
+        )
+        paths.setdefault(path_hyperparameters, []).append(trial)
+
+    results = [None] * len(parameter_grid)
+    for path_hyperparameters, trials in paths.items():
+        # the path is seeded by its first trial
+        path_seed = seeds[trials[0]]
+        set_trial_seed(path_seed)
+        path_model = context.new_model()
+
+        start = time.perf_counter()
+        models = path_model.fit_regularization_path(
+            training_data.to_sparse_tensor(),
+            regularization_coefficients=coefficients,
+            **fit_kwargs,
+            **dict(path_hyperparameters),
+        )
+        fit_seconds = (time.perf_counter() - start) / len(trials)
+
+        for trial, path_model in zip(trials, models):
+            results[trial] = (path_seed, context.score(path_model), fit_seconds)
+
+    trials = pd.DataFrame(
+        [
+            hyperparameters | dict(zip(TRIAL_COLUMNS, result))
+            for hyperparameters, result in zip(parameter_grid, results)
+        ],
+        columns=[*grid.keys(), *TRIAL_COLUMNS],
+    )
+    trials.index.name = "trial"
+    return trials
@@ -0,0 +1,216 @@
+import numpy as np
+
+from tie.constants import PredictionMethod
+from tie.exceptions import TechniqueNotFoundException
+from tie.utils import get_top_k
+
+# number of rank-one updates after which the inverse is recomputed from scratch to
+# bound the accumulation of rounding error
+_REFRESH_INTERVAL = 64
+
+
+class ReportSession:
+    """An interactive session building up the techniques of a new report.
+
+    The session keeps the WALS fold-in system of the report and updates its inverse
+    by a Sherman-Morrison rank-one update whenever a technique is added or removed,
+    so each change costs O(k^2) and each prediction O(nk).  Sessions share the item
+    embeddings read-only, so many sessions may be used concurrently, but a single
+    session is not thread safe.
+    """
+
+    # Abstraction function:
+    #   AF(V, technique_ids, regularization_coefficient, prediction_method,
+    #       techniques, inverse, V_T_p, updates_since_refresh) = a new report
+    #       containing techniques, folded into a WALS model with item embeddings V
+    #       for the techniques technique_ids, whose factor x satisfies
+    #       (V^T V + lambda I + V_J^T V_J) x = V_J^T 1 for the rows J of techniques.
+    # Rep invariant:
+    #   - inverse is the inverse of V^T V + lambda I + V_J^T V_J, up to rounding
+    #   - V_T_p == sum of the rows of V of techniques, up to rounding
+    #   - 0 <= updates_since_refresh < _REFRESH_INTERVAL
+    # Safety from rep exposure:
+    #   - all fields are private
+    #   - V is copied on construction and never returned
+    #   - techniques is only returned as a frozenset
+
+    def __init__(
+        self,
+        V: np.ndarray,
+        technique_ids: np.ndarray,
+        regularization_coefficient: float,
+        prediction_method: PredictionMethod = PredictionMethod.DOT,
+        techniques: frozenset[str] = frozenset(),
+    ):
+        """Initializes a ReportSession object.
+
+        Args:
+            V: nxk array of the item embeddings of a trained WALS model.
+            technique_ids: Length-n array of the technique id of each item.
+            regularization_coefficient: Coefficient on the embedding regularization
+                term.  Requires regularization_coefficient >= 0.
+            prediction_method: The prediction method to use.
+            techniques: The techniques initially in the report.
+
+        Raises:
+            TechniqueNotFoundException: if a technique is not in technique_ids.
+        """
+        assert regularization_coefficient >= 0
+        assert V.shape[0] == len(technique_ids)
+
+        self._V = np.array(V, dtype=np.float64)
+        self._technique_ids = np.asarray(technique_ids)
+        self._technique_ids_to_indices = {
+            technique_id: i for i, technique_id in enumerate(self._technique_ids)
+        }
+        self._regularization_coefficient = regularization_coefficient
+        self._prediction_method = prediction_method
+
+        if prediction_method == PredictionMethod.COSINE:
+            norms = np.linalg.norm(self._V, axis=1, keepdims=True)
+            norms[norms == 0.0] = 1.0
+            self._scoring_V = self._V / norms
+        else:
+            self._scoring_V = self._V
+
+        self._techniques = set(techniques)
+        for technique in self._techniques:
+            self._get_index(technique)
+        self._refresh()
+
+    def _checkrep(self):
+        """Asserts the rep invariant."""
+        k = self._V.shape[1]
+        #   - inverse is the inverse of V^T V + lambda I + V_J^T V_J, up to rounding
+        assert self._inverse.shape == (k, k)
+        #   - V_T_p == sum of the rows of V of techniques, up to rounding
+        assert self._V_T_p.shape == (k,)
+        #   - 0 <= updates_since_refresh < _REFRESH_INTERVAL
+        assert 0 <= self._updates_since_refresh < _REFRESH_INTERVAL
+
+    def _get_index(self, technique: str) -> int:
+        """Gets the item index of technique.
+
+        Raises:
+            TechniqueNotFoundException: if the model was not trained on technique.
+        """
+        if technique not in self._technique_ids_to_indices:
+            raise TechniqueNotFoundException(
+                f"Model has not been trained on {technique}."
+            )
+        return self._technique_ids_to_indices[technique]
+
+    def _refresh(self):
+        """Recomputes the inverse and right hand side from scratch."""
+        k = self._V.shape[1]
+        indices = sorted(map(self._get_index, self._techniques))
+        V_J = self._V[indices]
+
+        self._inverse = np.linalg.inv(
+            self._V.T @ self._V
+            + self._regularization_coefficient * np.identity(k)
+            + V_J.T @ V_J
+        )
+        self._V_T_p = V_J.sum(axis=0)
+        self._updates_since_refresh = 0
+
+        self._checkrep()
+
+    def _update(self, technique: str, sign: int):
+        """Adds (sign 1) or removes (sign -1) technique from the fold-in system."""
+        v = self._V[self._get_index(technique)]
+
+        # Sherman-Morrison: (A + s vv^T)^{-1} = A^{-1} - s A^{-1}v v^TA^{-1}
+        #   / (1 + s v^TA^{-1}v)
+        inverse_v = self._inverse @ v
+        self._inverse -= (sign / (1 + sign * (v @ inverse_v))) * np.outer(
+            inverse_v, inverse_v
+        )
+        self._V_T_p += sign * v
+
+        self._updates_since_refresh += 1
+        if self._updates_since_refresh == _REFRESH_INTERVAL:
+            self._refresh()
+
+        self._checkrep()
+
+    @property
+    def techniques(self) -> frozenset[str]:
+        """Gets the techniques currently in the report."""
+        self._checkrep()
+        return frozenset(self._techniques)
+
+    def add(self, technique: str):
+        """Adds a technique to the report.
+
+        Args:
+            technique: MITRE ATT&CK id of the technique.  Adding a technique already
+                in the report does nothing.
+
+        Mutates:
+            The session to include technique.
+
+        Raises:
+            TechniqueNotFoundException: if the model was not trained on technique.
+        """
+        self._get_index(technique)
+        if technique not in self._techniques:
+            self._techniques.add(technique)
+            self._update(technique, 1)
+
+    def remove(self, technique: str):
+        """Removes a technique from the report.
+
+        Args:
+            technique: MITRE ATT&CK id of the technique.  Removing a technique not
+                in the report does nothing.
+
+        Mutates:
+            The session to exclude technique.
+        """
+        if technique in self._techniques:
+            self._techniques.remove(technique)
+            self._update(technique, -1)
+
+    def predict(self) -> np.ndarray:
+        """Gets the predicted value of every technique for the report.
+
+        Returns:
+            A length-n array of predicted values, indexed as technique_ids.
+        """
+        factor = self._inverse @ self._V_T_p
+
+        if self._prediction_method == PredictionMethod.COSINE:
+            norm = np.linalg.norm(factor)
+            if norm > 0:
+                factor = factor / norm
+
+        self._checkrep()
+        return self._scoring_V @ factor
+
+    def top_k(self, k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """Gets the top predicted techniques not already in the report.
+
+        Args:
+            k: Number of techniques to get.  Requires 0 < k.  Fewer are returned if
+                fewer than k techniques are not in the report.
+
+        Returns:
+            A tuple (technique_ids, predictions) of arrays such that technique_ids
+            are the top techniques in descending order of predicted value and
+            predictions are their predicted values.
+        """
+        assert k > 0
+
+        predictions = self.predict()
+        if self._techniques:
+            predictions[sorted(map(self._get_index, self._techniques))] = -np.inf
+
+        k = min(k, len(predictions) - len(self._techniques))
+        if k == 0:
+            return self._technique_ids[:0], predictions[:0]
+
+        top_indices, top_predictions = get_top_k(np.expand_dims(predictions, 0), k)
+
+        self._checkrep()
+        return self._technique_ids[top_indices[0]], top_predictions[0]
@@ -0,0 +1,339 @@
+import os
+import tempfile
+
+import numpy as np
+from mitreattack.stix20 import MitreAttackData
+
+from tie.cache import get_cache_directory, get_file_hash
+
+# bumped whenever the on-disk format changes so stale caches are rebuilt
+_FORMAT_VERSION = 1
+
+# in-process technique indexes keyed by STIX bundle content hash
+_technique_indexes: dict[str, "TechniqueIndex"] = {}
+
+
+class TechniqueIndex:
+    """An immutable index of the techniques in a MITRE ATT&CK STIX bundle."""
+
+    # Abstraction function:
+    # 	AF(technique_ids, names, tactics, tactic_membership, platforms,
+    #       platform_membership, revoked, deprecated) = an index of n techniques
+    #       where technique technique_ids[i] is named names[i], belongs to the
+    #       tactics tactics[j] for which tactic_membership[i, j] is True, runs on the
+    #       platforms platforms[j] for which platform_membership[i, j] is True, and is
+    #       revoked if revoked[i] and deprecated if deprecated[i].
+    # Rep invariant:
+    # - technique_ids is sorted and unique
+    # - len(names) == len(revoked) == len(deprecated) == len(technique_ids)
+    # - tactic_membership.shape == (len(technique_ids), len(tactics))
+    # - platform_membership.shape == (len(technique_ids), len(platforms))
+    # Safety from rep exposure:
+    # - all fields are private and never reassigned
+    # - arrays are only returned as copies or immutable python objects
+
+    def __init__(
+        self,
+        technique_ids: np.ndarray,
+        names: np.ndarray,
+        tactics: np.ndarray,
+        tactic_membership: np.ndarray,
+        platforms: np.ndarray,
+        platform_membership: np.ndarray,
+        revoked: np.ndarray,
+        deprecated: np.ndarray,
+    ):
+        """Initializes a TechniqueIndex object.
+
+        Args:
+            technique_ids: Sorted, unique MITRE ATT&CK ids of the n techniques.
+            names: Length-n array of technique names.
+            tactics: Array of the t tactic names in the bundle.
+            tactic_membership: nxt boolean array such that tactic_membership[i, j] is
+                True if technique i belongs to tactic j.
+            platforms: Array of the p platform names in the bundle.
+            platform_membership: nxp boolean array such that platform_membership[i, j]
+                is True if technique i runs on platform j.
+            revoked: Length-n boolean array of whether each technique is revoked.
+            deprecated: Length-n boolean array of whether each technique is
+                deprecated.
+        """
+        self._technique_ids = np.asarray(technique_ids, dtype=np.str_)
+        self._names = np.asarray(names, dtype=np.str_)
+        self._tactics = np.asarray(tactics, dtype=np.str_)
+        self._tactic_membership = np.asarray(tactic_membership, dtype=np.bool_)
+        self._platforms = np.asarray(platforms, dtype=np.str_)
+        self._platform_membership = np.asarray(platform_membership, dtype=np.bool_)
+        self._revoked = np.asarray(revoked, dtype=np.bool_)
+        self._deprecated = np.asarray(deprecated, dtype=np.bool_)
+
+        self._ids_to_positions = {
+            technique_id: i for i, technique_id in enumerate(self._technique_ids)
+        }
+
+        self._checkrep()
+
+    def _checkrep(self):
+        """Asserts the rep invariant."""
+        n = len(self._technique_ids)
+        # - technique_ids is sorted and unique
+        assert (self._technique_ids[1:] > self._technique_ids[:-1]).all()
+        # - len(names) == len(revoked) == len(deprecated) == len(technique_ids)
+        assert len(self._names) == len(self._revoked) == len(self._deprecated) == n
+        # - tactic_membership.shape == (len(technique_ids), len(tactics))
+        assert self._tactic_membership.shape == (n, len(self._tactics))
+        # - platform_membership.shape == (len(technique_ids), len(platforms))
+        assert self._platform_membership.shape == (n, len(self._platforms))
+
+    @classmethod
+    def from_stix(cls, stix_filepath: str):  # -> TechniqueIndex:
+        """Builds a TechniqueIndex by parsing a STIX bundle.
+
+        Args:
+            stix_filepath: Location of the Enterprise ATT&CK STIX bundle.
+
+        Returns:
+            A new TechniqueIndex containing every technique in the bundle, including
+            revoked and deprecated techniques.
+        """
+        mitre_attack_data = MitreAttackData(stix_filepath)
+        techniques = mitre_attack_data.get_techniques(remove_revoked_deprecated=False)
+
+        records = []
+        for technique in techniques:
+            external_references = technique.get("external_references")
+            mitre_references = tuple(
+                filter(
+                    lambda external_reference: external_reference.get("source_name")
+                    == "mitre-attack",
+                    external_references,
+                )
+            )
+            assert len(mitre_references) == 1
+            records.append(
+                (
+                    mitre_references[0]["external_id"],
+                    technique.get("name"),
+                    frozenset(
+                        phase["phase_name"]
+                        for phase in technique.get("kill_chain_phases", ())
+                        if phase["kill_chain_name"] == "mitre-attack"
+                    ),
+                    frozenset(technique.get("x_mitre_platforms", ())),
+                    technique.get("revoked", False),
+                    technique.get("x_mitre_deprecated", False),
+                )
+            )
+
+        # a revoked technique may share its id with its replacement, in which case
+        # keep the active one
+        records.sort(key=lambda record: (record[0], record[4] or record[5]))
+        unique_records = {}
+        for record in records:
+            unique_records.setdefault(record[0], record)
+        records = tuple(unique_records.values())
+
+        tactics = sorted(set().union(*(record[2] for record in records)))
+        platforms = sorted(set().union(*(record[3] for record in records)))
+
+        return cls(
+            technique_ids=[record[0] for record in records],
+            names=[record[1] for record in records],
+            tactics=tactics,
+            tactic_membership=np.array(
+                [[tactic in record[2] for tactic in tactics] for record in records],
+                dtype=np.bool_,
+            ).reshape(len(records), len(tactics)),
+            platforms=platforms,
+            platform_membership=np.array(
+                [
+                    [platform in record[3] for platform in platforms]
+                    for record in records
+                ],
+                dtype=np.bool_,
+            ).reshape(len(records), len(platforms)),
+            revoked=[record[4] for record in records],
+            deprecated=[record[5] for record in records],
+        )
+
+    @classmethod
+    def load(cls, filepath: str):  # -> TechniqueIndex:
+        """Loads a TechniqueIndex saved by save.
+
+        Args:
+            filepath: Location of the saved index.
+
+        Returns:
+            The loaded TechniqueIndex.
+
+        Raises:
+            ValueError: if the file was saved in an incompatible format.
+        """
+        with np.load(filepath, allow_pickle=False) as saved:
+            if int(saved["format_version"]) != _FORMAT_VERSION:
+                raise ValueError(f"Incompatible technique index format in {filepath}.")
+
+            return cls(
+                technique_ids=saved["technique_ids"],
+                names=saved["names"],
+                tactics=saved["tactics"],
+                tactic_membership=saved["tactic_membership"],
+                platforms=saved["platforms"],
+                platform_membership=saved["platform_membership"],
+                revoked=saved["revoked"],
+                deprecated=saved["deprecated"],
+            )
+
+    def save(self, filepath: str):
+        """Saves the index to filepath.
+
+        The file is written atomically, so concurrent readers never observe a
+        partially written index.
+
+        Args:
+            filepath: Location at which to save the index.
+
+        Mutates:
+            Writes the index to filepath.
+        """
+        directory = os.path.dirname(os.path.abspath(filepath))
+        os.makedirs(directory, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+            temporary_filepath = f.name
+            try:
+                np.savez(
+                    f,
+                    format_version=np.array(_FORMAT_VERSION),
+                    technique_ids=self._technique_ids,
+                    names=self._names,
+                    tactics=self._tactics,
+                    tactic_membership=self._tactic_membership,
+                    platforms=self._platforms,
+                    platform_membership=self._platform_membership,
+                    revoked=self._revoked,
+                    deprecated=self._deprecated,
+                )
+            except BaseException:
+                os.remove(temporary_filepath)
+                raise
+        os.replace(temporary_filepath, filepath)
+
+        self._checkrep()
+
+    @property
+    def technique_ids(self) -> tuple[str]:
+        """Gets the MITRE ATT&CK ids of all techniques, in sorted order."""
+        self._checkrep()
+        return tuple(self._technique_ids.tolist())
+
+    def get_technique_ids_to_names(
+        self, include_revoked_deprecated: bool = False
+    ) -> dict[str, str]:
+        """Gets technique ids mapped to their names.
+
+        Args:
+            include_revoked_deprecated: Whether to include revoked and deprecated
+                techniques.
+
+        Returns:
+            A mapping from MITRE ATT&CK technique id to technique name.
+        """
+        include = np.ones(len(self._technique_ids), dtype=np.bool_)
+        if not include_revoked_deprecated:
+            include = ~(self._revoked | self._deprecated)
+
+        self._checkrep()
+        return dict(
+            zip(
+                self._technique_ids[include].tolist(),
+                self._names[include].tolist(),
+            )
+        )
+
+    def get_tactics(self, technique_id: str) -> frozenset[str]:
+        """Gets the tactics to which a technique belongs.
+
+        Args:
+            technique_id: MITRE ATT&CK id of the technique.  Must be in the index.
+
+        Returns:
+            The names of the tactics of the technique.
+        """
+        position = self._ids_to_positions[technique_id]
+
+        self._checkrep()
+        return frozenset(self._tactics[self._tactic_membership[position]].tolist())
+
+    def get_platforms(self, technique_id: str) -> frozenset[str]:
+        """Gets the platforms on which a technique runs.
+
+        Args:
+            technique_id: MITRE ATT&CK id of the technique.  Must be in the index.
+
+        Returns:
+            The names of the platforms of the technique.
+        """
+        position = self._ids_to_positions[technique_id]
+
+        self._checkrep()
+        return frozenset(self._platforms[self._platform_membership[position]].tolist())
+
+    def is_revoked_or_deprecated(self, technique_id: str) -> bool:
+        """Gets whether a technique is revoked or deprecated.
+
+        Args:
+            technique_id: MITRE ATT&CK id of the technique.  Must be in the index.
+
+        Returns:
+            True if the technique is revoked or deprecated, False otherwise.
+        """
+        position = self._ids_to_positions[technique_id]
+
+        self._checkrep()
+        return bool(self._revoked[position] or self._deprecated[position])
+
+
+def get_technique_index(
+    stix_filepath: str, cache_dir: str | None = None
+) -> TechniqueIndex:
+    """Gets the technique index for a STIX bundle, using caches where possible.
+
+    The index is looked up by the content hash of the bundle, first in process, then
+    in the on-disk cache, and is only built by parsing the bundle if neither has it.
+    A newly built index is written to the on-disk cache if the cache is writable.
+
+    Args:
+        stix_filepath: Location of the Enterprise ATT&CK STIX bundle.
+        cache_dir: Directory of the on-disk cache.  See
+            tie.cache.get_cache_directory for the default.
+
+    Returns:
+        The technique index for the bundle.
+    """
+    bundle_hash = get_file_hash(stix_filepath)
+
+    if bundle_hash not in _technique_indexes:
+        cache_filepath = os.path.join(
+            get_cache_directory(cache_dir), f"technique-index-{bundle_hash}.npz"
+        )
+
+        technique_index = None
+        if os.path.exists(cache_filepath):
+            try:
+                technique_index = TechniqueIndex.load(cache_filepath)
+            except (OSError, ValueError):
+                # corrupt or stale cache entry, so rebuild it
+                technique_index = None
+
+        if technique_index is None:
+            technique_index = TechniqueIndex.from_stix(stix_filepath)
+            try:
+                technique_index.save(cache_filepath)
+            except OSError:
+                # caching is best effort
+                pass
+
+        _technique_indexes[bundle_hash] = technique_index
+
+    return _technique_indexes[bundle_hash]
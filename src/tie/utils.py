@@ -1,63 +1,281 @@
-import math
+from collections.abc import Callable
 
 import numpy as np
 import pandas as pd
-from mitreattack.stix20 import MitreAttackData
+import tensorflow as tf
+from scipy import sparse
 
 from tie.constants import PredictionMethod
+from tie.technique_index import get_technique_index
 
 
 def get_mitre_technique_ids_to_names(stix_filepath: str) -> dict[str, str]:
-    """Gets all MITRE technique ids mapped to their description."""
-    mitre_attack_data = MitreAttackData(stix_filepath)
-    techniques = mitre_attack_data.get_techniques(remove_revoked_deprecated=True)
-
-    all_technique_ids = {}
-
-    for technique in techniques:
-        external_references = technique.get("external_references")
-        mitre_references = tuple(
-            filter(
-                lambda external_reference: external_reference.get("source_name")
-                == "mitre-attack",
-                external_references,
+    """Gets all MITRE technique ids mapped to their description.
+
+    Revoked and deprecated techniques are excluded.  The STIX bundle is only parsed
+    the first time it is seen; see tie.technique_index.get_technique_index.
+    """
+    return get_technique_index(stix_filepath).get_technique_ids_to_names()
+
+
+# names of the metrics computed by evaluate_top_k, in column order
+TOP_K_METRICS = ("precision", "recall", "ndcg", "hit_rate", "mrr")
+
+# default number of rows predicted at a time by evaluate_top_k_in_blocks
+EVALUATION_BLOCK_SIZE = 4096
+
+
+def _get_sorted_top_columns(
+    scores: np.ndarray, window_size: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Gets the window_size top columns of each row in ranked order.
+
+    Columns are ranked by descending score, with ties ranked in increasing column
+    order.
+
+    Args:
+        scores: An rxn array of scores.
+        window_size: Number of columns to get.  Requires 0 < window_size <= n.
+
+    Returns:
+        A tuple (columns, column_scores) of rxwindow_size arrays such that
+        columns[i, p] is the column of rank p of row i and column_scores[i, p] its
+        score.
+    """
+    r, n = scores.shape
+
+    if window_size < n:
+        columns = np.argpartition(-scores, window_size - 1, axis=1)[:, :window_size]
+    else:
+        columns = np.broadcast_to(np.arange(n), (r, n))
+    columns = np.sort(columns, axis=1)
+    column_scores = np.take_along_axis(scores, columns, axis=1)
+
+    # stable sort keeps tied columns in increasing column order
+    order = np.argsort(-column_scores, axis=1, kind="stable")
+    columns = np.take_along_axis(columns, order, axis=1)
+    column_scores = np.take_along_axis(column_scores, order, axis=1)
+
+    if window_size < n:
+        # a tie at the end of the window may have left out a lower column with the
+        # same score, so rank those rows in full
+        num_at_least_last = np.sum(scores >= column_scores[:, -1:], axis=1)
+        ambiguous_rows = np.flatnonzero(num_at_least_last > window_size)
+        if len(ambiguous_rows) > 0:
+            full_order = np.argsort(-scores[ambiguous_rows], axis=1, kind="stable")
+            columns[ambiguous_rows] = full_order[:, :window_size]
+            column_scores[ambiguous_rows] = np.take_along_axis(
+                scores[ambiguous_rows], columns[ambiguous_rows], axis=1
+            )
+
+    return columns, column_scores
+
+
+def _accumulate_top_k_metrics(
+    scores: np.ndarray,
+    test_data: sparse.csr_matrix,
+    ks: tuple[int],
+    sums: np.ndarray,
+):
+    """Adds the top k metric sums of a block of rows to sums.
+
+    Args:
+        scores: An rxn array of scores, with excluded entries set to -inf.
+        test_data: An rxn sparse matrix whose positive entries are the test items.
+        ks: Sorted values of k.  Requires 0 < ks[-1] <= n.
+        sums: A len(ks) x 8 array of running sums of, in order, precision, recall,
+            DCG, IDCG, hit rate, reciprocal rank, number of rows, and number of rows
+            with test items.
+
+    Mutates:
+        sums to include the metrics of every row of the block.
+    """
+    r, n = scores.shape
+    max_k = ks[-1]
+
+    window_size = min(max_k + 1, n)
+    columns, column_scores = _get_sorted_top_columns(scores, window_size)
+
+    # relevance of each ranked column, looked up in the sorted test keys
+    test_data = sparse.csr_matrix(test_data > 0)
+    test_data.sort_indices()
+    test_keys = (
+        np.repeat(np.arange(r, dtype=np.int64), np.diff(test_data.indptr)) * n
+        + test_data.indices
+    )
+    keys = np.arange(r, dtype=np.int64)[:, np.newaxis] * n + columns
+    positions = np.minimum(np.searchsorted(test_keys, keys), max(len(test_keys) - 1, 0))
+    relevant = (
+        test_keys[positions] == keys
+        if len(test_keys) > 0
+        else np.zeros(keys.shape, dtype=np.bool_)
+    )
+
+    num_test_items = np.diff(test_data.indptr)
+    has_test_items = num_test_items > 0
+
+    discounts = 1 / np.log2(np.arange(2, window_size + 2))
+    cumulative_gain = np.cumsum(relevant * discounts, axis=1)
+    cumulative_ideal_gain = np.cumsum(discounts)
+
+    # rank of the first relevant column, or window_size if there is none
+    first_relevant = np.where(
+        relevant.any(axis=1), np.argmax(relevant, axis=1), window_size
+    )
+
+    for i, k in enumerate(ks):
+        # an item is in the top k if fewer than k + 1 items score at least as much
+        # as it, so items tied with the item ranked k + 1 are not
+        if k < n:
+            boundary = column_scores[:, k : k + 1]
+        else:
+            boundary = np.full((r, 1), -np.inf)
+        hits = np.sum(relevant[:, :k] & (column_scores[:, :k] > boundary), axis=1)
+
+        sums[i, 0] += np.sum(hits) / k
+        sums[i, 1] += np.sum(hits[has_test_items] / num_test_items[has_test_items])
+        sums[i, 2] += np.sum(cumulative_gain[:, k - 1])
+        sums[i, 3] += np.sum(
+            cumulative_ideal_gain[np.minimum(num_test_items[has_test_items], k) - 1]
+        )
+        sums[i, 4] += np.sum(first_relevant < k)
+        sums[i, 5] += np.sum(1 / (first_relevant[first_relevant < k] + 1))
+        sums[i, 6] += r
+        sums[i, 7] += np.sum(has_test_items)
+
+
+def _summarize_top_k_metrics(ks: tuple[int], sums: np.ndarray) -> pd.DataFrame:
+    """Converts the running sums of _accumulate_top_k_metrics to metrics.
+
+    Args:
+        ks: Sorted values of k.
+        sums: The running sums, as described in _accumulate_top_k_metrics.
+
+    Returns:
+        A dataframe indexed by k with one column per metric in TOP_K_METRICS.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = np.column_stack(
+            (
+                sums[:, 0] / sums[:, 6],
+                sums[:, 1] / sums[:, 7],
+                sums[:, 2] / sums[:, 3],
+                sums[:, 4] / sums[:, 7],
+                sums[:, 5] / sums[:, 7],
             )
         )
-        assert len(mitre_references) == 1
-        mitre_technique_id = mitre_references[0]["external_id"]
-        all_technique_ids[mitre_technique_id] = technique.get("name")
 
-    return all_technique_ids
+    return pd.DataFrame(metrics, index=pd.Index(ks, name="k"), columns=TOP_K_METRICS)
+
 
+def evaluate_top_k_in_blocks(
+    predict_rows: Callable[[np.ndarray], np.ndarray],
+    test_data: sparse.spmatrix,
+    ks: tuple[int],
+    excluded: sparse.spmatrix | None = None,
+    block_size: int = EVALUATION_BLOCK_SIZE,
+) -> pd.DataFrame:
+    """Computes top k ranking metrics, predicting a block of rows at a time.
 
-def _get_num_test_items_in_top_k_per_user(
-    predictions: pd.DataFrame, test_data: pd.DataFrame, k: int
-) -> pd.Series:
-    """Calculates the number of test items in the top k predictions for each user.
+    Only rows with test items are predicted, block_size rows at a time, and their
+    metrics are added to running sums, so peak memory is bounded by the block size
+    rather than the size of the prediction matrix.  The metrics are those of
+    evaluate_top_k.
 
     Args:
-        predictions: an mxn matrix of predictions where m is the number of entities
-            and n is the number of items.  Requires m > 0 and n > 0.
-        test_data: an mxn matrix of test data where each entry is 1 if observed in the
-            test set, 0 otherwise.
-        k: the number of predictions to include in the top k.  Requires 0 < k <= n.
+        predict_rows: A function taking an array of row indices to the predictions
+            of those rows, an array with one row per index and n columns.
+        test_data: an mxn sparse matrix whose positive entries are the test items.
+            Requires m > 0 and n > 0.
+        ks: values of k at which to compute the metrics.  Requires 0 < k <= n for
+            each k.
+        excluded: an mxn sparse matrix whose stored entries are removed from the
+            ranking, such as training items.
+        block_size: maximum number of rows predicted at a time.  Requires
+            block_size > 0.
 
     Returns:
-        Array r such that r[i] is the number of items in test_data[i, :] which are in
-        the top k ranked predictions of predictions[i, :].
+        A dataframe indexed by k with one column per metric in TOP_K_METRICS.  A
+        metric is np.nan if it averages over no rows.
     """
     m, n = test_data.shape
-    # get a matrix with a 1 in the top 10 spots
-    # find overlap with test set
-    # if 1 in both, then predicted in top k
-    # min to get lowest rank in group, aka less than k
-    top_k_predictions = predictions.rank(axis=1, method="max", ascending=False) <= k
-    assert m, 1 == top_k_predictions.shape
-    test_items_in_top_k = (test_data > 0) & top_k_predictions
-    num_test_items_in_top_k = test_items_in_top_k.sum(axis=1)
-    assert m, 1 == num_test_items_in_top_k.shape
+    assert m > 0
+    assert n > 0
+    assert block_size > 0
+    ks = tuple(sorted(set(ks)))
+    assert 0 < ks[0] and ks[-1] <= n
+
+    test_data = sparse.csr_matrix(test_data > 0)
+    if excluded is not None:
+        assert excluded.shape == (m, n)
+        excluded = sparse.csr_matrix(excluded)
+
+    sums = np.zeros((len(ks), 8))
+
+    # rows without test items only contribute 0 to the precision sum
+    rows = np.flatnonzero(np.diff(test_data.indptr) > 0)
+    sums[:, 6] += m - len(rows)
+
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start : start + block_size]
+
+        scores = np.array(predict_rows(block_rows), dtype=np.float64)
+        assert scores.shape == (len(block_rows), n)
+        if excluded is not None:
+            block_excluded = sparse.coo_matrix(excluded[block_rows])
+            scores[block_excluded.row, block_excluded.col] = -np.inf
+
+        _accumulate_top_k_metrics(scores, test_data[block_rows], ks, sums)
+
+    return _summarize_top_k_metrics(ks, sums)
+
+
+def evaluate_top_k(
+    predictions: np.ndarray,
+    test_data: sparse.spmatrix,
+    ks: tuple[int],
+    excluded: sparse.spmatrix | None = None,
+) -> pd.DataFrame:
+    r"""Computes top k ranking metrics for several k in a single pass.
+
+    One partial sort of the top max(ks) + 1 predictions of each row gives, for every
+    k, the following metrics:
+    - precision: the average over all rows of the number of test items in the top k
+        divided by k, where items tied with the (k+1)th prediction are not in the
+        top k.
+    - recall: the average over rows with test items of the number of test items in
+        the top k, as for precision, divided by the number of test items of the row.
+    - ndcg: \sum_u DCG_u@k / \sum_u IDCG_u@k, where ties are ranked in column order.
+    - hit_rate: the fraction of rows with test items with a test item in the top k.
+    - mrr: the average over rows with test items of the reciprocal rank of the first
+        test item in the top k, or 0 if there is none.
+
+    Args:
+        predictions: an mxn array of predictions.  Requires m > 0 and n > 0.
+        test_data: an mxn sparse matrix whose positive entries are the test items.
+        ks: values of k at which to compute the metrics.  Requires 0 < k <= n for
+            each k.
+        excluded: an mxn sparse matrix whose stored entries are removed from the
+            ranking, such as training items.
+
+    Returns:
+        A dataframe indexed by k with one column per metric in TOP_K_METRICS.  A
+        metric is np.nan if it averages over no rows.
+    """
+    assert predictions.shape == test_data.shape
+
+    return evaluate_top_k_in_blocks(
+        lambda rows: predictions[rows],
+        test_data,
+        ks,
+        excluded=excluded,
+        block_size=max(1, predictions.shape[0]),
+    )
 
-    return num_test_items_in_top_k
+
+def _to_sparse(data: pd.DataFrame) -> sparse.csr_matrix:
+    """Converts a dataframe of test data to a sparse matrix of its positive entries."""
+    return sparse.csr_matrix(data.to_numpy() > 0)
 
 
 def precision_at_k(predictions: pd.DataFrame, test_data: pd.DataFrame, k: int) -> float:
@@ -78,21 +296,10 @@ def precision_at_k(predictions: pd.DataFrame, test_data: pd.DataFrame, k: int) -
         k: the number of predictions to include in the top k.  Requires 0 < k <= n.
 
     Returns:
-        The computed precision for the top k predictions, or np.nan if the test set is
-        empty.
+        The computed precision for the top k predictions.
     """
-    m, n = test_data.shape
-    assert m > 0
-    assert n > 0
-    assert m, n == predictions.shape
-    assert 0 < k <= n
-
-    num_test_items_in_top_k = _get_num_test_items_in_top_k_per_user(
-        predictions, test_data, k
-    )
-
-    # sum number of predictions in top k, divide by k
-    return num_test_items_in_top_k.mean(skipna=True) / k
+    metrics = evaluate_top_k(predictions.to_numpy(), _to_sparse(test_data), (k,))
+    return metrics.loc[k, "precision"]
 
 
 def recall_at_k(predictions: pd.DataFrame, test_data: pd.DataFrame, k: int) -> float:
@@ -117,20 +324,8 @@ def recall_at_k(predictions: pd.DataFrame, test_data: pd.DataFrame, k: int) -> f
         The computed recall for the top k predictions, or np.,nan if the test set is
         empty.
     """
-    m, n = test_data.shape
-    assert m > 0
-    assert n > 0
-    assert m, n == predictions.shape
-    assert 0 < k <= n
-
-    num_test_items_in_top_k = _get_num_test_items_in_top_k_per_user(
-        predictions, test_data, k
-    )
-    num_test_items_per_user = test_data.sum(axis=1)
-
-    fraction_recalled_predictions = num_test_items_in_top_k / num_test_items_per_user
-    # sum number of predictions in top k, divide by k
-    return fraction_recalled_predictions.mean(skipna=True)
+    metrics = evaluate_top_k(predictions.to_numpy(), _to_sparse(test_data), (k,))
+    return metrics.loc[k, "recall"]
 
 
 def normalized_discounted_cumulative_gain(
@@ -160,50 +355,14 @@ def normalized_discounted_cumulative_gain(
     Returns:
         NDCG computed on the top k predictions, or np.nan if the test set is empty.
     """
-    # assert preconditions
-    m, n = test_data.shape
-    assert m > 0
-    assert n > 0
-    assert m, n == predictions.shape
-    assert 0 < k <= n
-
-    # calculate idcg
-    test_set_size = test_data.sum(axis=1).astype("int")
-    assert m, 1 == test_set_size.shape
-
-    def max_idcg(test_size, k) -> float:
-        return sum(1 / math.log2(i + 1) for i in range(1, min(test_size, k) + 1))
-
-    user_idcg = test_set_size.apply(lambda x: max_idcg(x, k))
-
-    idcg = np.mean(np.where(lambda x: x > 0, user_idcg, np.nan))
-
-    prediction_ranking = predictions.rank(axis=1, method="first", ascending=False)
-    assert m, 1 == prediction_ranking.shape
-
-    # calculating dcg
-    # numerator: 1 if test set is in prediction, 0 otherwise
-    numerator = np.logical_and(
-        (prediction_ranking <= k).to_numpy(), test_data.to_numpy()
-    )
-    # denominator: log_2 of ranking + 1
-    denominator = np.log2(prediction_ranking.to_numpy() + 1)
-
-    dcg = np.divide(numerator, denominator)
-    # in test set or rank should never be nan
-    assert not np.any(np.isnan(dcg))
+    metrics = evaluate_top_k(predictions.to_numpy(), _to_sparse(test_data), (k,))
+    return metrics.loc[k, "ndcg"]
 
-    entity_dcg = np.sum(dcg, axis=1)
-    # only count for test
-    dcg = np.mean(np.where(lambda x: x > 0, entity_dcg, np.nan))
 
-    return dcg / idcg
-
-
-def calculate_predicted_matrix(
-    U: np.ndarray, V: np.ndarray, method: PredictionMethod = PredictionMethod.DOT
-) -> np.ndarray:
-    """Calculates the prediction matrix UV^T according to the dot or cosine product.
+def scale_embeddings(
+    U: np.ndarray, V: np.ndarray, method: PredictionMethod
+) -> tuple[np.ndarray, np.ndarray]:
+    """Scales the embeddings so that their dot product is the prediction by method.
 
     Args:
         U: mxk array of entity embeddings
@@ -211,7 +370,7 @@ def calculate_predicted_matrix(
         method: Matrix product method to use.
 
     Returns:
-        The matrix product UV^T, according to method.
+        A tuple (U_scaled, V_scaled) of the scaled embeddings.
     """
     if method == PredictionMethod.DOT:
         U_scaled = U
@@ -234,4 +393,131 @@ def calculate_predicted_matrix(
         U_scaled = np.divide(U, U_norm)
         V_scaled = np.divide(V, V_norm)
 
+    return U_scaled, V_scaled
+
+
+def calculate_predicted_matrix(
+    U: np.ndarray, V: np.ndarray, method: PredictionMethod = PredictionMethod.DOT
+) -> np.ndarray:
+    """Calculates the prediction matrix UV^T according to the dot or cosine product.
+
+    Args:
+        U: mxk array of entity embeddings
+        V: nxk array of item embeddings
+        method: Matrix product method to use.
+
+    Returns:
+        The matrix product UV^T, according to method.
+    """
+    U_scaled, V_scaled = scale_embeddings(U, V, method)
+
     return U_scaled @ V_scaled.T
+
+
+def calculate_predicted_values(
+    U: np.ndarray,
+    V: np.ndarray,
+    row_indices: np.ndarray,
+    column_indices: np.ndarray,
+    method: PredictionMethod = PredictionMethod.DOT,
+) -> np.ndarray:
+    """Calculates selected entries of the prediction matrix UV^T.
+
+    Only the requested entries are computed, so the full prediction matrix is never
+    formed.
+
+    Args:
+        U: mxk array of entity embeddings
+        V: nxk array of item embeddings
+        row_indices: length-p array of the rows of the entries to calculate.
+        column_indices: length-p array of the columns of the entries to calculate.
+        method: Matrix product method to use.
+
+    Returns:
+        A length-p array whose ith entry is entry (row_indices[i], column_indices[i])
+        of the matrix product UV^T, according to method.
+    """
+    assert len(row_indices) == len(column_indices)
+
+    U_scaled, V_scaled = scale_embeddings(U, V, method)
+
+    return np.einsum(
+        "ij,ij->i", U_scaled[row_indices], V_scaled[column_indices], optimize=False
+    )
+
+
+def sparse_tensor_to_csr(data: tf.SparseTensor) -> sparse.csr_matrix:
+    """Converts a sparse tensor to a scipy CSR matrix without densifying it.
+
+    Args:
+        data: An mxn or length-n sparse tensor.  A length-n tensor is treated as a
+            1xn matrix.
+
+    Returns:
+        A CSR matrix with the same entries as data.
+    """
+    indices = data.indices.numpy()
+    values = data.values.numpy()
+    shape = tuple(data.dense_shape.numpy().tolist())
+
+    if len(shape) == 1:
+        row_indices = np.zeros(len(indices), dtype=np.int64)
+        column_indices = indices[:, 0]
+        shape = (1,) + shape
+    else:
+        assert len(shape) == 2
+        row_indices = indices[:, 0]
+        column_indices = indices[:, 1]
+
+    return sparse.csr_matrix((values, (row_indices, column_indices)), shape=shape)
+
+
+def get_top_k(
+    scores: np.ndarray,
+    k: int,
+    excluded: sparse.spmatrix | None = None,
+    allowed: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Gets the k highest scoring columns of each row.
+
+    Only the top k columns of each row are sorted, so this costs O(n + k log k) per
+    row rather than O(n log n).
+
+    Args:
+        scores: A bxn array of scores.
+        k: Number of columns to get.  Requires 0 < k <= n.
+        excluded: A bxn sparse matrix whose stored entries are excluded from their
+            row's top k, such as items an entity already has.
+        allowed: A length-n boolean array such that only columns j with allowed[j]
+            may be in the top k.
+
+    Returns:
+        A tuple (indices, values) of bxk arrays such that indices[i] are the columns
+        of the k highest scores of row i in descending order of score, and values[i]
+        are those scores.  Excluded and disallowed columns score -inf, so they only
+        appear if fewer than k columns of a row remain.
+    """
+    b, n = scores.shape
+    assert 0 < k <= n
+
+    if excluded is not None or allowed is not None:
+        scores = np.array(scores, dtype=np.float64)
+    if excluded is not None:
+        assert excluded.shape == (b, n)
+        excluded = sparse.coo_matrix(excluded)
+        scores[excluded.row, excluded.col] = -np.inf
+    if allowed is not None:
+        assert allowed.shape == (n,)
+        scores[:, ~allowed] = -np.inf
+
+    if k < n:
+        top_indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top_indices = np.broadcast_to(np.arange(n), (b, n))
+    top_values = np.take_along_axis(scores, top_indices, axis=1)
+
+    order = np.argsort(-top_values, axis=1, kind="stable")
+    return (
+        np.take_along_axis(top_indices, order, axis=1),
+        np.take_along_axis(top_values, order, axis=1),
+    )
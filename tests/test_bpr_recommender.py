@@ -0,0 +1,216 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+from scipy import sparse
+from tie.constants import PredictionMethod
+from tie.recommender import BPRRecommender
+from tie.recommender.bpr_recommender import _bpr_step, _scatter_add, _TripleSampler
+
+
+class TestBprStep(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _bpr_step:
+    #   batch: distinct embeddings, repeated embeddings
+    #   update_items: True, False
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.U = rng.normal(size=(4, 3))
+        self.V = rng.normal(size=(5, 3))
+
+    # Covers:
+    #   batch: distinct embeddings
+    #   update_items: True
+    def test_batch_matches_single_steps(self):
+        """A batch of disjoint triples equals taking each step on its own."""
+        u = np.array([0, 1])
+        i = np.array([0, 1])
+        j = np.array([2, 3])
+
+        U_batch, V_batch = self.U.copy(), self.V.copy()
+        _bpr_step(U_batch, V_batch, u, i, j, 0.1, 0.01)
+
+        U_single, V_single = self.U.copy(), self.V.copy()
+        for p in range(len(u)):
+            _bpr_step(
+                U_single, V_single, u[p : p + 1], i[p : p + 1], j[p : p + 1], 0.1, 0.01
+            )
+
+        np.testing.assert_allclose(U_batch, U_single)
+        np.testing.assert_allclose(V_batch, V_single)
+
+    # Covers:
+    #   batch: repeated embeddings
+    #   update_items: False
+    def test_repeated_entity_accumulates(self):
+        """Repeated entities receive the sum of their updates and V is unchanged."""
+        V = self.V.copy()
+        U_once = self.U.copy()
+        _bpr_step(
+            U_once,
+            V,
+            np.array([0]),
+            np.array([1]),
+            np.array([2]),
+            0.1,
+            0.0,
+            update_items=False,
+        )
+
+        U_twice = self.U.copy()
+        _bpr_step(
+            U_twice,
+            V,
+            np.array([0, 0]),
+            np.array([1, 1]),
+            np.array([2, 2]),
+            0.1,
+            0.0,
+            update_items=False,
+        )
+
+        np.testing.assert_allclose(U_twice - self.U, 2 * (U_once - self.U))
+        np.testing.assert_array_equal(V, self.V)
+
+
+class TestScatterAdd(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _scatter_add:
+    #   batch relative to target: small (np.add.at), large (bincount)
+    #   indices: distinct, repeated
+
+    # Covers:
+    #   batch relative to target: small, large
+    #   indices: distinct, repeated
+    def test_matches_add_at(self):
+        """Both strategies sum repeated indices like np.add.at."""
+        rng = np.random.default_rng(0)
+        for num_rows in (3, 1000):
+            target = rng.normal(size=(num_rows, 3))
+            indices = np.array([2, 0, 2, 1, 2])
+            updates = rng.normal(size=(5, 3))
+
+            expected = target.copy()
+            np.add.at(expected, indices, updates)
+            _scatter_add(target, indices, updates)
+
+            np.testing.assert_allclose(target, expected)
+
+
+class TestTripleSampler(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _TripleSampler:
+    #   row: empty, partially observed, fully observed
+    #   batches: one, several with a partial last batch
+
+    def setUp(self):
+        self.data = sparse.csr_matrix(
+            np.array(
+                [
+                    [1, 0, 0, 0],
+                    [0, 0, 0, 0],
+                    [1, 1, 1, 1],
+                    [0, 1, 1, 0],
+                ]
+            )
+        )
+        self.sampler = _TripleSampler(self.data)
+
+    # Covers:
+    #   row: empty, partially observed, fully observed
+    def test_sample_is_uniform_over_triples(self):
+        """Triples are valid and entities are drawn in proportion to their triples."""
+        rng = np.random.default_rng(0)
+
+        u, i, j = self.sampler.sample(30000, rng)
+
+        dense = self.data.toarray()
+        self.assertTrue((dense[u, i] == 1).all())
+        self.assertTrue((dense[u, j] == 0).all())
+
+        # row 0 is in 1 * 3 triples and row 3 in 2 * 2 triples
+        frequencies = np.bincount(u, minlength=4) / len(u)
+        np.testing.assert_allclose(frequencies, [3 / 7, 0, 0, 4 / 7], atol=0.02)
+
+    # Covers:
+    #   batches: one, several with a partial last batch
+    def test_iter_batches(self):
+        """Batches cover exactly the requested number of samples."""
+        rng = np.random.default_rng(0)
+
+        for num_samples, batch_size in ((5, 10), (25, 10)):
+            batch_sizes = [
+                len(u)
+                for u, _, _ in self.sampler.iter_batches(num_samples, batch_size, rng)
+            ]
+
+            self.assertEqual(sum(batch_sizes), num_samples)
+            self.assertTrue(all(size <= batch_size for size in batch_sizes))
+
+
+class TestBprFit(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over fit:
+    #   batch_size: 1, >1
+
+    # Covers:
+    #   batch_size: 1, >1
+    def test_fit_ranks_observed_items_higher(self):
+        """Training on a block diagonal matrix ranks each block's items first."""
+        np.random.seed(0)
+        data = tf.SparseTensor(
+            indices=[[0, 0], [0, 1], [1, 0], [1, 1], [2, 2], [2, 3], [3, 2], [3, 3]],
+            values=np.ones(8, dtype=np.float32),
+            dense_shape=(4, 4),
+        )
+
+        for batch_size in (1, 8):
+            model = BPRRecommender(m=4, n=4, k=2)
+            model.fit(
+                data,
+                learning_rate=0.05,
+                epochs=200,
+                regularization_coefficient=0.001,
+                batch_size=batch_size,
+            )
+            predictions = model.predict()
+
+            self.assertTrue(
+                (
+                    predictions[:2, :2].min(axis=1) > predictions[:2, 2:].max(axis=1)
+                ).all()
+            )
+            self.assertTrue(
+                (
+                    predictions[2:, 2:].min(axis=1) > predictions[2:, :2].max(axis=1)
+                ).all()
+            )
+
+
+class TestBprEvaluate(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over evaluate:
+    #   method: dot, cosine
+
+    # Covers:
+    #   method: dot, cosine
+    def test_matches_dense_predictions(self):
+        """The error is computed from the test entries without dense predictions."""
+        model = BPRRecommender(m=4, n=5, k=2)
+        test_data = tf.SparseTensor(
+            indices=[[0, 1], [2, 4], [3, 0]],
+            values=np.ones(3, dtype=np.float32),
+            dense_shape=(4, 5),
+        )
+
+        for method in PredictionMethod:
+            predictions = model.predict(method=method)
+            expected = np.mean((1.0 - predictions[[0, 2, 3], [1, 4, 0]]) ** 2)
+
+            with mock.patch.object(BPRRecommender, "predict") as predict:
+                error = model.evaluate(test_data, method)
+
+            predict.assert_not_called()
+            self.assertAlmostEqual(error, expected)
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+from tie.cache import MemoryBoundedCache
+
+
+class TestMemoryBoundedCache(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over MemoryBoundedCache.get:
+    #   key: cached, not cached
+    #   eviction: none, least recently used, value larger than max_bytes
+
+    # Covers:
+    #   key: cached, not cached
+    #   eviction: none
+    def test_computes_once(self):
+        """A cached value is not recomputed."""
+        cache = MemoryBoundedCache(max_bytes=1024)
+        calls = []
+
+        def compute():
+            calls.append(None)
+            return np.zeros(4)
+
+        first = cache.get("a", compute)
+        second = cache.get("a", compute)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.total_bytes, 32)
+
+    # Covers:
+    #   eviction: least recently used
+    def test_evicts_least_recently_used(self):
+        """Adding a value past the bound evicts the least recently used values."""
+        cache = MemoryBoundedCache(max_bytes=64)
+        cache.get("a", lambda: np.zeros(4))
+        cache.get("b", lambda: np.zeros(4))
+        cache.get("a", lambda: np.zeros(4))
+
+        cache.get("c", lambda: np.zeros(4))
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertEqual(cache.total_bytes, 64)
+
+    # Covers:
+    #   eviction: value larger than max_bytes
+    def test_does_not_cache_large_value(self):
+        """A value larger than the bound is returned without evicting anything."""
+        cache = MemoryBoundedCache(max_bytes=64)
+        cache.get("a", lambda: np.zeros(4))
+
+        value = cache.get("b", lambda: np.zeros(16))
+
+        self.assertEqual(value.shape, (16,))
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
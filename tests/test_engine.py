@@ -0,0 +1,380 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import tie.utils as utils
+from tie.constants import PredictionMethod
+from tie.engine import TechniqueInferenceEngine
+from tie.exceptions import TechniqueNotFoundException
+from tie.matrix import ReportTechniqueMatrix
+from tie.recommender import BPRRecommender, WalsRecommender
+
+
+def _make_matrix(indices: tuple[tuple[int]]) -> ReportTechniqueMatrix:
+    """Makes a 4x5 matrix with ones at indices."""
+    return ReportTechniqueMatrix(
+        indices=indices,
+        values=np.ones(len(indices)),
+        report_ids=(10, 11, 12, 13),
+        technique_ids=("T1001", "T1002", "T1003", "T1004", "T1005"),
+    )
+
+
+class TestEngineMemoization(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over TechniqueInferenceEngine memoization:
+    #   fit generation: same, after fit, after failed fit
+    #   metrics: k evaluated, k not evaluated
+
+    def setUp(self):
+        np.random.seed(0)
+        self.engine = TechniqueInferenceEngine(
+            training_data=_make_matrix(((0, 0), (1, 1), (2, 2), (3, 3), (0, 4))),
+            validation_data=_make_matrix(((1, 2),)),
+            test_data=_make_matrix(((0, 1), (2, 3))),
+            model=WalsRecommender(m=4, n=5, k=2),
+            prediction_method=PredictionMethod.DOT,
+            enterprise_attack_filepath="",
+        )
+        self.engine.fit(epochs=2, c=0.1, regularization_coefficient=0.01)
+
+    # Covers:
+    #   fit generation: same, after fit
+    #   metrics: k evaluated, k not evaluated
+    def test_metrics_evaluated_once_per_fit(self):
+        """Each k is evaluated once per fit, however many metrics are read."""
+        with mock.patch(
+            "tie.engine.evaluate_top_k_in_blocks",
+            wraps=utils.evaluate_top_k_in_blocks,
+        ) as evaluate:
+            metrics = self.engine.evaluate(ks=(1, 2))
+            self.assertEqual(self.engine.precision(2), metrics.loc[2, "precision"])
+            self.assertEqual(self.engine.recall(1), metrics.loc[1, "recall"])
+            self.engine.normalized_discounted_cumulative_gain(3)
+            self.assertEqual(evaluate.call_count, 2)
+
+            self.engine.fit(epochs=1, c=0.1, regularization_coefficient=0.01)
+            self.engine.precision(2)
+            self.assertEqual(evaluate.call_count, 3)
+
+    # Covers:
+    #   fit generation: same
+    def test_predictions_memoized(self):
+        """Predictions are computed once and returned without copying."""
+        with mock.patch.object(
+            WalsRecommender,
+            "predict_matrix",
+            autospec=True,
+            side_effect=WalsRecommender.predict_matrix,
+        ) as predict_matrix:
+            predictions = self.engine.predict()
+            again = self.engine.predict()
+
+            self.assertEqual(predict_matrix.call_count, 1)
+            self.assertIs(again, predictions)
+            self.assertEqual(list(again.index), [10, 11, 12, 13])
+
+    # Covers:
+    #   fit generation: after failed fit
+    def test_failed_fit_clears_memo(self):
+        """A fit that raises leaves nothing memoized for the previous model."""
+        predictions = self.engine.predict()
+
+        with mock.patch.object(WalsRecommender, "fit", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.engine.fit(epochs=1)
+
+        self.assertIsNot(self.engine.predict(), predictions)
+
+
+class TestEnginePredictForNewReports(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over TechniqueInferenceEngine.predict_for_new_reports:
+    #   number of reports: 0, >0
+    #   techniques in a report: 0, >0
+    #   techniques: all known, some unknown
+    #   exclude_input: True, False
+
+    def setUp(self):
+        np.random.seed(0)
+        self.engine = TechniqueInferenceEngine(
+            training_data=_make_matrix(((0, 0), (1, 1), (2, 2), (3, 3), (0, 4))),
+            validation_data=_make_matrix(((1, 2),)),
+            test_data=_make_matrix(((0, 1), (2, 3))),
+            model=WalsRecommender(m=4, n=5, k=2),
+            prediction_method=PredictionMethod.DOT,
+            enterprise_attack_filepath="",
+        )
+        self.engine.fit(epochs=2, c=0.1, regularization_coefficient=0.01)
+        patcher = mock.patch(
+            "tie.engine.get_mitre_technique_ids_to_names", return_value={}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _assert_matches_predict_for_new_report(
+        self, technique_sets, top_k, exclude_input
+    ):
+        """Asserts the batch matches the top of predict_for_new_report per report."""
+        technique_ids, predictions = self.engine.predict_for_new_reports(
+            technique_sets,
+            top_k=top_k,
+            exclude_input=exclude_input,
+            c=0.1,
+            regularization_coefficient=0.01,
+        )
+
+        self.assertEqual(technique_ids.shape, (len(technique_sets), top_k))
+        self.assertEqual(predictions.shape, (len(technique_sets), top_k))
+        for i, techniques in enumerate(technique_sets):
+            report = self.engine.predict_for_new_report(
+                techniques, c=0.1, regularization_coefficient=0.01
+            )
+            if exclude_input:
+                report = report[report.training_data == 0]
+            expected = report.sort_values(
+                "predictions", ascending=False, kind="stable"
+            )[:top_k]
+
+            self.assertEqual(list(technique_ids[i]), list(expected.index))
+            np.testing.assert_allclose(predictions[i], expected.predictions, atol=1e-10)
+
+    # Covers:
+    #   number of reports: >0
+    #   techniques in a report: 0, >0
+    #   techniques: all known
+    #   exclude_input: True
+    def test_matches_predict_for_new_report(self):
+        """Each report's top techniques match its single report prediction."""
+        self._assert_matches_predict_for_new_report(
+            [
+                frozenset(("T1001", "T1002", "T1003")),
+                frozenset(),
+                frozenset(("T1005",)),
+            ],
+            top_k=2,
+            exclude_input=True,
+        )
+
+    # Covers:
+    #   number of reports: >0
+    #   techniques in a report: >0
+    #   techniques: all known
+    #   exclude_input: False
+    def test_input_included(self):
+        """Without excluding input, the input techniques may be predicted."""
+        self._assert_matches_predict_for_new_report(
+            [frozenset(("T1001", "T1002", "T1003")), frozenset(("T1004",))],
+            top_k=5,
+            exclude_input=False,
+        )
+
+    # Covers:
+    #   number of reports: 0
+    def test_empty_batch(self):
+        """An empty batch predicts an empty top_k for no reports."""
+        technique_ids, predictions = self.engine.predict_for_new_reports(
+            [], top_k=3, c=0.1, regularization_coefficient=0.01
+        )
+
+        self.assertEqual(technique_ids.shape, (0, 3))
+        self.assertEqual(predictions.shape, (0, 3))
+
+    # Covers:
+    #   number of reports: >0
+    #   techniques: some unknown
+    def test_unknown_technique(self):
+        """A technique the model was not trained on raises."""
+        with self.assertRaises(TechniqueNotFoundException):
+            self.engine.predict_for_new_reports(
+                [frozenset(("T1001",)), frozenset(("T9999",))],
+                top_k=2,
+                c=0.1,
+                regularization_coefficient=0.01,
+            )
+
+
+class TestEngineTopK(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over TechniqueInferenceEngine.top_k:
+    #   exclude_input: True, False
+    #   allowed_techniques: None, some
+    #   denied_techniques: None, some
+    #   techniques remaining: 0, < k, >= k
+
+    def setUp(self):
+        np.random.seed(0)
+        self.engine = TechniqueInferenceEngine(
+            training_data=_make_matrix(((0, 0), (1, 1), (2, 2), (3, 3), (0, 4))),
+            validation_data=_make_matrix(((1, 2),)),
+            test_data=_make_matrix(((0, 1), (2, 3))),
+            model=WalsRecommender(m=4, n=5, k=2),
+            prediction_method=PredictionMethod.DOT,
+            enterprise_attack_filepath="",
+        )
+        self.engine.fit(epochs=2, c=0.1, regularization_coefficient=0.01)
+        patcher = mock.patch(
+            "tie.engine.get_mitre_technique_ids_to_names",
+            return_value={"T1001": "One", "T1002": "Two", "T1003": "Three"},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.techniques = frozenset(("T1001", "T1002"))
+
+    def _assert_top_k(self, k, allowed_ids, **kwargs):
+        """Asserts top_k gets the best of allowed_ids by predict_for_new_report."""
+        result = self.engine.top_k(
+            self.techniques, k=k, c=0.1, regularization_coefficient=0.01, **kwargs
+        )
+
+        predictions = self.engine.predict_for_new_report(
+            self.techniques, c=0.1, regularization_coefficient=0.01
+        )
+        expected = (
+            predictions.loc[list(allowed_ids)]
+            .sort_values("predictions", ascending=False, kind="stable")
+            .iloc[:k]
+        )
+        self.assertEqual(list(result.index), list(expected.index))
+        np.testing.assert_allclose(result.predictions, expected.predictions, atol=1e-10)
+        self.assertEqual(list(result.technique_name), list(expected.technique_name))
+
+    # Covers:
+    #   exclude_input: True
+    #   allowed_techniques: None
+    #   denied_techniques: None
+    #   techniques remaining: >= k
+    def test_exclude_input(self):
+        """The input techniques are excluded by default."""
+        self._assert_top_k(2, ("T1003", "T1004", "T1005"))
+
+    # Covers:
+    #   exclude_input: False
+    #   allowed_techniques: None
+    #   denied_techniques: None
+    #   techniques remaining: >= k
+    def test_include_input(self):
+        """Without excluding the input, every technique may be in the result."""
+        self._assert_top_k(
+            5, ("T1001", "T1002", "T1003", "T1004", "T1005"), exclude_input=False
+        )
+
+    # Covers:
+    #   exclude_input: False
+    #   allowed_techniques: some
+    #   denied_techniques: None
+    #   techniques remaining: < k
+    def test_allowed_techniques(self):
+        """Only allowed techniques are in the result, which has fewer than k rows."""
+        self._assert_top_k(
+            3,
+            ("T1002", "T1004"),
+            exclude_input=False,
+            allowed_techniques=frozenset(("T1002", "T1004")),
+        )
+
+    # Covers:
+    #   exclude_input: False
+    #   allowed_techniques: None
+    #   denied_techniques: some
+    #   techniques remaining: >= k
+    def test_denied_techniques(self):
+        """Denied techniques are not in the result."""
+        self._assert_top_k(
+            2,
+            ("T1001", "T1003", "T1005"),
+            exclude_input=False,
+            denied_techniques=frozenset(("T1002", "T1004")),
+        )
+
+    # Covers:
+    #   exclude_input: True
+    #   allowed_techniques: some
+    #   denied_techniques: some
+    #   techniques remaining: < k
+    def test_combined_masks(self):
+        """Input, disallowed, and denied techniques are all excluded."""
+        self._assert_top_k(
+            3,
+            ("T1003", "T1005"),
+            allowed_techniques=frozenset(("T1001", "T1003", "T1004", "T1005")),
+            denied_techniques=frozenset(("T1004",)),
+        )
+
+    # Covers:
+    #   exclude_input: True
+    #   allowed_techniques: some
+    #   denied_techniques: some
+    #   techniques remaining: 0
+    def test_all_excluded(self):
+        """When every technique is excluded, the result is empty."""
+        result = self.engine.top_k(
+            self.techniques,
+            k=3,
+            allowed_techniques=frozenset(("T1001", "T1003")),
+            denied_techniques=frozenset(("T1003",)),
+            c=0.1,
+            regularization_coefficient=0.01,
+        )
+
+        self.assertEqual(len(result), 0)
+        self.assertEqual(list(result.columns), ["predictions", "technique_name"])
+
+
+class TestEngineCreateSession(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over TechniqueInferenceEngine.create_session:
+    #   model: WalsRecommender, other
+    #   keyword arguments: documented, unknown
+
+    def _make_engine(self, model):
+        np.random.seed(0)
+        return TechniqueInferenceEngine(
+            training_data=_make_matrix(((0, 0), (1, 1), (2, 2), (3, 3), (0, 4))),
+            validation_data=_make_matrix(((1, 2),)),
+            test_data=_make_matrix(((0, 1), (2, 3))),
+            model=model,
+            prediction_method=PredictionMethod.DOT,
+            enterprise_attack_filepath="",
+        )
+
+    # Covers:
+    #   model: WalsRecommender
+    #   keyword arguments: documented
+    def test_matches_predict_for_new_report(self):
+        """A session predicts the same values as predict_for_new_report."""
+        engine = self._make_engine(WalsRecommender(m=4, n=5, k=2))
+        engine.fit(epochs=2, c=0.1, regularization_coefficient=0.01)
+        techniques = frozenset(("T1001", "T1003"))
+
+        session = engine.create_session(
+            regularization_coefficient=0.01, techniques=techniques, c=0.1
+        )
+
+        with mock.patch("tie.engine.get_mitre_technique_ids_to_names", return_value={}):
+            expected = engine.predict_for_new_report(
+                techniques, c=0.1, regularization_coefficient=0.01
+            )
+        np.testing.assert_allclose(session.predict(), expected.predictions, atol=1e-10)
+
+    # Covers:
+    #   model: WalsRecommender
+    #   keyword arguments: unknown
+    def test_unknown_keyword(self):
+        """An unknown keyword argument is rejected rather than ignored."""
+        engine = self._make_engine(WalsRecommender(m=4, n=5, k=2))
+
+        with self.assertRaises(TypeError):
+            engine.create_session(
+                regularization_coefficient=0.01,
+                prediction_method=PredictionMethod.COSINE,
+            )
+
+    # Covers:
+    #   model: other
+    def test_requires_wals(self):
+        """Sessions require a WalsRecommender."""
+        engine = self._make_engine(BPRRecommender(m=4, n=5, k=2))
+
+        with self.assertRaises(AssertionError):
+            engine.create_session(regularization_coefficient=0.01)
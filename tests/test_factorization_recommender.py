@@ -0,0 +1,148 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from tie.constants import Optimizer
+from tie.recommender import FactorizationRecommender
+from tie.recommender.factorization_recommender import _sample_unobserved
+
+
+class TestRegularizedLoss(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _calculate_regularized_loss:
+    #   gravity_coefficient: 0, >0
+    #   indices: None, minibatch
+
+    # Covers:
+    #   gravity_coefficient: 0, >0
+    #   indices: None
+    def test_matches_full_product(self):
+        """The loss equals the loss computed from the full prediction matrix."""
+        model = FactorizationRecommender(m=6, n=5, k=3)
+        U = model.U
+        V = model.V
+        indices = tf.constant([[0, 1], [2, 4], [5, 0]], dtype=tf.int64)
+        values = tf.constant([1.0, 1.0, 1.0])
+        predictions = model._predict(tf.SparseTensor(indices, values, (6, 5)))
+
+        full_product = U @ V.T
+        np.testing.assert_allclose(
+            predictions.numpy(), full_product[[0, 2, 5], [1, 4, 0]], rtol=1e-5
+        )
+
+        for gravity_coefficient in (0.0, 0.5):
+            loss = model._calculate_regularized_loss(
+                values, predictions, 0.1, gravity_coefficient
+            )
+
+            expected = (
+                np.mean((1.0 - full_product[[0, 2, 5], [1, 4, 0]]) ** 2)
+                + 0.1 * (np.sum(U**2) / 6 + np.sum(V**2) / 5)
+                + gravity_coefficient * np.mean(full_product**2)
+            )
+            self.assertAlmostEqual(float(loss), expected, places=4)
+
+    # Covers:
+    #   gravity_coefficient: 0, >0
+    #   indices: None, minibatch
+    def test_minibatch_matches_full_batch_scale(self):
+        """Averaged over an epoch, minibatch penalties match the full penalties."""
+        np.random.seed(0)
+        model = FactorizationRecommender(m=30, n=10, k=3)
+        indices = np.argwhere(np.ones((30, 10)))
+        np.random.default_rng(0).shuffle(indices)
+
+        def get_penalty(regularization, gravity, batch_indices=None) -> float:
+            # zero error, so only the regularization and gravity terms remain
+            zeros = tf.zeros(300 if batch_indices is None else len(batch_indices))
+            return float(
+                model._calculate_regularized_loss(
+                    zeros, zeros, regularization, gravity, indices=batch_indices
+                )
+            )
+
+        for regularization, gravity in ((1.0, 0.0), (0.0, 1.0)):
+            full = get_penalty(regularization, gravity)
+            for batch_size in (8, 64):
+                minibatch = np.mean(
+                    [
+                        get_penalty(
+                            regularization,
+                            gravity,
+                            tf.constant(indices[start : start + batch_size]),
+                        )
+                        for start in range(0, len(indices), batch_size)
+                    ]
+                )
+                self.assertAlmostEqual(minibatch / full, 1.0, delta=0.1)
+
+    # Covers:
+    #   gravity_coefficient: >0
+    #   indices: minibatch
+    def test_minibatch_gradient_is_sparse(self):
+        """A minibatch only regularizes the embeddings of its rows and columns."""
+        model = FactorizationRecommender(m=6, n=5, k=3)
+        indices = tf.constant([[0, 1], [2, 1]], dtype=tf.int64)
+        values = tf.constant([1.0, 0.0])
+
+        with tf.GradientTape() as tape:
+            predictions = model._predict(tf.SparseTensor(indices, values, (6, 5)))
+            loss = model._calculate_regularized_loss(
+                values, predictions, 0.1, 0.5, indices=indices
+            )
+        U_gradient, V_gradient = (
+            tf.convert_to_tensor(gradient).numpy()
+            for gradient in tape.gradient(loss, [model._U, model._V])
+        )
+
+        np.testing.assert_array_equal(U_gradient[[1, 3, 4, 5]], 0.0)
+        np.testing.assert_array_equal(V_gradient[[0, 2, 3, 4]], 0.0)
+        self.assertTrue((U_gradient[[0, 2]] != 0).any(axis=1).all())
+
+
+class TestMinibatchFit(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _sample_unobserved:
+    #   fraction observed: small, large
+    # Partitions over fit:
+    #   batch_size: None, < nnz
+    #   optimizer: sgd, adam
+
+    # Covers:
+    #   fraction observed: small, large
+    def test_sample_unobserved(self):
+        """Only unobserved entries are sampled."""
+        rng = np.random.default_rng(0)
+
+        for observed_keys in (np.array([0, 7]), np.arange(11)):
+            samples = _sample_unobserved(observed_keys, (3, 4), 50, rng)
+
+            self.assertEqual(samples.shape, (50, 2))
+            self.assertFalse(
+                np.isin(samples[:, 0] * 4 + samples[:, 1], observed_keys).any()
+            )
+
+    # Covers:
+    #   batch_size: None, < nnz
+    #   optimizer: sgd, adam
+    def test_minibatch_fit_reduces_error(self):
+        """Minibatch training fits the observed entries as well as full batch."""
+        np.random.seed(0)
+        indices = np.argwhere(np.random.random((30, 10)) < 0.3)
+        data = tf.SparseTensor(indices, np.ones(len(indices), dtype=np.int32), (30, 10))
+
+        model = FactorizationRecommender(m=30, n=10, k=3)
+        initial_error = model.evaluate(data)
+
+        for fit_kwargs in (
+            {"learning_rate": 1.0},
+            {
+                "learning_rate": 0.05,
+                "batch_size": 16,
+                "negative_ratio": 0.5,
+                "optimizer": Optimizer.ADAM,
+            },
+        ):
+            model.fit(data, epochs=100, regularization_coefficient=0.001, **fit_kwargs)
+
+            self.assertLess(model.evaluate(data), initial_error / 2)
@@ -0,0 +1,121 @@
+import unittest
+
+import numpy as np
+from tie.matrix import ReportTechniqueMatrix
+
+
+class TestReportTechniqueMatrix(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over ReportTechniqueMatrix:
+    #   construction: COO indices in order, COO indices out of order, CSR arrays
+    #   # empty rows: 0, >0
+    #   conversion: numpy, scipy, sparse tensor
+    #   mask: subset of entries, all entries
+
+    def _make_matrix(self) -> ReportTechniqueMatrix:
+        """Makes a 4x3 matrix with an empty last row from unordered indices."""
+        return ReportTechniqueMatrix(
+            indices=((1, 2), (0, 1), (0, 0), (2, 2)),
+            values=(1, 1, 1, 1),
+            report_ids=(0, 1, 2, 3),
+            technique_ids=("T1001", "T1002", "T1003"),
+        )
+
+    # Covers:
+    #   construction: COO indices out of order
+    #   # empty rows: >0
+    #   conversion: numpy
+    def test_csr_from_unordered_indices(self):
+        """Indices are stored sorted by row, then by column."""
+        matrix = self._make_matrix()
+
+        np.testing.assert_array_equal(matrix.indptr, [0, 2, 3, 4, 4])
+        np.testing.assert_array_equal(matrix.column_indices, [0, 1, 2, 2])
+        np.testing.assert_array_equal(matrix.row_indices, [0, 0, 1, 2])
+        self.assertEqual(matrix.indptr.dtype, np.int32)
+        self.assertEqual(matrix.column_indices.dtype, np.int32)
+        self.assertEqual(matrix.nnz, 4)
+        self.assertEqual(matrix.shape, (4, 3))
+
+        expected = np.array(
+            [
+                [1.0, 1.0, 0.0],
+                [0.0, 0.0, 1.0],
+                [0.0, 0.0, 1.0],
+                [0.0, 0.0, 0.0],
+            ]
+        )
+        np.testing.assert_array_equal(matrix.to_numpy(), expected)
+
+    # Covers:
+    #   construction: CSR arrays
+    #   # empty rows: 0
+    #   conversion: scipy
+    def test_to_scipy_shares_arrays(self):
+        """The scipy matrix is a view on the same CSR arrays."""
+        matrix = ReportTechniqueMatrix.from_csr(
+            indptr=np.array([0, 1, 3], dtype=np.int32),
+            column_indices=np.array([1, 0, 1], dtype=np.int32),
+            values=np.ones(3, dtype=np.uint8),
+            report_ids=np.arange(2),
+            technique_ids=np.array(["T1001", "T1002"]),
+        )
+
+        csr = matrix.to_scipy()
+
+        self.assertTrue(np.shares_memory(csr.indices, matrix.column_indices))
+        self.assertTrue(np.shares_memory(csr.indptr, matrix.indptr))
+        np.testing.assert_array_equal(csr.toarray(), matrix.to_numpy())
+
+    # Covers:
+    #   construction: COO indices in order
+    #   conversion: sparse tensor
+    def test_to_sparse_tensor(self):
+        """Sparse tensor entries are in canonical row-major order."""
+        matrix = ReportTechniqueMatrix(
+            indices=((0, 0), (1, 1)),
+            values=(1, 1),
+            report_ids=(0, 1),
+            technique_ids=("T1001", "T1002"),
+        )
+
+        tensor = matrix.to_sparse_tensor()
+
+        np.testing.assert_array_equal(tensor.indices.numpy(), [[0, 0], [1, 1]])
+        np.testing.assert_array_equal(tensor.values.numpy(), [1, 1])
+        np.testing.assert_array_equal(tensor.dense_shape.numpy(), [2, 2])
+
+    # Covers:
+    #   mask: subset of entries
+    def test_mask_subset(self):
+        """Masking keeps only the requested entries and the full index."""
+        matrix = self._make_matrix()
+
+        masked = matrix.mask(frozenset({(0, 1), (2, 2)}))
+
+        np.testing.assert_array_equal(masked.indptr, [0, 1, 1, 2, 2])
+        np.testing.assert_array_equal(masked.column_indices, [1, 2])
+        self.assertEqual(masked.shape, matrix.shape)
+        np.testing.assert_array_equal(masked.technique_ids, matrix.technique_ids)
+
+    # Covers:
+    #   mask: all entries
+    def test_mask_all(self):
+        """Masking with all entries reproduces the matrix."""
+        matrix = self._make_matrix()
+
+        masked = matrix.mask(frozenset(map(tuple, matrix.indices.tolist())))
+
+        np.testing.assert_array_equal(masked.to_numpy(), matrix.to_numpy())
+
+    # Covers:
+    #   mask: subset of entries
+    def test_mask_boolean(self):
+        """A boolean mask over entries in CSR order selects those entries."""
+        matrix = self._make_matrix()
+
+        masked = matrix.mask(np.array([True, False, False, True]))
+
+        np.testing.assert_array_equal(masked.indptr, [0, 1, 1, 2, 2])
+        np.testing.assert_array_equal(masked.column_indices, [0, 2])
+        self.assertTrue(np.shares_memory(masked.report_ids, matrix.report_ids))
@@ -0,0 +1,164 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from tie.matrix import ReportTechniqueMatrix
+from tie.matrix_builder import (
+    _TEST,
+    _TRAIN,
+    _VALIDATION,
+    ReportTechniqueMatrixBuilder,
+)
+
+
+class TestSampleSplit(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _sample_split:
+    #   seed: same, different
+    #   # entries per row: 1, >1
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        m, n = 50, 20
+        dense = rng.random((m, n)) < 0.3
+        # every row has at least one entry, and row 0 has exactly one
+        dense[:, 0] = True
+        dense[0, 1:] = False
+        rows, columns = np.nonzero(dense)
+
+        self.data = ReportTechniqueMatrix(
+            indices=np.column_stack((rows, columns)),
+            values=np.ones(len(rows)),
+            report_ids=np.arange(m),
+            technique_ids=np.array([f"T{1000 + j}" for j in range(n)]),
+        )
+        self.builder = ReportTechniqueMatrixBuilder("dataset.json", "attack.json")
+
+    # Covers:
+    #   seed: same
+    #   # entries per row: 1, >1
+    def test_split_reproducible(self):
+        """The same seed produces the same split, with a training entry per row."""
+        first = self.builder._sample_split(
+            self.data, 0.2, 0.1, rng=np.random.default_rng(7)
+        )
+        second = self.builder._sample_split(
+            self.data, 0.2, 0.1, rng=np.random.default_rng(7)
+        )
+
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual((first == _VALIDATION).sum(), int(0.1 * self.data.nnz))
+        self.assertEqual((first == _TEST).sum(), int(0.2 * self.data.nnz))
+
+        training = self.data.mask(first == _TRAIN)
+        self.assertTrue((np.diff(training.indptr) > 0).all())
+
+    # Covers:
+    #   seed: different
+    def test_split_depends_on_seed(self):
+        """Different seeds produce different splits."""
+        first = self.builder._sample_split(
+            self.data, 0.2, 0.1, rng=np.random.default_rng(1)
+        )
+        second = self.builder._sample_split(
+            self.data, 0.2, 0.1, rng=np.random.default_rng(2)
+        )
+
+        self.assertFalse(np.array_equal(first, second))
+
+
+class TestBuild(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over build and build_train_test_validation:
+    #   cache: disabled, miss, hit
+    #   technique validity: valid, not in ATT&CK
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+
+        technique_ids = ("T1105", "T1059", "T1047", "T1082")
+        objects = [
+            {
+                "type": "attack-pattern",
+                "spec_version": "2.1",
+                "id": f"attack-pattern--{i:08d}-0000-4000-8000-000000000000",
+                "created": "2020-01-01T00:00:00.000Z",
+                "modified": "2020-01-01T00:00:00.000Z",
+                "name": f"Technique {technique_id}",
+                "external_references": [
+                    {"source_name": "mitre-attack", "external_id": technique_id}
+                ],
+            }
+            for i, technique_id in enumerate(technique_ids)
+        ]
+        self.stix_filepath = os.path.join(self.directory.name, "attack.json")
+        with open(self.stix_filepath, "w") as f:
+            json.dump({"type": "bundle", "id": "bundle--1", "objects": objects}, f)
+
+        rng = np.random.default_rng(3)
+        reports = [
+            {
+                "mitre_techniques": {
+                    technique_id: 1
+                    for technique_id in rng.choice(
+                        technique_ids + ("T0000",), size=3, replace=False
+                    )
+                }
+            }
+            for _ in range(20)
+        ]
+        self.dataset_filepath = os.path.join(self.directory.name, "dataset.json")
+        with open(self.dataset_filepath, "w") as f:
+            json.dump({"reports": reports}, f)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Covers:
+    #   cache: disabled
+    #   technique validity: valid, not in ATT&CK
+    def test_build_sorted_techniques(self):
+        """Only valid techniques are indexed, in sorted order."""
+        builder = ReportTechniqueMatrixBuilder(
+            self.dataset_filepath, self.stix_filepath, cache_dir=self.cache_dir
+        )
+
+        data = builder.build()
+
+        self.assertEqual(data.m, 20)
+        np.testing.assert_array_equal(
+            data.technique_ids, ["T1047", "T1059", "T1082", "T1105"]
+        )
+        self.assertFalse(
+            any(name.startswith("matrix-") for name in os.listdir(self.cache_dir))
+        )
+
+    # Covers:
+    #   cache: miss, hit
+    def test_cached_build_and_split(self):
+        """Cached matrices and seeded splits load identically to the originals."""
+        builder = ReportTechniqueMatrixBuilder(
+            self.dataset_filepath,
+            self.stix_filepath,
+            use_cache=True,
+            cache_dir=self.cache_dir,
+        )
+
+        first = builder.build_train_test_validation(0.2, 0.1, seed=5)
+        second = builder.build_train_test_validation(0.2, 0.1, seed=5)
+
+        for first_data, second_data in zip(first, second):
+            np.testing.assert_array_equal(first_data.to_numpy(), second_data.to_numpy())
+            np.testing.assert_array_equal(
+                first_data.technique_ids, second_data.technique_ids
+            )
+
+        (matrix_directory,) = (
+            name for name in os.listdir(self.cache_dir) if name.startswith("matrix-")
+        )
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.cache_dir, matrix_directory))), 5
+        )
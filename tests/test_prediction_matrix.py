@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+from scipy import sparse
+from tie.constants import PredictionMethod
+from tie.prediction_matrix import PredictionMatrix
+from tie.utils import calculate_predicted_matrix, get_top_k
+
+
+class TestPredictionMatrix(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over PredictionMatrix:
+    #   backing: factors, broadcast vector
+    #   method: dot, cosine
+    #   read: rows, gather, top_k, iter_blocks, to_numpy
+    #   # blocks: 1, >1
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.U = rng.normal(size=(7, 3))
+        self.V = rng.normal(size=(5, 3))
+        self.U[2] = 0.0
+
+    # Covers:
+    #   backing: factors
+    #   method: dot, cosine
+    #   read: rows, gather, to_numpy
+    def test_factors_match_predicted_matrix(self):
+        """Every read agrees with the materialized product."""
+        for method in PredictionMethod:
+            matrix = PredictionMatrix.from_factors(self.U, self.V, method)
+            expected = calculate_predicted_matrix(self.U, self.V, method)
+
+            self.assertEqual(matrix.shape, (7, 5))
+            np.testing.assert_allclose(matrix.to_numpy(), expected)
+            np.testing.assert_allclose(matrix.rows([4, 0, 4]), expected[[4, 0, 4]])
+            np.testing.assert_allclose(
+                matrix.gather([0, 6, 2], [4, 1, 3]), expected[[0, 6, 2], [4, 1, 3]]
+            )
+
+    # Covers:
+    #   backing: factors
+    #   read: top_k, iter_blocks
+    #   # blocks: 1, >1
+    def test_top_k_in_blocks(self):
+        """Top k over blocks matches top k over the full matrix."""
+        matrix = PredictionMatrix.from_factors(self.U, self.V)
+        rows = np.array([6, 1, 3, 0, 5])
+        excluded = sparse.csr_matrix(np.eye(5))
+        expected = get_top_k(matrix.to_numpy()[rows], 2, excluded=excluded)
+
+        for block_size in (2, 5):
+            indices, values = matrix.top_k(
+                2, rows=rows, excluded=excluded, block_size=block_size
+            )
+            np.testing.assert_array_equal(indices, expected[0])
+            np.testing.assert_allclose(values, expected[1])
+
+        blocks = list(matrix.iter_blocks(rows, block_size=2))
+        self.assertEqual([len(block_rows) for block_rows, _ in blocks], [2, 2, 1])
+
+    # Covers:
+    #   backing: broadcast vector
+    #   read: rows, gather, top_k, to_numpy
+    def test_vector(self):
+        """Every row of a vector backed matrix is the vector."""
+        vector = np.array([0.1, 0.7, 0.3])
+        matrix = PredictionMatrix.from_vector(vector, m=4)
+
+        self.assertEqual(matrix.shape, (4, 3))
+        np.testing.assert_array_equal(matrix.to_numpy(), np.tile(vector, (4, 1)))
+        np.testing.assert_array_equal(matrix.rows([2]), [vector])
+        np.testing.assert_array_equal(matrix.gather([0, 3], [1, 2]), [0.7, 0.3])
+
+        indices, _ = matrix.top_k(2, rows=[1, 2])
+        np.testing.assert_array_equal(indices, [[1, 2], [1, 2]])
+
+    # Covers:
+    #   backing: factors
+    def test_factors_are_copied(self):
+        """Mutating the factors does not change the matrix."""
+        matrix = PredictionMatrix.from_factors(self.U, self.V)
+        expected = matrix.to_numpy()
+
+        self.U[:] = 0.0
+
+        np.testing.assert_array_equal(matrix.to_numpy(), expected)
@@ -0,0 +1,136 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import tie.report_reader as report_reader
+
+
+class TestIterReportTechniques(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over iter_report_techniques:
+    #   format: json, json lines
+    #   # reports: 0, >1
+    #   other top-level keys: none, before reports, after reports
+    #   chunk size: smaller than a report, larger than the file
+    #   validity: valid, malformed
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.reports = [
+            {"id": 0, "name": 'quote " and, [bracket]', "mitre_techniques": {}},
+            {"id": 1, "mitre_techniques": {"T1059": 3, "T1059.001": 1}},
+            {"id": 2, "score": 12345.678, "mitre_techniques": {"T1105": 1}},
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, filename: str, contents: str) -> str:
+        """Writes contents to filename in the temporary directory."""
+        filepath = os.path.join(self.directory.name, filename)
+        with open(filepath, "w") as f:
+            f.write(contents)
+        return filepath
+
+    def _expected(self) -> list[frozenset[str]]:
+        return [frozenset(report["mitre_techniques"]) for report in self.reports]
+
+    # Covers:
+    #   format: json
+    #   # reports: >1
+    #   other top-level keys: before reports, after reports
+    #   chunk size: smaller than a report
+    #   validity: valid
+    def test_json_small_chunks(self):
+        """Reports are decoded correctly across chunk boundaries."""
+        filepath = self._write(
+            "dataset.json",
+            json.dumps(
+                {
+                    "version": [1, {"nested": "reports"}],
+                    "reports": self.reports,
+                    "count": 3,
+                },
+                indent=2,
+            ),
+        )
+
+        with mock.patch.object(report_reader, "_READ_CHUNK_SIZE", 7):
+            techniques = list(report_reader.iter_report_techniques(filepath))
+
+        self.assertEqual(techniques, self._expected())
+
+    # Covers:
+    #   format: json
+    #   # reports: 0
+    #   other top-level keys: none
+    #   chunk size: larger than the file
+    def test_json_no_reports(self):
+        """An empty reports array yields nothing."""
+        filepath = self._write("dataset.json", '{"reports": []}')
+
+        techniques = list(report_reader.iter_report_techniques(filepath))
+
+        self.assertEqual(techniques, [])
+
+    # Covers:
+    #   format: json lines
+    #   # reports: >1
+    def test_json_lines(self):
+        """Each non-empty line is a report."""
+        filepath = self._write(
+            "dataset.jsonl",
+            "\n".join(json.dumps(report) for report in self.reports) + "\n\n",
+        )
+
+        techniques = list(report_reader.iter_report_techniques(filepath))
+
+        self.assertEqual(techniques, self._expected())
+
+    # Covers:
+    #   format: json
+    #   # reports: >1
+    #   other top-level keys: before reports
+    #   chunk size: smaller than a report
+    #   validity: valid
+    def test_json_large_value_read_geometrically(self):
+        """A value much larger than a chunk is decoded a logarithmic number of times."""
+        filepath = self._write(
+            "dataset.json",
+            json.dumps({"version": list(range(2000)), "reports": self.reports}),
+        )
+
+        decoder = json.JSONDecoder()
+        with (
+            mock.patch.object(report_reader, "_READ_CHUNK_SIZE", 16),
+            mock.patch.object(
+                json.JSONDecoder, "raw_decode", wraps=decoder.raw_decode
+            ) as raw_decode,
+        ):
+            techniques = list(report_reader.iter_report_techniques(filepath))
+
+        self.assertEqual(techniques, self._expected())
+        # the version array is about 10000 characters, or 600 chunks
+        self.assertLess(raw_decode.call_count, 100)
+
+    # Covers:
+    #   format: json
+    #   chunk size: smaller than a report
+    #   validity: malformed
+    def test_json_malformed_raises_before_end_of_file(self):
+        """A malformed value raises without reading the rest of the file."""
+        f = io.StringIO('{"reports": [{"mitre_techniques" {}}' + " " * 100000 + "]}")
+
+        with mock.patch.object(report_reader, "_READ_CHUNK_SIZE", 64):
+            stream = report_reader._JsonStream(f)
+            stream.expect("{")
+            stream.decode()
+            stream.expect(":")
+            stream.expect("[")
+            with self.assertRaises(json.JSONDecodeError):
+                stream.decode()
+
+        self.assertLess(f.tell(), 1000)
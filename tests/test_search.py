@@ -0,0 +1,382 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+from tie.constants import PredictionMethod
+from tie.matrix import ReportTechniqueMatrix
+from tie.recommender import WalsRecommender
+from tie.search import (
+    SuccessiveHalvingSearch,
+    _attach_matrix,
+    _share_matrix,
+    get_parameter_grid,
+    get_serpentine_order,
+    grid_search,
+    regularization_path_search,
+)
+
+
+def _make_matrix(indices: tuple[tuple[int]]) -> ReportTechniqueMatrix:
+    """Makes a 6x5 matrix with ones at indices."""
+    return ReportTechniqueMatrix(
+        indices=indices,
+        values=np.ones(len(indices)),
+        report_ids=np.arange(6),
+        technique_ids=("T1001", "T1002", "T1003", "T1004", "T1005"),
+    )
+
+
+class TestGridSearch(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over get_parameter_grid:
+    #   # hyperparameters: 0, >1
+    # Partitions over get_serpentine_order:
+    #   # hyperparameters: 1, >1
+    # Partitions over grid_search:
+    #   num_workers: 1, >1
+    #   seed: given, None
+    #   warm_start: False, True
+    #   fit_kwargs: None, given
+    # Partitions over _share_matrix, _attach_matrix:
+    #   ids: fixed width, object
+
+    def setUp(self):
+        self.training_data = _make_matrix(
+            ((0, 0), (0, 1), (1, 1), (1, 2), (2, 2), (3, 3), (4, 4), (5, 0))
+        )
+        self.validation_data = _make_matrix(((0, 2), (2, 3), (4, 0)))
+        self.model = WalsRecommender(m=6, n=5, k=2)
+        self.grid = {
+            "epochs": [2],
+            "c": [0.01, 0.1],
+            "regularization_coefficient": [0.0, 0.1],
+        }
+
+    # Covers:
+    #   # hyperparameters: 0, >1
+    def test_parameter_grid(self):
+        """The last hyperparameter varies fastest."""
+        self.assertEqual(get_parameter_grid({}), [{}])
+        self.assertEqual(
+            get_parameter_grid({"a": [1, 2], "b": [3, 4]}),
+            [{"a": 1, "b": 3}, {"a": 1, "b": 4}, {"a": 2, "b": 3}, {"a": 2, "b": 4}],
+        )
+
+    # Covers:
+    #   # hyperparameters: 1, >1
+    def test_serpentine_order(self):
+        """Consecutive combinations differ in one adjacent value."""
+        self.assertEqual(get_serpentine_order({"a": [1, 2, 3]}), [0, 1, 2])
+
+        grid = {"a": [1, 2], "b": [3, 4, 5], "c": [6, 7]}
+        parameter_grid = get_parameter_grid(grid)
+        order = get_serpentine_order(grid)
+
+        self.assertEqual(sorted(order), list(range(12)))
+        for previous, current in zip(order, order[1:]):
+            steps = [
+                abs(
+                    values.index(parameter_grid[previous][name])
+                    - values.index(parameter_grid[current][name])
+                )
+                for name, values in grid.items()
+            ]
+            self.assertEqual(sorted(steps), [0, 0, 1])
+
+    # Covers:
+    #   num_workers: 1
+    #   warm_start: True
+    def test_warm_start(self):
+        """Only the first trial in serpentine order starts from scratch."""
+        trials = grid_search(
+            self.model,
+            self.training_data,
+            self.validation_data,
+            self.grid,
+            k=3,
+            seed=3,
+            warm_start=True,
+            warm_start_epochs=1,
+        )
+
+        self.assertEqual(list(trials["warm_started"]), [False, True, True, True])
+        self.assertFalse(trials["score"].isna().any())
+
+    # Covers:
+    #   num_workers: 1, >1
+    #   seed: given
+    #   warm_start: False
+    #   fit_kwargs: None, given
+    def test_workers_do_not_change_trials(self):
+        """Trials are reproducible whether run in process or in a process pool."""
+        serial = grid_search(
+            self.model, self.training_data, self.validation_data, self.grid, k=3, seed=3
+        )
+        parallel = grid_search(
+            self.model,
+            self.training_data,
+            self.validation_data,
+            self.grid,
+            k=3,
+            num_workers=2,
+            seed=3,
+            fit_kwargs={"num_workers": 2},
+        )
+
+        self.assertEqual(len(serial), 4)
+        self.assertEqual(
+            list(serial.columns),
+            [
+                "epochs",
+                "c",
+                "regularization_coefficient",
+                "seed",
+                "score",
+                "fit_seconds",
+                "warm_started",
+            ],
+        )
+        self.assertEqual(serial["seed"].nunique(), 4)
+        self.assertFalse(serial["warm_started"].any())
+        np.testing.assert_array_equal(serial["seed"], parallel["seed"])
+        np.testing.assert_allclose(serial["score"], parallel["score"])
+
+    # Covers:
+    #   num_workers: 1
+    #   seed: None
+    def test_seed_from_global_state(self):
+        """Without a seed, trials are reproducible from the global numpy seed."""
+        tables = []
+        for _ in range(2):
+            np.random.seed(0)
+            tables.append(
+                grid_search(
+                    self.model,
+                    self.training_data,
+                    self.validation_data,
+                    self.grid,
+                    prediction_method=PredictionMethod.COSINE,
+                    k=3,
+                )
+            )
+
+        np.testing.assert_array_equal(tables[0]["seed"], tables[1]["seed"])
+        np.testing.assert_array_equal(tables[0]["score"], tables[1]["score"])
+
+    # Covers:
+    #   ids: fixed width, object
+    def test_shared_matrix_round_trip(self):
+        """A shared matrix, including its ids, is rebuilt from shared memory."""
+        object_ids = ReportTechniqueMatrix(
+            indices=((0, 1), (1, 0)),
+            values=np.ones(2),
+            report_ids=np.array(["a", 2], dtype=object),
+            technique_ids=("T1001", "T1002"),
+        )
+
+        for matrix in (self.training_data, object_ids):
+            blocks, spec = _share_matrix(matrix)
+            try:
+                attached_blocks, attached = _attach_matrix(spec)
+
+                self.assertEqual(
+                    isinstance(spec["report_ids"], np.ndarray),
+                    matrix.report_ids.dtype.hasobject,
+                )
+                self.assertNotIsInstance(spec["technique_ids"], np.ndarray)
+                np.testing.assert_array_equal(attached.report_ids, matrix.report_ids)
+                np.testing.assert_array_equal(
+                    attached.technique_ids, matrix.technique_ids
+                )
+                np.testing.assert_array_equal(
+                    attached.to_scipy().toarray(), matrix.to_scipy().toarray()
+                )
+                del attached
+                for shared_memory in attached_blocks:
+                    shared_memory.close()
+            finally:
+                for shared_memory in blocks:
+                    shared_memory.close()
+                    shared_memory.unlink()
+
+    # Covers:
+    #   num_workers: 1
+    #   fit_kwargs: given
+    def test_fit_kwargs_passed_to_every_trial(self):
+        """fit_kwargs reach every fit but are not part of the trial table."""
+        with mock.patch.object(
+            WalsRecommender, "fit", autospec=True, side_effect=WalsRecommender.fit
+        ) as fit:
+            trials = grid_search(
+                self.model,
+                self.training_data,
+                self.validation_data,
+                self.grid,
+                k=3,
+                seed=3,
+                fit_kwargs={"num_workers": 2},
+            )
+
+        self.assertEqual(fit.call_count, 4)
+        for call in fit.call_args_list:
+            self.assertEqual(call.kwargs["num_workers"], 2)
+        self.assertNotIn("num_workers", trials.columns)
+
+
+class TestSuccessiveHalvingSearch(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over SuccessiveHalvingSearch:
+    #   # rungs: 1, >1
+    #   progress: not done, done
+    #   trial: demoted, promoted to the final rung
+
+    def setUp(self):
+        self.training_data = _make_matrix(
+            ((0, 0), (0, 1), (1, 1), (1, 2), (2, 2), (3, 3), (4, 4), (5, 0))
+        )
+        self.validation_data = _make_matrix(((0, 2), (2, 3), (4, 0)))
+        self.model = WalsRecommender(m=6, n=5, k=2)
+        self.grid = {"c": [0.01, 0.1], "regularization_coefficient": [0.0, 0.1]}
+
+    def _make_search(self, max_epochs: int) -> SuccessiveHalvingSearch:
+        """Makes a search over 4 trials which halves the trials at each rung."""
+        return SuccessiveHalvingSearch(
+            self.model,
+            self.training_data,
+            self.validation_data,
+            self.grid,
+            max_epochs=max_epochs,
+            reduction_factor=2,
+            k=3,
+            seed=1,
+        )
+
+    # Covers:
+    #   # rungs: >1
+    #   progress: not done, done
+    #   trial: demoted, promoted to the final rung
+    def test_halves_trials(self):
+        """Each rung keeps the best half of the trials for twice the epochs."""
+        search = self._make_search(max_epochs=4)
+
+        search.step()
+        self.assertFalse(search.done)
+        self.assertEqual(list(search.trials["epochs"]), [1, 1, 1, 1])
+
+        trials = search.run()
+        self.assertTrue(search.done)
+        self.assertEqual(sorted(trials["epochs"]), [1, 1, 2, 4])
+        self.assertEqual(sorted(trials["rung"]), [0, 0, 1, 2])
+
+        hyperparameters, model = search.get_best()
+        best = trials["rung"].idxmax()
+        self.assertEqual(hyperparameters["epochs"], 4)
+        self.assertEqual(hyperparameters["c"], trials.loc[best, "c"])
+        self.assertIsInstance(model, WalsRecommender)
+
+    # Covers:
+    #   # rungs: 1
+    #   trial: promoted to the final rung
+    def test_single_rung(self):
+        """With min_epochs == max_epochs, every trial is fit once."""
+        trials = self._make_search(max_epochs=1).run()
+
+        self.assertEqual(list(trials["epochs"]), [1, 1, 1, 1])
+        self.assertFalse(trials["score"].isna().any())
+
+
+class TestRegularizationPathSearch(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over regularization_path_search:
+    #   # paths: 1, >1
+    #   # coefficients per path: >1
+
+    # Covers:
+    #   # paths: >1
+    #   # coefficients per path: >1
+    def test_scores_every_coefficient(self):
+        """Every grid point is scored, and trials on one path share its seed."""
+        training_data = _make_matrix(
+            ((0, 0), (0, 1), (1, 1), (1, 2), (2, 2), (3, 3), (4, 4), (5, 0))
+        )
+        validation_data = _make_matrix(((0, 2), (2, 3), (4, 0)))
+        grid = {
+            "epochs": [2],
+            "c": [0.01, 0.1],
+            "regularization_coefficient": [0.0, 0.1, 1.0],
+        }
+
+        trials = regularization_path_search(
+            WalsRecommender(m=6, n=5, k=2),
+            training_data,
+            validation_data,
+            grid,
+            k=3,
+            seed=4,
+        )
+
+        self.assertEqual(len(trials), 6)
+        self.assertEqual(
+            list(trials.columns),
+            [
+                "epochs",
+                "c",
+                "regularization_coefficient",
+                "seed",
+                "score",
+                "fit_seconds",
+            ],
+        )
+        self.assertEqual(list(trials["c"]), [0.01, 0.01, 0.01, 0.1, 0.1, 0.1])
+        self.assertFalse(trials["score"].isna().any())
+        self.assertEqual(trials["seed"].nunique(), 2)
+        self.assertEqual(len(set(trials["seed"][:3])), 1)
+
+    # Covers:
+    #   # paths: 1
+    #   # coefficients per path: >1
+    def test_selects_full_grid_coefficient(self):
+        """On data where one coefficient is clearly best, the path selects it too."""
+        # 3 blocks of reports sharing a block of techniques, plus noise
+        rng = np.random.default_rng(0)
+        report_blocks = rng.integers(3, size=100)
+        observed = np.argwhere(
+            (
+                (report_blocks[:, np.newaxis] == np.arange(20) % 3)
+                & (rng.random((100, 20)) < 0.6)
+            )
+            | (rng.random((100, 20)) < 0.05)
+        )
+        rng.shuffle(observed)
+
+        def make_matrix(indices: np.ndarray) -> ReportTechniqueMatrix:
+            return ReportTechniqueMatrix(
+                indices=tuple(map(tuple, indices)),
+                values=np.ones(len(indices)),
+                report_ids=np.arange(100),
+                technique_ids=tuple(f"T{1000 + j}" for j in range(20)),
+            )
+
+        validation_data = make_matrix(observed[: len(observed) // 5])
+        training_data = make_matrix(observed[len(observed) // 5 :])
+        grid = {"epochs": [10], "regularization_coefficient": [0.0, 0.1, 10000.0]}
+
+        full = grid_search(
+            WalsRecommender(m=100, n=20, k=6),
+            training_data,
+            validation_data,
+            grid,
+            k=3,
+            seed=0,
+        )
+        path = regularization_path_search(
+            WalsRecommender(m=100, n=20, k=6),
+            training_data,
+            validation_data,
+            grid,
+            k=3,
+            seed=0,
+        )
+
+        self.assertEqual(full["score"].idxmax(), 2)
+        self.assertEqual(path["score"].idxmax(), full["score"].idxmax())
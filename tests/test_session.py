@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+import tie.session as session
+from tie.constants import PredictionMethod
+from tie.exceptions import TechniqueNotFoundException
+from tie.recommender import WalsRecommender
+from tie.session import ReportSession
+
+
+class TestReportSession(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over ReportSession:
+    #   update: add, remove, add existing, remove absent
+    #   # updates: < refresh interval, >= refresh interval
+    #   method: dot, cosine
+    #   technique: known, unknown
+
+    def setUp(self):
+        np.random.seed(0)
+        self.n = 6
+        self.model = WalsRecommender(m=3, n=self.n, k=3)
+        self.technique_ids = np.array([f"T100{i}" for i in range(self.n)])
+
+    def _fold_in(self, techniques: list[str], method: PredictionMethod) -> np.ndarray:
+        """Gets the predictions of the model's fold-in of techniques."""
+        indices = sorted(int(technique[-1]) for technique in techniques)
+        entity = tf.SparseTensor(
+            indices=np.array(indices, dtype=np.int64).reshape(-1, 1),
+            values=np.ones(len(indices)),
+            dense_shape=(self.n,),
+        )
+        return self.model.predict_new_entity(
+            entity, c=0.1, regularization_coefficient=0.1, method=method
+        )
+
+    # Covers:
+    #   update: add, remove, add existing, remove absent
+    #   # updates: < refresh interval
+    #   method: dot, cosine
+    def test_matches_fold_in(self):
+        """Predictions after each change match folding in the report afresh."""
+        for method in PredictionMethod:
+            report = ReportSession(
+                self.model.V,
+                self.technique_ids,
+                regularization_coefficient=0.1,
+                prediction_method=method,
+                techniques=frozenset({"T1000"}),
+            )
+
+            report.add("T1003")
+            report.add("T1003")
+            report.add("T1005")
+            report.remove("T1000")
+            report.remove("T1002")
+
+            self.assertEqual(report.techniques, frozenset({"T1003", "T1005"}))
+            np.testing.assert_allclose(
+                report.predict(), self._fold_in(["T1003", "T1005"], method), atol=1e-10
+            )
+
+    # Covers:
+    #   # updates: >= refresh interval
+    def test_refresh(self):
+        """Recomputing the inverse after many updates keeps predictions exact."""
+        report = ReportSession(self.model.V, self.technique_ids, 0.1)
+
+        with mock.patch.object(session, "_REFRESH_INTERVAL", 3):
+            for technique in ("T1001", "T1002", "T1004", "T1005"):
+                report.add(technique)
+            report.remove("T1002")
+
+        np.testing.assert_allclose(
+            report.predict(),
+            self._fold_in(["T1001", "T1004", "T1005"], PredictionMethod.DOT),
+            atol=1e-10,
+        )
+
+    # Covers:
+    #   technique: known, unknown
+    def test_top_k_excludes_report(self):
+        """Top techniques exclude those in the report and unknown ids raise."""
+        report = ReportSession(
+            self.model.V, self.technique_ids, 0.1, techniques=frozenset({"T1002"})
+        )
+
+        technique_ids, predictions = report.top_k(10)
+
+        self.assertEqual(len(technique_ids), self.n - 1)
+        self.assertNotIn("T1002", technique_ids)
+        self.assertTrue((np.diff(predictions) <= 0).all())
+        with self.assertRaises(TechniqueNotFoundException):
+            report.add("T9999")
@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tie.technique_index import TechniqueIndex, get_technique_index
+
+
+def _make_technique(number: int, technique_id: str, **properties) -> dict:
+    """Makes a minimal STIX attack-pattern object."""
+    return {
+        "type": "attack-pattern",
+        "spec_version": "2.1",
+        "id": f"attack-pattern--{number:08d}-0000-4000-8000-000000000000",
+        "created": "2020-01-01T00:00:00.000Z",
+        "modified": "2020-01-01T00:00:00.000Z",
+        "name": f"Technique {technique_id}",
+        "external_references": [
+            {"source_name": "mitre-attack", "external_id": technique_id}
+        ],
+        **properties,
+    }
+
+
+class TestTechniqueIndex(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over get_technique_index:
+    #   cache: in-process hit, on-disk hit, miss
+    #   technique: active, revoked, deprecated
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.stix_filepath = os.path.join(self.directory.name, "attack.json")
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+
+        objects = [
+            _make_technique(
+                0,
+                "T1059",
+                kill_chain_phases=[
+                    {"kill_chain_name": "mitre-attack", "phase_name": "execution"}
+                ],
+                x_mitre_platforms=["Linux", "Windows"],
+            ),
+            _make_technique(1, "T1064", revoked=True),
+            _make_technique(2, "T1002", x_mitre_deprecated=True),
+        ]
+        with open(self.stix_filepath, "w") as f:
+            json.dump({"type": "bundle", "id": "bundle--1", "objects": objects}, f)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Covers:
+    #   cache: miss, in-process hit
+    #   technique: active, revoked, deprecated
+    def test_build_and_memoize(self):
+        """The index is built once and excludes revoked and deprecated techniques."""
+        technique_index = get_technique_index(self.stix_filepath, self.cache_dir)
+
+        self.assertEqual(technique_index.technique_ids, ("T1002", "T1059", "T1064"))
+        self.assertEqual(
+            technique_index.get_technique_ids_to_names(),
+            {"T1059": "Technique T1059"},
+        )
+        self.assertEqual(technique_index.get_tactics("T1059"), frozenset({"execution"}))
+        self.assertEqual(
+            technique_index.get_platforms("T1059"), frozenset({"Linux", "Windows"})
+        )
+        self.assertTrue(technique_index.is_revoked_or_deprecated("T1064"))
+        self.assertIs(
+            technique_index, get_technique_index(self.stix_filepath, self.cache_dir)
+        )
+
+    # Covers:
+    #   cache: on-disk hit
+    def test_save_load_round_trip(self):
+        """A saved index loads with identical contents."""
+        filepath = os.path.join(self.directory.name, "index.npz")
+        technique_index = TechniqueIndex.from_stix(self.stix_filepath)
+
+        technique_index.save(filepath)
+        loaded = TechniqueIndex.load(filepath)
+
+        self.assertEqual(loaded.technique_ids, technique_index.technique_ids)
+        self.assertEqual(
+            loaded.get_technique_ids_to_names(include_revoked_deprecated=True),
+            technique_index.get_technique_ids_to_names(include_revoked_deprecated=True),
+        )
+        self.assertEqual(
+            loaded.get_platforms("T1059"), technique_index.get_platforms("T1059")
+        )
@@ -3,6 +3,8 @@ import math
 import pandas as pd
 import tie.utils as utils
 import numpy as np
+import tensorflow as tf
+from scipy import sparse
 from sklearn.metrics import ndcg_score
 
 
@@ -381,3 +383,194 @@ class TestNormalizedDiscountedCumulativeGain(unittest.TestCase):
         sklearn_ndcg = ndcg_score(test_data, predictions, k=7)
 
         self.assertAlmostEqual(sklearn_ndcg, ndcg, delta=0.00001)
+
+
+class TestSparsePredictions(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over sparse_tensor_to_csr:
+    #   rank: 1, 2
+    # Partitions over calculate_predicted_values:
+    #   method: dot, cosine
+
+    # Covers:
+    #   rank: 1, 2
+    def test_sparse_tensor_to_csr(self):
+        """Conversion keeps every entry, treating a vector as a single row."""
+        matrix = tf.SparseTensor(
+            indices=((1, 2), (0, 0)), values=(1.0, 2.0), dense_shape=(2, 3)
+        )
+        vector = tf.SparseTensor(indices=((1,),), values=(1.0,), dense_shape=(3,))
+
+        np.testing.assert_array_equal(
+            utils.sparse_tensor_to_csr(matrix).toarray(),
+            [[2.0, 0.0, 0.0], [0.0, 0.0, 1.0]],
+        )
+        np.testing.assert_array_equal(
+            utils.sparse_tensor_to_csr(vector).toarray(), [[0.0, 1.0, 0.0]]
+        )
+
+    # Covers:
+    #   method: dot, cosine
+    def test_predicted_values_match_matrix(self):
+        """Selected values equal the corresponding entries of the full product."""
+        rng = np.random.default_rng(3)
+        U = rng.normal(size=(4, 2))
+        V = rng.normal(size=(5, 2))
+        U[1] = 0.0
+        rows = np.array([0, 1, 3, 3])
+        columns = np.array([4, 0, 2, 4])
+
+        for method in utils.PredictionMethod:
+            np.testing.assert_allclose(
+                utils.calculate_predicted_values(U, V, rows, columns, method),
+                utils.calculate_predicted_matrix(U, V, method)[rows, columns],
+            )
+
+
+class TestGetTopK(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over get_top_k:
+    #   k: 1, 1 < k < n, n
+    #   masks: none, excluded, allowed, both
+
+    # Covers:
+    #   k: 1, 1 < k < n, n
+    def test_top_k_sorted(self):
+        """The top k columns are returned in descending order of score."""
+        scores = np.array([[0.1, 0.9, 0.5, 0.3], [4.0, -1.0, 2.0, 3.0]])
+
+        for k in (1, 2, 4):
+            indices, values = utils.get_top_k(scores, k)
+
+            expected_indices = np.argsort(-scores, axis=1)[:, :k]
+            np.testing.assert_array_equal(indices, expected_indices)
+            np.testing.assert_array_equal(
+                values, np.take_along_axis(scores, expected_indices, axis=1)
+            )
+
+    # Covers:
+    #   k: 1 < k < n
+    #   masks: excluded, allowed, both
+    def test_top_k_masks(self):
+        """Excluded entries and disallowed columns are never in the top k."""
+        scores = np.array([[0.1, 0.9, 0.5, 0.3], [4.0, -1.0, 2.0, 3.0]])
+        excluded = sparse.csr_matrix(np.array([[0, 1, 0, 0], [1, 0, 0, 0]]))
+        allowed = np.array([True, True, True, False])
+
+        indices, _ = utils.get_top_k(scores, 2, excluded=excluded)
+        np.testing.assert_array_equal(indices, [[2, 3], [3, 2]])
+
+        indices, _ = utils.get_top_k(scores, 2, allowed=allowed)
+        np.testing.assert_array_equal(indices, [[1, 2], [0, 2]])
+
+        indices, values = utils.get_top_k(scores, 2, excluded=excluded, allowed=allowed)
+        np.testing.assert_array_equal(indices, [[2, 0], [2, 1]])
+        np.testing.assert_array_equal(values, [[0.5, 0.1], [2.0, -1.0]])
+
+
+class TestEvaluateTopK(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over evaluate_top_k:
+    #   # k: 1, >1
+    #   excluded: None, some entries
+    #   rows without test items: 0, >0
+
+    # Covers:
+    #   # k: >1
+    #   excluded: None
+    #   rows without test items: >0
+    def test_matches_single_metrics(self):
+        """Each k matches the single metric functions."""
+        rng = np.random.default_rng(5)
+        predictions = pd.DataFrame(rng.integers(0, 3, size=(6, 7)).astype(float))
+        test_data = pd.DataFrame((rng.random((6, 7)) < 0.3).astype(float))
+        test_data.iloc[2] = 0.0
+
+        metrics = utils.evaluate_top_k(
+            predictions.to_numpy(), sparse.csr_matrix(test_data.to_numpy()), (1, 3, 7)
+        )
+
+        for k in (1, 3, 7):
+            self.assertAlmostEqual(
+                metrics.loc[k, "precision"],
+                utils.precision_at_k(predictions, test_data, k),
+            )
+            self.assertAlmostEqual(
+                metrics.loc[k, "recall"], utils.recall_at_k(predictions, test_data, k)
+            )
+            self.assertAlmostEqual(
+                metrics.loc[k, "ndcg"],
+                utils.normalized_discounted_cumulative_gain(predictions, test_data, k),
+            )
+
+    # Covers:
+    #   # k: 1, >1
+    #   excluded: some entries
+    #   rows without test items: 0
+    def test_hit_rate_and_mrr_with_exclusions(self):
+        """Excluded entries are skipped when ranking."""
+        predictions = np.array([[0.9, 0.8, 0.1, 0.5], [0.2, 0.9, 0.8, 0.7]])
+        test_data = sparse.csr_matrix(np.array([[0, 0, 0, 1], [0, 0, 1, 0]]))
+        excluded = sparse.csr_matrix(np.array([[1, 0, 0, 0], [0, 1, 0, 0]]))
+
+        metrics = utils.evaluate_top_k(predictions, test_data, (1, 2), excluded)
+
+        # row 0 ranks 1, 3, 2 and row 1 ranks 2, 3, 0
+        self.assertEqual(metrics.loc[1, "hit_rate"], 0.5)
+        self.assertEqual(metrics.loc[2, "hit_rate"], 1.0)
+        self.assertEqual(metrics.loc[1, "mrr"], 0.5)
+        self.assertEqual(metrics.loc[2, "mrr"], 0.75)
+
+
+class TestEvaluateTopKInBlocks(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over evaluate_top_k_in_blocks:
+    #   block_size: 1, < # rows with test items, >= # rows with test items
+    #   excluded: None, some entries
+    #   rows predicted: only rows with test items
+
+    # Covers:
+    #   block_size: 1, < # rows with test items, >= # rows with test items
+    #   excluded: None, some entries
+    def test_matches_evaluate_top_k(self):
+        """Metrics do not depend on the block size."""
+        rng = np.random.default_rng(11)
+        predictions = rng.integers(0, 4, size=(9, 6)).astype(float)
+        test_data = sparse.csr_matrix(rng.random((9, 6)) < 0.3)
+        test_data[[1, 4]] = 0
+        test_data.eliminate_zeros()
+        excluded = sparse.csr_matrix(rng.random((9, 6)) < 0.2)
+
+        for excluded_data in (None, excluded):
+            expected = utils.evaluate_top_k(
+                predictions, test_data, (1, 3), excluded=excluded_data
+            )
+            for block_size in (1, 4, 9):
+                metrics = utils.evaluate_top_k_in_blocks(
+                    lambda rows: predictions[rows],
+                    test_data,
+                    (1, 3),
+                    excluded=excluded_data,
+                    block_size=block_size,
+                )
+                pd.testing.assert_frame_equal(metrics, expected)
+
+    # Covers:
+    #   rows predicted: only rows with test items
+    def test_skips_rows_without_test_items(self):
+        """Rows without test items are never predicted but count for precision."""
+        predictions = np.array([[0.1, 0.9], [0.8, 0.2], [0.4, 0.6]])
+        test_data = sparse.csr_matrix(np.array([[0, 1], [0, 0], [0, 1]]))
+        predicted_rows = []
+
+        def predict_rows(rows):
+            predicted_rows.extend(rows.tolist())
+            return predictions[rows]
+
+        metrics = utils.evaluate_top_k_in_blocks(
+            predict_rows, test_data, (1,), block_size=1
+        )
+
+        self.assertEqual(predicted_rows, [0, 2])
+        self.assertAlmostEqual(metrics.loc[1, "precision"], 2 / 3)
+        self.assertEqual(metrics.loc[1, "recall"], 1.0)
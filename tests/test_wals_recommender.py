@@ -0,0 +1,336 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+import tie.recommender.wals_recommender as wals_recommender
+from scipy import sparse
+from tie.constants import PredictionMethod, WalsSolver
+from tie.recommender import Recommender, WalsRecommender
+
+
+def _reference_update_factor(
+    V: np.ndarray, P: np.ndarray, regularization_coefficient: float
+) -> np.ndarray:
+    """Solves each row's least squares system one at a time."""
+    k = V.shape[1]
+    new_U = np.zeros((P.shape[0], k))
+    for u in range(P.shape[0]):
+        observed_V = V[P[u] > 0]
+        A = V.T @ V + observed_V.T @ observed_V + regularization_coefficient * np.eye(k)
+        new_U[u] = np.linalg.solve(A, V.T @ P[u])
+    return new_U
+
+
+class TestWalsUpdateFactor(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _update_factor:
+    #   # chunks: 1, >1
+    #   row: empty, nonempty
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.m, self.n, self.k = 40, 15, 4
+        P = (rng.random((self.m, self.n)) < 0.2).astype(float)
+        P[3] = 0.0
+        self.P = P
+        self.V = rng.normal(size=(self.n, self.k))
+        self.model = WalsRecommender(m=self.m, n=self.n, k=self.k)
+
+    # Covers:
+    #   # chunks: 1
+    #   row: empty, nonempty
+    def test_matches_reference(self):
+        """The batched solve matches solving each row separately."""
+        new_U = self.model._update_factor(
+            self.V, sparse.csr_matrix(self.P), alpha=9.0, regularization_coefficient=0.1
+        )
+
+        np.testing.assert_allclose(
+            new_U, _reference_update_factor(self.V, self.P, 0.1), atol=1e-10
+        )
+        np.testing.assert_array_equal(new_U[3], np.zeros(self.k))
+
+    # Covers:
+    #   # chunks: >1
+    def test_chunked_matches_reference(self):
+        """Splitting the rows into many chunks does not change the solution."""
+        with mock.patch.object(
+            wals_recommender, "_CHUNK_SIZE_BYTES", 8 * self.k * self.k * 5
+        ):
+            new_U = self.model._update_factor(
+                self.V,
+                sparse.csr_matrix(self.P),
+                alpha=9.0,
+                regularization_coefficient=0.1,
+            )
+
+        np.testing.assert_allclose(
+            new_U, _reference_update_factor(self.V, self.P, 0.1), atol=1e-10
+        )
+
+    # Covers:
+    #   # chunks: >1
+    def test_parallel_matches_reference(self):
+        """Solving the rows on several threads does not change the solution."""
+        new_U = self.model._update_factor(
+            self.V,
+            sparse.csr_matrix(self.P),
+            alpha=9.0,
+            regularization_coefficient=0.1,
+            num_workers=4,
+        )
+
+        np.testing.assert_allclose(
+            new_U, _reference_update_factor(self.V, self.P, 0.1), atol=1e-10
+        )
+
+    # Covers:
+    #   # chunks: 1
+    #   row: empty, nonempty
+    def test_conjugate_gradient_converges(self):
+        """Conjugate gradient with k steps matches the exact solution."""
+        rng = np.random.default_rng(1)
+        initial_factors = rng.normal(size=(self.m, self.k))
+
+        new_U = self.model._update_factor(
+            self.V,
+            sparse.csr_matrix(self.P),
+            alpha=9.0,
+            regularization_coefficient=0.1,
+            solver=WalsSolver.CONJUGATE_GRADIENT,
+            initial_factors=initial_factors,
+            cg_steps=self.k,
+        )
+
+        np.testing.assert_allclose(
+            new_U, _reference_update_factor(self.V, self.P, 0.1), atol=1e-6
+        )
+
+
+class TestWalsRegularizationPath(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _solve_regularization_path:
+    #   # coefficients: 1, >1
+    #   row: empty, nonempty
+    # Partitions over fit_regularization_path:
+    #   anchor_regularization_coefficient: None, given
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.m, self.n, self.k = 12, 6, 3
+        P = (rng.random((self.m, self.n)) < 0.3).astype(float)
+        P[5] = 0.0
+        self.P = P
+        self.V = rng.normal(size=(self.n, self.k))
+        self.model = WalsRecommender(m=self.m, n=self.n, k=self.k)
+
+    # Covers:
+    #   # coefficients: 1, >1
+    #   row: empty, nonempty
+    def test_matches_reference(self):
+        """Each solution on the path matches solving with its coefficient."""
+        coefficients = (0.01, 0.1, 1.0)
+        for num_workers in (1, 3):
+            path = self.model._solve_regularization_path(
+                self.V,
+                sparse.csr_matrix(self.P),
+                coefficients,
+                num_workers=num_workers,
+            )
+
+            self.assertEqual(path.shape, (3, self.m, self.k))
+            for U, coefficient in zip(path, coefficients):
+                np.testing.assert_allclose(
+                    U,
+                    _reference_update_factor(self.V, self.P, coefficient),
+                    atol=1e-10,
+                )
+
+    # Covers:
+    #   anchor_regularization_coefficient: None, given
+    def test_models_share_anchor_item_factors(self):
+        """Every model on the path has the anchor's item factors."""
+        data = tf.SparseTensor(
+            indices=np.argwhere(self.P),
+            values=np.ones(int(self.P.sum())),
+            dense_shape=self.P.shape,
+        )
+        coefficients = (0.01, 0.1, 1.0)
+
+        for anchor in (None, 0.5):
+            np.random.seed(0)
+            models = self.model.fit_regularization_path(
+                data,
+                epochs=2,
+                regularization_coefficients=coefficients,
+                c=0.1,
+                anchor_regularization_coefficient=anchor,
+            )
+
+            self.assertEqual(len(models), 3)
+            for model, coefficient in zip(models, coefficients):
+                self.assertIsNot(model, self.model)
+                np.testing.assert_array_equal(model.V, self.model.V)
+                np.testing.assert_allclose(
+                    model.U,
+                    _reference_update_factor(self.model.V, self.P, coefficient),
+                    atol=1e-8,
+                )
+
+
+class TestWalsPredictNewEntities(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over predict_new_entities:
+    #   implementation: batched, default per entity
+    #   entities: none, some
+    #   entity: no ratings, some ratings
+
+    # Covers:
+    #   implementation: batched, default per entity
+    #   entities: some
+    #   entity: no ratings, some ratings
+    def test_matches_predict_new_entity(self):
+        """Folding in a batch matches folding in each entity separately."""
+        np.random.seed(0)
+        model = WalsRecommender(m=6, n=5, k=2)
+        entities = tf.SparseTensor(
+            indices=[[0, 1], [0, 3], [2, 0]], values=[1.0, 1.0, 1.0], dense_shape=(3, 5)
+        )
+
+        batched = model.predict_new_entities(
+            entities, c=0.1, regularization_coefficient=0.01
+        )
+        looped = Recommender.predict_new_entities(
+            model, entities, c=0.1, regularization_coefficient=0.01
+        )
+
+        self.assertEqual(batched.shape, (3, 5))
+        np.testing.assert_allclose(batched, looped, atol=1e-10)
+        np.testing.assert_array_equal(batched[1], np.zeros(5))
+
+    # Covers:
+    #   implementation: batched
+    #   entities: none
+    def test_no_entities(self):
+        """Folding in an empty batch predicts no rows."""
+        model = WalsRecommender(m=6, n=5, k=2)
+        entities = tf.SparseTensor(
+            indices=np.zeros((0, 2), dtype=np.int64), values=[], dense_shape=(0, 5)
+        )
+
+        predictions = model.predict_new_entities(
+            entities, c=0.1, regularization_coefficient=0.01
+        )
+
+        self.assertEqual(predictions.shape, (0, 5))
+
+
+class TestWalsWarmStart(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over fit:
+    #   warm_start: False, True
+
+    # Covers:
+    #   warm_start: False, True
+    def test_resumed_fit_matches_longer_fit(self):
+        """Fitting 2 epochs, then 1 more warm started, matches fitting 3 epochs."""
+        data = tf.SparseTensor(
+            indices=[[0, 0], [1, 2], [2, 1], [3, 3]],
+            values=[1.0, 1.0, 1.0, 1.0],
+            dense_shape=(4, 4),
+        )
+        resumed = WalsRecommender(m=4, n=4, k=2)
+        uninterrupted = WalsRecommender(m=4, n=4, k=2)
+
+        np.random.seed(0)
+        resumed.fit(data, epochs=2, c=0.1)
+        resumed.fit(data, epochs=1, c=0.1, warm_start=True)
+        np.random.seed(0)
+        uninterrupted.fit(data, epochs=3, c=0.1)
+
+        np.testing.assert_allclose(resumed.U, uninterrupted.U)
+        np.testing.assert_allclose(resumed.V, uninterrupted.V)
+
+
+class TestWalsPredictRows(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over predict_rows:
+    #   method: dot, cosine
+    #   rows: in order, out of order with repeats
+
+    # Covers:
+    #   method: dot, cosine
+    #   rows: in order, out of order with repeats
+    def test_matches_predict(self):
+        """Predicting rows matches the same rows of the full prediction matrix."""
+        np.random.seed(0)
+        model = WalsRecommender(m=6, n=5, k=2)
+
+        for method in PredictionMethod:
+            for rows in (np.array([0, 1, 2]), np.array([4, 0, 4])):
+                np.testing.assert_allclose(
+                    model.predict_rows(rows, method=method),
+                    model.predict(method=method)[rows],
+                )
+
+
+class TestWalsFoldIn(unittest.TestCase):
+    # Testing strategy:
+    # Partitions over _fold_in:
+    #   # rated items: 0, < k, >= k
+    #   operator cache: empty, populated, invalidated by fit
+
+    def setUp(self):
+        np.random.seed(0)
+        self.n, self.k = 8, 3
+        self.model = WalsRecommender(m=4, n=self.n, k=self.k)
+
+    def _reference_fold_in(self, item_indices: list[int]) -> np.ndarray:
+        """Folds in an entity with the generic factor update."""
+        entity = np.zeros((1, self.n))
+        entity[0, item_indices] = 1.0
+        return self.model._update_factor(
+            self.model.V, sparse.csr_matrix(entity), 9.0, 0.1
+        )[0]
+
+    # Covers:
+    #   # rated items: 0, < k, >= k
+    #   operator cache: empty, populated
+    def test_matches_update_factor(self):
+        """Folding in with the cached operator matches the generic update."""
+        for item_indices in ([], [2], [0, 5], [1, 3, 4, 7]):
+            new_factor = self.model._fold_in(
+                np.array(item_indices, dtype=np.int32),
+                np.ones(len(item_indices)),
+                c=0.1,
+                regularization_coefficient=0.1,
+            )
+
+            np.testing.assert_allclose(
+                new_factor, self._reference_fold_in(item_indices), atol=1e-10
+            )
+
+    # Covers:
+    #   operator cache: invalidated by fit
+    def test_fit_invalidates_cache(self):
+        """Predictions after refitting use the new item embeddings."""
+        entity = tf.SparseTensor(
+            indices=[[1], [6]], values=[1.0, 1.0], dense_shape=(8,)
+        )
+        self.model.predict_new_entity(entity, c=0.1, regularization_coefficient=0.1)
+
+        data = tf.SparseTensor(
+            indices=[[0, 1], [1, 6], [2, 2], [3, 0]],
+            values=[1.0, 1.0, 1.0, 1.0],
+            dense_shape=(4, 8),
+        )
+        self.model.fit(data, epochs=2, c=0.1, regularization_coefficient=0.1)
+
+        np.testing.assert_allclose(
+            self.model.predict_new_entity(
+                entity, c=0.1, regularization_coefficient=0.1
+            ),
+            self.model.V @ self._reference_fold_in([1, 6]),
+            atol=1e-10,
+        )